@@ -0,0 +1,136 @@
+"""
+Compare how fixed settings, AutoThrottle and AdaptiveConcurrency cope with
+hosts of different capacities, all of them simulated by a local web server
+started in-process.
+
+Each host answers after a fixed latency, and with a 503 response when it
+already serves as many requests as its capacity. Hosts are given as
+``latency:capacity`` pairs, e.g. ``0.05:4`` for a host answering in 50 ms
+which can serve 4 requests at a time.
+
+Reports, for each configuration, the crawl rate and the number of 503
+responses and timeouts.
+
+usage:
+
+    python adaptive-concurrency-bench.py [--hosts 0.05:4,0.2:32] [--requests 500]
+
+"""
+from __future__ import print_function
+import argparse
+from time import time
+
+from twisted.internet import defer, reactor
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET, Site
+
+from scrapy import Request, Spider
+from scrapy.crawler import CrawlerRunner
+
+
+class Host(Resource):
+    isLeaf = True
+
+    def __init__(self, latency, capacity):
+        Resource.__init__(self)
+        self.latency = latency
+        self.capacity = capacity
+        self.active = 0
+
+    def render_GET(self, request):
+        if self.active >= self.capacity:
+            request.setResponseCode(503)
+            return b'overloaded'
+        self.active += 1
+        reactor.callLater(self.latency, self._finish, request)
+        return NOT_DONE_YET
+
+    def _finish(self, request):
+        self.active -= 1
+        if not request._disconnected:
+            request.write(b'ok')
+            request.finish()
+
+
+class BenchSpider(Spider):
+    name = 'bench'
+
+    def start_requests(self):
+        for i in range(self.requests):
+            for host in range(self.hosts):
+                yield Request('%s/%d/%d' % (self.base_url, host, i),
+                              meta={'download_slot': 'host%d' % host},
+                              dont_filter=True)
+
+    def parse(self, response):
+        pass
+
+
+CONFIGURATIONS = [
+    ('fixed', {}),
+    ('autothrottle', {
+        'AUTOTHROTTLE_ENABLED': True,
+        'AUTOTHROTTLE_START_DELAY': 0.1,
+        'AUTOTHROTTLE_TARGET_CONCURRENCY': 8,
+    }),
+    ('adaptive', {
+        'ADAPTIVE_CONCURRENCY_ENABLED': True,
+    }),
+]
+
+
+@defer.inlineCallbacks
+def run(args, hosts, base_url):
+    for name, settings in CONFIGURATIONS:
+        settings = dict(settings, **{
+            'LOG_LEVEL': 'WARNING',
+            'CONCURRENT_REQUESTS': 256,
+            'CONCURRENT_REQUESTS_PER_DOMAIN': args.concurrency,
+            'DOWNLOAD_TIMEOUT': args.timeout,
+            'HTTPERROR_ALLOW_ALL': True,
+            'RETRY_ENABLED': False,
+            'TELNETCONSOLE_ENABLED': False,
+        })
+        runner = CrawlerRunner(settings)
+        crawler = runner.create_crawler(BenchSpider)
+        start = time()
+        yield runner.crawl(crawler, hosts=len(hosts), requests=args.requests,
+                           base_url=base_url)
+        elapsed = time() - start
+        stats = crawler.stats
+        total = len(hosts) * args.requests
+        print('%-12s %d requests in %.1fs: %.0f requests/s, '
+              '%d 503 responses, %d timeouts' % (
+                  name, total, elapsed, total / elapsed,
+                  stats.get_value('downloader/response_status_count/503', 0),
+                  stats.get_value('downloader/exception_type_count/'
+                                  'twisted.internet.error.TimeoutError', 0)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hosts', default='0.05:4,0.2:32',
+                        help='comma-separated latency:capacity pairs')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='requests per host')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='CONCURRENT_REQUESTS_PER_DOMAIN')
+    parser.add_argument('--timeout', type=float, default=10)
+    args = parser.parse_args()
+
+    root = Resource()
+    hosts = []
+    for i, spec in enumerate(args.hosts.split(',')):
+        latency, capacity = spec.split(':')
+        hosts.append(Host(float(latency), int(capacity)))
+        root.putChild(str(i).encode('ascii'), hosts[-1])
+    port = reactor.listenTCP(0, Site(root), interface='127.0.0.1')
+
+    dfd = run(args, hosts, 'http://127.0.0.1:%d' % port.getHost().port)
+    dfd.addErrback(lambda f: f.printTraceback())
+    dfd.addBoth(lambda _: reactor.stop())
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
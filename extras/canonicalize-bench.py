@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Compare w3lib's canonicalize_url with Scrapy's memoizing URLCanonicalizer over
+a synthetic corpus resembling the links extracted while crawling a site:
+mostly canonical URLs, with repeated navigation links, unsorted query
+strings, percent-escapes and non-ASCII paths mixed in.
+
+usage:
+
+    python canonicalize-bench.py [-n 200000] [--pages 5000]
+
+"""
+from __future__ import print_function
+import argparse
+import random
+from time import time
+
+from w3lib.url import canonicalize_url
+
+from scrapy.utils.url import URLCanonicalizer
+
+
+def _corpus(count, pages, seed=0):
+    rnd = random.Random(seed)
+    navigation = ['http://www.example.com/',
+                  'http://www.example.com/about.html',
+                  'http://www.example.com/contact',
+                  'http://www.example.com/search?q=&page=1',
+                  'http://www.example.com/category/books?sort=price&dir=asc']
+    for _ in range(count):
+        page = rnd.randint(1, pages)
+        kind = rnd.random()
+        if kind < 0.3:
+            yield rnd.choice(navigation)
+        elif kind < 0.7:
+            yield 'http://www.example.com/item/%d.html' % page
+        elif kind < 0.8:
+            yield 'http://www.example.com/list?page=%d&cat=%d' % (page, page % 7)
+        elif kind < 0.9:
+            yield 'http://www.example.com/list?cat=%d&page=%d' % (page % 7, page)
+        elif kind < 0.95:
+            yield 'http://www.example.com/tag/some%%20tag/%d' % page
+        else:
+            yield u'http://www.example.com/résumé/%d' % page
+
+
+def _bench(name, func, urls):
+    start = time()
+    for url in urls:
+        func(url)
+    elapsed = time() - start
+    print('%-22s %8.0f urls/s' % (name, len(urls) / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=200000)
+    parser.add_argument('--pages', type=int, default=5000)
+    args = parser.parse_args()
+
+    urls = list(_corpus(args.n, args.pages))
+    print('%d urls, %d distinct' % (len(urls), len(set(urls))))
+    _bench('w3lib', canonicalize_url, urls)
+    canonicalizer = URLCanonicalizer()
+    _bench('URLCanonicalizer', canonicalizer, urls)
+    print('fastpath=%d hits=%d misses=%d' % (
+        canonicalizer.fastpath, canonicalizer.hits, canonicalizer.misses))
+
+
+if __name__ == '__main__':
+    main()
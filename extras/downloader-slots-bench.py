@@ -0,0 +1,97 @@
+"""
+Measure how the downloader copes with many download slots: every request
+goes to its own slot (as in a broad crawl over many hosts), all of them
+served by a local web server started in-process.
+
+Reports the crawl rate, the peak number of reactor DelayedCalls and the peak
+size of the downloader timer heap.
+
+usage:
+
+    python downloader-slots-bench.py [--slots 10000] [--requests 3]
+
+"""
+from __future__ import print_function
+import argparse
+from time import time
+
+from twisted.internet import reactor, task
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+from scrapy import Request, Spider
+from scrapy.crawler import CrawlerRunner
+
+
+class Page(Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        return b'ok'
+
+
+class SlotsSpider(Spider):
+    name = 'slots'
+
+    def start_requests(self):
+        for i in range(self.requests):
+            for slot in range(self.slots):
+                yield Request('%s/%d/%d' % (self.base_url, slot, i),
+                              meta={'download_slot': 'slot%d' % slot},
+                              dont_filter=True)
+
+    def parse(self, response):
+        pass
+
+
+class Monitor(object):
+
+    def __init__(self):
+        self.delayed_calls = self.timers = 0
+
+    def sample(self, crawler):
+        self.delayed_calls = max(self.delayed_calls,
+                                 len(reactor.getDelayedCalls()))
+        if crawler.engine:
+            self.timers = max(self.timers,
+                              len(crawler.engine.downloader._timers))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--slots', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=3,
+                        help='requests per slot')
+    parser.add_argument('--delay', type=float, default=0.25)
+    args = parser.parse_args()
+
+    port = reactor.listenTCP(0, Site(Page()), interface='127.0.0.1')
+    runner = CrawlerRunner({
+        'LOG_LEVEL': 'WARNING',
+        'CONCURRENT_REQUESTS': 256,
+        'DOWNLOAD_DELAY': args.delay,
+        'RANDOMIZE_DOWNLOAD_DELAY': False,
+        'SCHEDULER_PRIORITY_QUEUE': 'scrapy.pqueues.DownloaderAwarePriorityQueue',
+        'TELNETCONSOLE_ENABLED': False,
+    })
+    crawler = runner.create_crawler(SlotsSpider)
+    monitor = Monitor()
+    sampler = task.LoopingCall(monitor.sample, crawler)
+    sampler.start(0.5)
+
+    start = time()
+    dfd = runner.crawl(crawler, slots=args.slots, requests=args.requests,
+                       base_url='http://127.0.0.1:%d' % port.getHost().port)
+    dfd.addBoth(lambda _: reactor.stop())
+    reactor.run()
+    elapsed = time() - start
+
+    total = args.slots * args.requests
+    print('%d slots, %d requests in %.1fs: %.0f requests/s' % (
+        args.slots, total, elapsed, total / elapsed))
+    print('peak reactor DelayedCalls: %d, peak downloader timers: %d' % (
+        monitor.delayed_calls, monitor.timers))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare the scheduler disk queues: push/pop rates and bytes used on disk per
+request.
+
+usage:
+
+    python squeues-bench.py [-n 100000]
+
+"""
+from __future__ import print_function
+import argparse
+import os
+import shutil
+import tempfile
+from time import time
+
+from scrapy.http import Request
+from scrapy.spiders import Spider
+from scrapy.utils.misc import load_object
+from scrapy.utils.reqser import request_to_dict
+
+QUEUES = [
+    'scrapy.squeues.PickleLifoDiskQueue',
+    'scrapy.squeues.MarshalFifoDiskQueue',
+    'scrapy.squeues.CompactLifoDiskQueue',
+    'scrapy.squeues.CompactFifoDiskQueue',
+    'scrapy.squeues.CompactZlibFifoDiskQueue',
+]
+
+
+class BenchSpider(Spider):
+    name = 'bench'
+
+    def parse_item(self, response):
+        pass
+
+
+def _requests(count):
+    spider = BenchSpider()
+    for i in range(count):
+        request = Request(
+            'http://www%d.example.com/category/%d/item?id=%d&sort=asc'
+            % (i % 100, i % 1000, i),
+            callback=spider.parse_item if i % 2 else None,
+            headers={'Referer': 'http://www%d.example.com/' % (i % 100)},
+            meta={'depth': i % 5, 'download_slot': 'www%d.example.com' % (i % 100)},
+            priority=-(i % 5))
+        yield request_to_dict(request, spider)
+
+
+def _disk_usage(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, f))
+                     for f in filenames)
+    return total
+
+
+def bench(qclass, requests):
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, 'queue')
+    try:
+        q = qclass(path)
+        start = time()
+        for d in requests:
+            q.push(d)
+        push_time = time() - start
+        q.close()
+        size = _disk_usage(tmpdir)
+
+        q = qclass(path)
+        start = time()
+        while q.pop() is not None:
+            pass
+        pop_time = time() - start
+        q.close()
+    finally:
+        shutil.rmtree(tmpdir)
+    n = len(requests)
+    return n / push_time, n / pop_time, float(size) / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=100000,
+                        help='number of requests to push (default: %(default)s)')
+    args = parser.parse_args()
+    requests = list(_requests(args.n))
+    print('%-40s %12s %12s %12s' % ('queue', 'push/s', 'pop/s', 'bytes/req'))
+    for path in QUEUES:
+        push_rate, pop_rate, size = bench(load_object(path), requests)
+        print('%-40s %12.0f %12.0f %12.1f' % (path, push_rate, pop_rate, size))
+
+
+if __name__ == '__main__':
+    main()
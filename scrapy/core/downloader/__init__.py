@@ -1,21 +1,48 @@
 from __future__ import absolute_import
+import heapq
+import itertools
 import random
 import warnings
 from time import time
 from datetime import datetime
-from collections import deque
 
 import six
-from twisted.internet import reactor, defer, task
+from twisted.internet import defer
 
 from scrapy.utils.defer import mustbe_deferred
 from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.reactor import TimerWheel
 from scrapy.resolver import dnscache
 from scrapy import signals
 from .middleware import DownloaderMiddlewareManager
 from .handlers import DownloadHandlers
 
 
+class SlotQueue(object):
+    """Requests waiting for a downloader slot, served by descending
+    ``Request.priority`` and in arrival order within the same priority"""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+
+    def push(self, request, deferred):
+        entry = (-request.priority, next(self._seq), time(), request, deferred)
+        heapq.heappush(self._heap, entry)
+
+    def peek(self):
+        """Return the next request to be popped, or None if empty"""
+        return self._heap[0][3] if self._heap else None
+
+    def pop(self):
+        """Return a ``(request, deferred, enqueued_time)`` tuple"""
+        _, _, enqueued, request, deferred = heapq.heappop(self._heap)
+        return request, deferred, enqueued
+
+    def __len__(self):
+        return len(self._heap)
+
+
 class Slot(object):
     """Downloader slot"""
 
@@ -25,10 +52,14 @@ class Slot(object):
         self.randomize_delay = randomize_delay
 
         self.active = set()
-        self.queue = deque()
+        self.queue = SlotQueue()
         self.transferring = set()
         self.lastseen = 0
-        self.latercall = None
+        self.wakeup = None
+        self.evict_at = None
+        # state of the concurrency controller tuning this slot, if any (see
+        # scrapy.extensions.throttle.AdaptiveConcurrency)
+        self.controller = None
 
     def free_transfer_slots(self):
         return self.concurrency - len(self.transferring)
@@ -39,8 +70,8 @@ class Slot(object):
         return self.delay
 
     def close(self):
-        if self.latercall and self.latercall.active():
-            self.latercall.cancel()
+        self.wakeup = None
+        self.evict_at = None
 
     def __repr__(self):
         cls_name = self.__class__.__name__
@@ -75,8 +106,13 @@ def _get_concurrency_delay(concurrency, spider, settings):
 
 class Downloader(object):
 
+    # idle slots are evicted this many seconds after their last download
+    # (plus their download delay)
+    SLOT_IDLE_AGE = 60
+
     def __init__(self, crawler):
         self.settings = crawler.settings
+        self.stats = crawler.stats
         self.signals = crawler.signals
         self.slots = {}
         self.active = set()
@@ -85,9 +121,13 @@ class Downloader(object):
         self.domain_concurrency = self.settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN')
         self.ip_concurrency = self.settings.getint('CONCURRENT_REQUESTS_PER_IP')
         self.randomize_delay = self.settings.getbool('RANDOMIZE_DOWNLOAD_DELAY')
+        self.reserved_priority = self.settings.getint('DOWNLOAD_RESERVED_PRIORITY')
+        self.reserved_concurrency = self.settings.getint('DOWNLOAD_RESERVED_CONCURRENCY')
         self.middleware = DownloaderMiddlewareManager.from_crawler(crawler)
-        self._slot_gc_loop = task.LoopingCall(self._slot_gc)
-        self._slot_gc_loop.start(60)
+        # delayed slot wakeups and idle slot evictions share a timer wheel,
+        # driven by a single reactor timer
+        self._timers = TimerWheel(
+            self.settings.getfloat('DOWNLOAD_TIMER_RESOLUTION'))
 
     def fetch(self, request, spider):
         def _deactivate(response):
@@ -126,6 +166,9 @@ class Downloader(object):
 
         def _deactivate(response):
             slot.active.remove(request)
+            if not slot.active and slot.evict_at is None:
+                slot.evict_at = slot.lastseen + slot.delay + self.SLOT_IDLE_AGE
+                self._call_at(slot.evict_at, self._evict_slot, key, slot)
             return response
 
         slot.active.add(request)
@@ -133,12 +176,12 @@ class Downloader(object):
                                     request=request,
                                     spider=spider)
         deferred = defer.Deferred().addBoth(_deactivate)
-        slot.queue.append((request, deferred))
+        slot.queue.push(request, deferred)
         self._process_queue(spider, slot)
         return deferred
 
     def _process_queue(self, spider, slot):
-        if slot.latercall and slot.latercall.active():
+        if slot.wakeup is not None or not slot.queue:
             return
 
         # Delay queue processing if a download_delay is configured
@@ -147,13 +190,15 @@ class Downloader(object):
         if delay:
             penalty = delay - now + slot.lastseen
             if penalty > 0:
-                slot.latercall = reactor.callLater(penalty, self._process_queue, spider, slot)
+                slot.wakeup = now + penalty
+                self._call_at(slot.wakeup, self._wakeup_slot, spider, slot)
                 return
 
         # Process enqueued requests if there are free slots to transfer for this slot
-        while slot.queue and slot.free_transfer_slots() > 0:
+        while slot.queue and self._free_transfer_slots(slot) > 0:
             slot.lastseen = now
-            request, deferred = slot.queue.popleft()
+            request, deferred, enqueued = slot.queue.pop()
+            self._record_wait(request, now - enqueued, spider)
             dfd = self._download(slot, request, spider)
             dfd.chainDeferred(deferred)
             # prevent burst if inter-request delays were configured
@@ -161,21 +206,52 @@ class Downloader(object):
                 self._process_queue(spider, slot)
                 break
 
+    def _free_transfer_slots(self, slot):
+        """Return the transfer slots available to the next queued request;
+        requests in the reserved lane may exceed the slot concurrency by
+        ``DOWNLOAD_RESERVED_CONCURRENCY``"""
+        free = slot.free_transfer_slots()
+        if slot.queue.peek().priority >= self.reserved_priority:
+            free += self.reserved_concurrency
+        return free
+
+    def _priority_class(self, priority):
+        if priority >= self.reserved_priority:
+            return 'reserved'
+        if priority > 0:
+            return 'high'
+        if priority < 0:
+            return 'low'
+        return 'normal'
+
+    def _record_wait(self, request, waited, spider):
+        prefix = 'downloader/slot_wait/%s' % self._priority_class(request.priority)
+        self.stats.inc_value(prefix + '/count', spider=spider)
+        self.stats.inc_value(prefix + '/time', waited, spider=spider)
+        self.stats.max_value(prefix + '/max', waited, spider=spider)
+
     def _download(self, slot, request, spider):
         # The order is very important for the following deferreds. Do not change!
 
         # 1. Create the download deferred
         dfd = mustbe_deferred(self.handlers.download_request, request, spider)
 
-        # 2. Notify response_downloaded listeners about the recent download
-        # before querying queue for next request
+        # 2. Notify response_downloaded (or download_error) listeners about
+        # the recent download before querying queue for next request
         def _downloaded(response):
             self.signals.send_catch_log(signal=signals.response_downloaded,
                                         response=response,
                                         request=request,
                                         spider=spider)
             return response
-        dfd.addCallback(_downloaded)
+
+        def _download_error(failure):
+            self.signals.send_catch_log(signal=signals.download_error,
+                                        failure=failure,
+                                        request=request,
+                                        spider=spider)
+            return failure
+        dfd.addCallbacks(_downloaded, _download_error)
 
         # 3. After response arrives,  remove the request from transferring
         # state to free up the transferring slot so it can be used by the
@@ -190,13 +266,26 @@ class Downloader(object):
 
         return dfd.addBoth(finish_transferring)
 
+    def _wakeup_slot(self, spider, slot):
+        slot.wakeup = None
+        self._process_queue(spider, slot)
+
+    def _evict_slot(self, key, slot):
+        slot.evict_at = None
+        if slot.active or self.slots.get(key) is not slot:
+            return
+        expires = slot.lastseen + slot.delay + self.SLOT_IDLE_AGE
+        if expires > time():
+            # the slot was used again since this eviction was scheduled
+            slot.evict_at = expires
+            self._call_at(expires, self._evict_slot, key, slot)
+        else:
+            self.slots.pop(key).close()
+
+    def _call_at(self, when, func, *args):
+        self._timers.callLater(max(0, when - time()), func, *args)
+
     def close(self):
-        self._slot_gc_loop.stop()
+        self._timers.clear()
         for slot in six.itervalues(self.slots):
             slot.close()
-
-    def _slot_gc(self, age=60):
-        mintime = time() - age
-        for key, slot in list(self.slots.items()):
-            if not slot.active and slot.lastseen + slot.delay < mintime:
-                self.slots.pop(key).close()
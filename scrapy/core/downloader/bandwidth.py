@@ -0,0 +1,113 @@
+"""Bandwidth limits of downloads, with token buckets"""
+
+import weakref
+
+from twisted.internet import reactor
+
+from scrapy.utils.datatypes import LocalCache
+
+
+class TokenBucket(object):
+    """Allow ``rate`` bytes per second, in bursts of up to ``burst`` bytes
+    (one second worth of bytes by default)"""
+
+    def __init__(self, rate, burst=None, clock=None):
+        self.rate = float(rate)
+        self.burst = burst if burst is not None else self.rate
+        self._clock = clock if clock is not None else reactor
+        self._tokens = self.burst
+        self._updated = self._clock.seconds()
+
+    def consume(self, amount):
+        """Take ``amount`` bytes, even if the bucket doesn't hold enough
+        tokens yet, and return the seconds it needs to pay its debt"""
+        now = self._clock.seconds()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= amount
+        return -self._tokens / self.rate if self._tokens < 0 else 0
+
+
+class BandwidthLimiter(object):
+    """Token buckets limiting the bandwidth of all downloads, of the
+    downloads of each download slot, and of single downloads.
+
+    The limits are the ``DOWNLOAD_BANDWIDTH_LIMIT`` and
+    ``DOWNLOAD_SLOT_BANDWIDTH_LIMIT`` settings and the
+    ``download_bandwidth_limit`` request meta key, in bytes per second.
+    """
+
+    # download handlers of the same crawler share its limiter
+    _crawler_limiters = weakref.WeakKeyDictionary()
+
+    def __init__(self, limit=0, slot_limit=0, burst=1.0, stats=None,
+                 clock=None):
+        self.slot_limit = slot_limit
+        # burst allowance, in seconds worth of bytes
+        self.burst = burst
+        self.stats = stats
+        self._clock = clock if clock is not None else reactor
+        self._bucket = self._new_bucket(limit) if limit else None
+        # idle buckets refill, so forgetting them makes no difference
+        self._slot_buckets = LocalCache(10000)
+        self._bytes = 0
+        self._start = None
+
+    @classmethod
+    def from_settings(cls, settings, stats=None):
+        return cls(settings.getint('DOWNLOAD_BANDWIDTH_LIMIT'),
+                   settings.getint('DOWNLOAD_SLOT_BANDWIDTH_LIMIT'),
+                   settings.getfloat('DOWNLOAD_BANDWIDTH_BURST'), stats)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if crawler not in cls._crawler_limiters:
+            cls._crawler_limiters[crawler] = cls.from_settings(
+                crawler.settings, crawler.stats)
+        return cls._crawler_limiters[crawler]
+
+    def _new_bucket(self, rate):
+        return TokenBucket(rate, rate * self.burst, self._clock)
+
+    def buckets(self, request):
+        """Return the token buckets limiting the download of ``request``"""
+        buckets = []
+        if self._bucket is not None:
+            buckets.append(self._bucket)
+        slot = request.meta.get('download_slot')
+        if self.slot_limit and slot is not None:
+            if slot not in self._slot_buckets:
+                self._slot_buckets[slot] = self._new_bucket(self.slot_limit)
+            buckets.append(self._slot_buckets[slot])
+        limit = request.meta.get('download_bandwidth_limit')
+        if limit:
+            buckets.append(self._new_bucket(limit))
+        return buckets
+
+    def consume(self, buckets, amount):
+        """Take ``amount`` bytes from ``buckets``, and return the seconds the
+        download must be paused to respect their limits"""
+        if self._start is None:
+            self._start = self._clock.seconds()
+        self._bytes += amount
+        return max(bucket.consume(amount) for bucket in buckets)
+
+    def throttled(self, delay):
+        """Record a download paused for ``delay`` seconds"""
+        if self.stats is None:
+            return
+        self.stats.inc_value('downloader/bandwidth/throttled_count')
+        self.stats.inc_value('downloader/bandwidth/throttled_time', delay)
+        self.update_stats()
+
+    def update_stats(self):
+        """Record the bytes received by limited downloads, and their mean
+        throughput since the first of them started"""
+        if self.stats is None or self._start is None:
+            return
+        self.stats.set_value('downloader/bandwidth/bytes', self._bytes)
+        elapsed = self._clock.seconds() - self._start
+        if elapsed > 0:
+            self.stats.set_value('downloader/bandwidth/throughput',
+                                 self._bytes / elapsed)
@@ -26,8 +26,16 @@ if twisted_version >= (14, 0, 0):
 
         'A TLS/SSL connection established with [this method] may
          understand the SSLv3, TLSv1, TLSv1.1 and TLSv1.2 protocols.'
+
+        TLS sessions are resumed when ``tls_session_cache`` is set to a
+        :class:`~scrapy.core.downloader.tls.TLSSessionCache`, and the
+        protocols in ``acceptable_protocols`` (e.g. ``[b'h2', b'http/1.1']``)
+        are offered to servers through ALPN.
         """
 
+        tls_session_cache = None
+        acceptable_protocols = None
+
         def __init__(self, method=SSL.SSLv23_METHOD, *args, **kwargs):
             super(ScrapyClientContextFactory, self).__init__(*args, **kwargs)
             self._ssl_method = method
@@ -56,7 +64,15 @@ if twisted_version >= (14, 0, 0):
             return self.getCertificateOptions().getContext()
 
         def creatorForNetloc(self, hostname, port):
-            return ScrapyClientTLSOptions(hostname.decode("ascii"), self.getContext())
+            ctx = self.getContext()
+            if self.tls_session_cache is not None:
+                # clients only resume sessions created with the same session
+                # id context, which CertificateOptions makes unique otherwise
+                ctx.set_session_id(b'scrapy')
+            if self.acceptable_protocols:
+                ctx.set_alpn_protos(self.acceptable_protocols)
+            return ScrapyClientTLSOptions(hostname.decode("ascii"), ctx,
+                                          self.tls_session_cache, port)
 
 
     @implementer(IPolicyForHTTPS)
@@ -80,11 +96,14 @@ if twisted_version >= (14, 0, 0):
             #
             # This means that a website like https://www.cacert.org will be rejected
             # by default, since CAcert.org CA certificate is seldom shipped.
+            kwargs = {}
+            if self.acceptable_protocols:
+                kwargs['acceptableProtocols'] = self.acceptable_protocols
             return optionsForClientTLS(hostname.decode("ascii"),
                                        trustRoot=platformTrust(),
                                        extraCertificateOptions={
                                             'method': self._ssl_method,
-                                       })
+                                       }, **kwargs)
 
 else:
 
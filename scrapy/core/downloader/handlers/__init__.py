@@ -20,6 +20,7 @@ class DownloadHandlers(object):
         self._schemes = {}  # stores acceptable schemes on instancing
         self._handlers = {}  # stores instanced handlers for schemes
         self._notconfigured = {}  # remembers failed handlers
+        self._max_per_host = None  # set by set_max_per_host
         handlers = without_none_values(
             crawler.settings.getwithbase('DOWNLOAD_HANDLERS'))
         for scheme, clspath in six.iteritems(handlers):
@@ -42,7 +43,10 @@ class DownloadHandlers(object):
         path = self._schemes[scheme]
         try:
             dhcls = load_object(path)
-            dh = dhcls(self._crawler.settings)
+            if hasattr(dhcls, 'from_crawler'):
+                dh = dhcls.from_crawler(self._crawler)
+            else:
+                dh = dhcls(self._crawler.settings)
         except NotConfigured as ex:
             self._notconfigured[scheme] = str(ex)
             return None
@@ -53,9 +57,20 @@ class DownloadHandlers(object):
             self._notconfigured[scheme] = str(ex)
             return None
         else:
+            if self._max_per_host is not None and \
+                    hasattr(dh, 'set_max_per_host'):
+                dh.set_max_per_host(self._max_per_host)
             self._handlers[scheme] = dh
         return self._handlers[scheme]
 
+    def set_max_per_host(self, count):
+        """Let the download handlers which support it keep up to ``count``
+        persistent connections per host, including handlers loaded later"""
+        self._max_per_host = count
+        for dh in self._handlers.values():
+            if hasattr(dh, 'set_max_per_host'):
+                dh.set_max_per_host(count)
+
     def download_request(self, request, spider):
         scheme = urlparse_cached(request).scheme
         handler = self._get_handler(scheme)
@@ -2,19 +2,35 @@
 
 import re
 import logging
+import tempfile
+from collections import defaultdict, Counter
+from functools import partial
 from io import BytesIO
 from time import time
+try:
+    from time import process_time
+except ImportError:
+    # Python 2
+    from time import clock as process_time
 import warnings
 from six.moves.urllib.parse import urldefrag
 
 from zope.interface import implementer
 from twisted.internet import defer, reactor, protocol
+from twisted.internet.abstract import isIPAddress, isIPv6Address
+from twisted.internet.interfaces import IStreamClientEndpoint
 from twisted.web.http_headers import Headers as TxHeaders
 from twisted.web.iweb import IBodyProducer, UNKNOWN_LENGTH
 from twisted.internet.error import TimeoutError
 from twisted.web.http import _DataLoss, PotentialDataLoss
 from twisted.web.client import Agent, ProxyAgent, ResponseDone, \
-    HTTPConnectionPool, ResponseFailed
+    HTTPConnectionPool, ResponseFailed, _HTTP11ClientFactory
+from twisted.web._newclient import HTTP11ClientProtocol
+try:
+    from twisted.internet.interfaces import IHandshakeListener
+except ImportError:
+    # Twisted versions which don't notify protocols of TLS handshakes
+    IHandshakeListener = None
 try:
     from twisted.web.client import URI
 except ImportError:
@@ -24,48 +40,213 @@ from twisted.internet.endpoints import TCP4ClientEndpoint
 from scrapy.http import Headers
 from scrapy.responsetypes import responsetypes
 from scrapy.core.downloader.webclient import _parse
-from scrapy.core.downloader.tls import openssl_methods
+from scrapy.core.downloader.bandwidth import BandwidthLimiter
+from scrapy.core.downloader.tls import openssl_methods, TLSSessionCache
+from scrapy.utils.contentencoding import get_decoder, DecodedSizeError
 from scrapy.utils.misc import load_object
-from scrapy.utils.python import to_bytes, to_unicode
+from scrapy.utils.reactor import TimerWheel
+from scrapy.utils.python import to_bytes, to_unicode, to_native_str
 from scrapy import twisted_version
 
 logger = logging.getLogger(__name__)
 
 
-class HTTP11DownloadHandler(object):
+class _ScrapyHTTP11ClientProtocol(HTTP11ClientProtocol):
+    """HTTP11ClientProtocol which calls ``handshake_listener`` once the TLS
+    handshake of its connection completes"""
 
-    def __init__(self, settings):
-        self._pool = HTTPConnectionPool(reactor, persistent=True)
-        self._pool.maxPersistentPerHost = settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN')
-        self._pool._factory.noisy = False
+    handshake_listener = None
 
-        self._sslMethod = openssl_methods[settings.get('DOWNLOADER_CLIENT_TLS_METHOD')]
-        self._contextFactoryClass = load_object(settings['DOWNLOADER_CLIENTCONTEXTFACTORY'])
-        # try method-aware context factory
-        try:
-            self._contextFactory = self._contextFactoryClass(method=self._sslMethod)
-        except TypeError:
-            # use context factory defaults
-            self._contextFactory = self._contextFactoryClass()
-            msg = """
+    def handshakeCompleted(self):
+        listener, self.handshake_listener = self.handshake_listener, None
+        if listener is not None:
+            listener()
+
+if IHandshakeListener is not None:
+    _ScrapyHTTP11ClientProtocol = implementer(IHandshakeListener)(
+        _ScrapyHTTP11ClientProtocol)
+
+
+class _ScrapyHTTP11ClientFactory(_HTTP11ClientFactory):
+
+    def buildProtocol(self, addr):
+        return _ScrapyHTTP11ClientProtocol(self._quiescentCallback)
+
+
+class ScrapyConnectionPool(HTTPConnectionPool):
+    """HTTPConnectionPool which counts how connections are created, reused
+    and closed, per host, and which can limit the total number of cached
+    connections.
+
+    When more than ``maxsize`` connections are cached, the connection idle for
+    the longest time (``eviction='lru'``) or the connection just returned to
+    the pool (``eviction='mru'``) is closed.
+    """
+
+    counters = ('reused', 'new', 'tls_handshake', 'idle_closed', 'evicted',
+                'error')
+    _factory = _ScrapyHTTP11ClientFactory
+
+    def __init__(self, reactor, persistent=True, stats=None, maxsize=0,
+                 eviction='lru'):
+        super(ScrapyConnectionPool, self).__init__(reactor, persistent)
+        if eviction not in ('lru', 'mru'):
+            raise ValueError("Unknown connection pool eviction policy: %r"
+                             % (eviction,))
+        self.stats = stats
+        self.maxsize = maxsize
+        self.eviction = eviction
+        self.hosts = defaultdict(Counter)
+
+    @property
+    def cached(self):
+        """Number of idle connections in the pool"""
+        return sum(len(c) for c in self._connections.values())
+
+    def status(self):
+        """Return a list of ``(host, counters)`` tuples, where counters
+        include the number of connections currently cached for the host"""
+        cached = Counter()
+        for key, connections in self._connections.items():
+            cached[_pool_host(key)] += len(connections)
+        status = []
+        for host in sorted(set(self.hosts) | set(cached)):
+            counters = dict((c, self.hosts[host][c]) for c in self.counters)
+            counters['cached'] = cached[host]
+            status.append((host, counters))
+        return status
+
+    def _inc(self, key, counter):
+        self.hosts[_pool_host(key)][counter] += 1
+        if self.stats is not None:
+            self.stats.inc_value('downloader/pool/%s' % counter)
+
+    def getConnection(self, key, endpoint):
+        if any(c.state == 'QUIESCENT' for c in self._connections.get(key, ())):
+            self._inc(key, 'reused')
+        return super(ScrapyConnectionPool, self).getConnection(key, endpoint)
+
+    def _newConnection(self, key, endpoint):
+        self._inc(key, 'new')
+        d = super(ScrapyConnectionPool, self)._newConnection(key, endpoint)
+        d.addCallbacks(self._connected, self._connectionFailed,
+                       callbackArgs=(key,), errbackArgs=(key,))
+        return d
+
+    def _connected(self, connection, key):
+        if to_bytes(key[0]) == b'https':
+            self._inc(key, 'tls_handshake')
+        return connection
+
+    def _connectionFailed(self, failure, key):
+        self._inc(key, 'error')
+        return failure
+
+    def _removeConnection(self, key, connection):
+        # only called when cachedConnectionTimeout expires
+        self._inc(key, 'idle_closed')
+        super(ScrapyConnectionPool, self)._removeConnection(key, connection)
+
+    def _putConnection(self, key, connection):
+        connections = self._connections.get(key)
+        if connection.state == 'QUIESCENT' and connections and \
+                len(connections) >= self.maxPersistentPerHost:
+            self._inc(key, 'evicted')
+        super(ScrapyConnectionPool, self)._putConnection(key, connection)
+        while self.maxsize and self.cached > self.maxsize:
+            if self.eviction == 'mru':
+                self._evictConnection(key, connection)
+            else:
+                # the oldest connection of each key comes first, and expires
+                # first since all of them share the same idle timeout
+                oldest = min(((k, c[0]) for k, c in self._connections.items() if c),
+                             key=lambda kc: self._timeouts[kc[1]].getTime())
+                self._evictConnection(*oldest)
+
+    def _evictConnection(self, key, connection):
+        self._inc(key, 'evicted')
+        self._timeouts.pop(connection).cancel()
+        self._connections[key].remove(connection)
+        connection.transport.loseConnection()
+
+
+def _pool_host(key):
+    return '%s:%s' % (to_unicode(key[1]), key[2])
+
+
+def load_context_factory(settings, crawler=None):
+    """Return an instance of the ``DOWNLOADER_CLIENTCONTEXTFACTORY`` setting,
+    using the ``DOWNLOADER_CLIENT_TLS_*`` settings"""
+    sslMethod = openssl_methods[settings.get('DOWNLOADER_CLIENT_TLS_METHOD')]
+    contextFactoryClass = load_object(settings['DOWNLOADER_CLIENTCONTEXTFACTORY'])
+    # try method-aware context factory
+    try:
+        contextFactory = contextFactoryClass(method=sslMethod)
+    except TypeError:
+        # use context factory defaults
+        contextFactory = contextFactoryClass()
+        msg = """
  '%s' does not accept `method` argument (type OpenSSL.SSL method,\
  e.g. OpenSSL.SSL.SSLv23_METHOD).\
  Please upgrade your context factory class to handle it or ignore it.""" % (
-                settings['DOWNLOADER_CLIENTCONTEXTFACTORY'],)
-            warnings.warn(msg)
+            settings['DOWNLOADER_CLIENTCONTEXTFACTORY'],)
+        warnings.warn(msg)
+    cache_size = settings.getint('DOWNLOADER_CLIENT_TLS_SESSION_CACHE_SIZE')
+    if cache_size and hasattr(contextFactory, 'tls_session_cache'):
+        contextFactory.tls_session_cache = TLSSessionCache(
+            cache_size, stats=crawler.stats if crawler is not None else None)
+    return contextFactory
+
+
+class HTTP11DownloadHandler(object):
+
+    def __init__(self, settings, crawler=None):
+        self._pool = ScrapyConnectionPool(
+            reactor, persistent=True,
+            stats=crawler.stats if crawler is not None else None,
+            maxsize=settings.getint('DOWNLOAD_POOL_MAXSIZE'),
+            eviction=settings.get('DOWNLOAD_POOL_EVICTION'))
+        self._pool.maxPersistentPerHost = settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN')
+        self._pool.cachedConnectionTimeout = settings.getfloat('DOWNLOAD_POOL_IDLE_TIMEOUT')
+        self._pool._factory.noisy = False
+
+        self._contextFactory = load_context_factory(settings, crawler)
+        self._stats = crawler.stats if crawler is not None else None
+        # download timeouts of all requests share a timer wheel
+        self._timers = TimerWheel(settings.getfloat('DOWNLOAD_TIMER_RESOLUTION'))
+        if crawler is not None:
+            self._limiter = BandwidthLimiter.from_crawler(crawler)
+        else:
+            self._limiter = BandwidthLimiter.from_settings(settings)
         self._default_maxsize = settings.getint('DOWNLOAD_MAXSIZE')
         self._default_warnsize = settings.getint('DOWNLOAD_WARNSIZE')
+        self._default_spoolsize = settings.getint('DOWNLOAD_SPOOLSIZE')
         self._fail_on_dataloss = settings.getbool('DOWNLOAD_FAIL_ON_DATALOSS')
+        # looking up host names before connecting is only cheap when the
+        # endpoint finds them in the DNS cache afterwards
+        self._time_dns = settings.getbool('DNSCACHE_ENABLED')
         self._disconnect_timeout = 1
 
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings, crawler)
+
     def download_request(self, request, spider):
         """Return a deferred for the HTTP download"""
         agent = ScrapyAgent(contextFactory=self._contextFactory, pool=self._pool,
             maxsize=getattr(spider, 'download_maxsize', self._default_maxsize),
             warnsize=getattr(spider, 'download_warnsize', self._default_warnsize),
-            fail_on_dataloss=self._fail_on_dataloss)
+            fail_on_dataloss=self._fail_on_dataloss,
+            spoolsize=getattr(spider, 'download_spoolsize', self._default_spoolsize),
+            time_dns=self._time_dns, timers=self._timers, limiter=self._limiter,
+            stats=self._stats)
         return agent.download_request(request)
 
+    def set_max_per_host(self, count):
+        """Keep up to ``count`` persistent connections per host, instead of
+        ``CONCURRENT_REQUESTS_PER_DOMAIN``"""
+        self._pool.maxPersistentPerHost = count
+
     def close(self):
         d = self._pool.closeCachedConnections()
         # closeCachedConnections will hang on network or server issues, so
@@ -260,14 +441,106 @@ class ScrapyProxyAgent(Agent):
                                          bodyProducer, uri)
 
 
+class _DownloadTimer(object):
+    """Record the duration of each phase of a download, since the end of
+    the previous one, in the ``download_timings`` dict of the request meta"""
+
+    def __init__(self, request):
+        self.request = request
+        self.timings = request.meta['download_timings'] = {}
+        self.start = self.last = time()
+
+    def mark(self, phase):
+        now = time()
+        self.timings[phase] = now - self.last
+        self.last = now
+
+    def connecting(self):
+        self.request.meta['download_connection_reused'] = False
+        # preparing the connection, e.g. the TLS connection creator
+        self.mark('setup')
+
+
+@implementer(IStreamClientEndpoint)
+class _TimingEndpoint(object):
+    """Endpoint wrapper marking the DNS lookup, TCP connect and TLS
+    handshake of new connections on a :class:`_DownloadTimer`
+
+    ``host`` is looked up before connecting, so that the endpoint then finds
+    it in the DNS cache, unless it is ``None``.
+    """
+
+    def __init__(self, endpoint, timer, host=None, tls=False):
+        self._endpoint = endpoint
+        self._timer = timer
+        self._host = host
+        self._tls = tls
+
+    def connect(self, protocolFactory):
+        self._timer.connecting()
+        if self._host is None or isIPAddress(self._host) or \
+                isIPv6Address(self._host):
+            d = self._endpoint.connect(protocolFactory)
+        else:
+            d = self._resolve(self._host)
+            d.addCallback(self._resolved, protocolFactory)
+        d.addCallback(self._connected)
+        return d
+
+    def _resolve(self, host):
+        d = defer.Deferred()
+        reactor.resolve(host).addBoth(self._lookup_done, d)
+        return d
+
+    @staticmethod
+    def _lookup_done(result, d):
+        # cancelling the connection abandons the lookup, which resolvers
+        # can't cancel
+        if not d.called:
+            d.callback(result)
+
+    def _resolved(self, _, protocolFactory):
+        self._timer.mark('dns')
+        return self._endpoint.connect(protocolFactory)
+
+    def _connected(self, protocol):
+        self._timer.mark('connect')
+        if self._tls and isinstance(protocol, _ScrapyHTTP11ClientProtocol):
+            protocol.handshake_listener = partial(self._timer.mark, 'tls')
+        return protocol
+
+
+class _TimingAgent(Agent):
+    """Agent which marks the phases of the connections it opens on a
+    :class:`_DownloadTimer`, and flags requests sent on reused connections"""
+
+    def __init__(self, reactor, timer=None, time_dns=False, **kwargs):
+        super(_TimingAgent, self).__init__(reactor, **kwargs)
+        self._timer = timer
+        self._time_dns = time_dns
+
+    if twisted_version >= (15, 0, 0):
+
+        def _getEndpoint(self, uri):
+            endpoint = super(_TimingAgent, self)._getEndpoint(uri)
+            if self._timer is None:
+                return endpoint
+            # until the pool connects the endpoint for the request
+            self._timer.request.meta['download_connection_reused'] = True
+            host = to_native_str(uri.host) if self._time_dns else None
+            return _TimingEndpoint(endpoint, self._timer, host,
+                                   tls=uri.scheme == b'https')
+
+
 class ScrapyAgent(object):
 
-    _Agent = Agent
+    _Agent = _TimingAgent
     _ProxyAgent = ScrapyProxyAgent
     _TunnelingAgent = TunnelingAgent
 
     def __init__(self, contextFactory=None, connectTimeout=10, bindAddress=None, pool=None,
-                 maxsize=0, warnsize=0, fail_on_dataloss=True):
+                 maxsize=0, warnsize=0, fail_on_dataloss=True, spoolsize=0,
+                 time_dns=False, timers=None, limiter=None, stats=None):
         self._contextFactory = contextFactory
         self._connectTimeout = connectTimeout
         self._bindAddress = bindAddress
@@ -275,9 +548,14 @@ class ScrapyAgent(object):
         self._maxsize = maxsize
         self._warnsize = warnsize
         self._fail_on_dataloss = fail_on_dataloss
+        self._spoolsize = spoolsize
+        self._time_dns = time_dns
+        self._timers = timers if timers is not None else reactor
+        self._limiter = limiter
+        self._stats = stats
         self._txresponse = None
 
-    def _get_agent(self, request, timeout):
+    def _get_agent(self, request, timeout, timer=None):
         bindaddress = request.meta.get('bindaddress') or self._bindAddress
         proxy = request.meta.get('proxy')
         if proxy:
@@ -296,11 +574,13 @@ class ScrapyAgent(object):
                     connectTimeout=timeout, bindAddress=bindaddress, pool=self._pool)
 
         return self._Agent(reactor, contextFactory=self._contextFactory,
-            connectTimeout=timeout, bindAddress=bindaddress, pool=self._pool)
+            connectTimeout=timeout, bindAddress=bindaddress, pool=self._pool,
+            timer=timer, time_dns=self._time_dns)
 
     def download_request(self, request):
         timeout = request.meta.get('download_timeout') or self._connectTimeout
-        agent = self._get_agent(request, timeout)
+        timer = _DownloadTimer(request)
+        agent = self._get_agent(request, timeout, timer)
 
         # request details
         url = urldefrag(request.url)[0]
@@ -326,16 +606,16 @@ class ScrapyAgent(object):
             bodyproducer = _RequestBodyProducer(b'')
         else:
             bodyproducer = None
-        start_time = time()
         d = agent.request(
             method, to_bytes(url, encoding='ascii'), headers, bodyproducer)
         # set download latency
-        d.addCallback(self._cb_latency, request, start_time)
+        d.addCallback(self._cb_latency, request, timer)
         # response body is ready to be consumed
         d.addCallback(self._cb_bodyready, request)
+        d.addCallback(self._cb_transferred, timer)
         d.addCallback(self._cb_bodydone, request, url)
         # check download timeout
-        self._timeout_cl = reactor.callLater(timeout, d.cancel)
+        self._timeout_cl = self._timers.callLater(timeout, d.cancel)
         d.addBoth(self._cb_timeout, request, url, timeout)
         return d
 
@@ -350,19 +630,41 @@ class ScrapyAgent(object):
 
         raise TimeoutError("Getting %s took longer than %s seconds." % (url, timeout))
 
-    def _cb_latency(self, result, request, start_time):
-        request.meta['download_latency'] = time() - start_time
+    def _cb_latency(self, result, request, timer):
+        timer.mark('ttfb')
+        request.meta['download_latency'] = timer.last - timer.start
+        return result
+
+    def _cb_transferred(self, result, timer):
+        timer.mark('transfer')
         return result
 
     def _cb_bodyready(self, txresponse, request):
+        maxsize = request.meta.get('download_maxsize', self._maxsize)
+        decoding = None
+        if txresponse.length != 0:
+            decoding = self._get_decoding(txresponse, request, maxsize)
+
+        consumer = request.meta.get('body_consumer')
+        if consumer is not None and 200 <= txresponse.code < 300:
+            stream_response = self._cb_bodydone(
+                (txresponse, b'', ['streamed']), request,
+                urldefrag(request.url)[0])
+            stream_response.request = request
+        else:
+            consumer = stream_response = None
+
         # deliverBody hangs for responses without body
         if txresponse.length == 0:
+            if consumer is not None:
+                _feed_consumer(consumer, stream_response, b'')
+                return txresponse, b'', ['streamed']
             return txresponse, b'', None
 
-        maxsize = request.meta.get('download_maxsize', self._maxsize)
         warnsize = request.meta.get('download_warnsize', self._warnsize)
         expected_size = txresponse.length if txresponse.length != UNKNOWN_LENGTH else -1
         fail_on_dataloss = request.meta.get('download_fail_on_dataloss', self._fail_on_dataloss)
+        spoolsize = request.meta.get('download_spoolsize', self._spoolsize)
 
         if maxsize and expected_size > maxsize:
             error_msg = ("Cancelling download of %(url)s: expected response "
@@ -383,20 +685,48 @@ class ScrapyAgent(object):
             txresponse._transport._producer.abortConnection()
 
         d = defer.Deferred(_cancel)
-        txresponse.deliverBody(_ResponseReader(
-            d, txresponse, request, maxsize, warnsize, fail_on_dataloss))
+        buckets = self._limiter.buckets(request) if self._limiter else []
+        reader = _ResponseReader(
+            d, txresponse, request, maxsize, warnsize, fail_on_dataloss,
+            spoolsize, consumer, stream_response, self._limiter, buckets,
+            self._timers, decoding)
+        if consumer is None and spoolsize and expected_size > spoolsize:
+            reader.spool()
+        elif consumer is not None:
+            d.addErrback(_refuse_retry, request, reader)
+        txresponse.deliverBody(reader)
 
         # save response for timeouts
         self._txresponse = txresponse
 
         return d
 
+    def _get_decoding(self, txresponse, request, maxsize):
+        """Return the decoding of the last content coding of the response
+        body, and remove it from the response headers, if it is supported"""
+        encodings = txresponse.headers.getRawHeaders(b'Content-Encoding')
+        decoding = _BodyDecoding.get(request, encodings, maxsize, self._stats)
+        if decoding is None:
+            return None
+        if len(encodings) > 1:
+            txresponse.headers.setRawHeaders(b'Content-Encoding', encodings[:-1])
+        else:
+            txresponse.headers.removeHeader(b'Content-Encoding')
+        return decoding
+
     def _cb_bodydone(self, result, request, url):
         txresponse, body, flags = result
         status = int(txresponse.code)
         headers = Headers(txresponse.headers.getAllRawHeaders())
-        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
-        return respcls(url=url, status=status, headers=headers, body=body, flags=flags)
+        if isinstance(body, bytes):
+            respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+            return respcls(url=url, status=status, headers=headers, body=body,
+                           flags=flags)
+        body.seek(0)
+        respcls = responsetypes.from_args(headers=headers, url=url,
+                                          body=body.read(5000))
+        return respcls(url=url, status=status, headers=headers, bodyfile=body,
+                       flags=flags)
 
 
 @implementer(IBodyProducer)
@@ -417,10 +747,89 @@ class _RequestBodyProducer(object):
         pass
 
 
+class _BodyDecoding(object):
+    """Decode a response body of a content coding as it is received, timing
+    the CPU time spent, for the download_decode_content request meta key"""
+
+    def __init__(self, decoder, stats=None):
+        self.decoder = decoder
+        self.stats = stats
+        self.time = 0
+        self.received = 0
+
+    @classmethod
+    def get(cls, request, encodings, maxsize=0, stats=None):
+        """Return the decoding of the last of the content codings
+        ``encodings`` of the response to ``request``, if it asks for it and
+        the content coding is supported, or ``None``"""
+        if not encodings or request.method == 'HEAD' or \
+                not request.meta.get('download_decode_content'):
+            return None
+        decoder = get_decoder(encodings[-1], max_size=maxsize)
+        return cls(decoder, stats) if decoder is not None else None
+
+    @property
+    def encoding(self):
+        return self.decoder.encoding.decode('latin-1')
+
+    def decode(self, data):
+        """Return an iterator over the decoded chunks of ``data``, which
+        raises the decoding errors, including
+        :exc:`~scrapy.utils.contentencoding.DecodedSizeError`"""
+        self.received += len(data)
+        chunks = None
+        while True:
+            start = process_time()
+            try:
+                if chunks is None:
+                    chunks = iter(self.decoder.decompress(data))
+                chunk = next(chunks, None)
+            finally:
+                self.time += process_time() - start
+            if chunk is None:
+                return
+            yield chunk
+
+    def flush(self):
+        start = process_time()
+        try:
+            return self.decoder.flush()
+        finally:
+            self.time += process_time() - start
+
+    def record(self, decoded):
+        """Record the decoding, of ``decoded`` bytes, in stats"""
+        if self.stats is None:
+            return
+        self.stats.inc_value('downloader/decoding/time', self.time)
+        self.stats.inc_value('downloader/decoding/bytes', self.received)
+        self.stats.inc_value('downloader/decoding/decoded_bytes', decoded)
+        self.stats.inc_value('downloader/decoding/%s' % self.encoding)
+
+
+def _refuse_retry(failure, request, reader):
+    """Errback of downloads streamed to the body consumer of ``request``,
+    which prevents retrying them once ``reader`` fed it some chunks, as the
+    consumer would then get a second body after the partial one"""
+    if reader._consumer is not None and reader._bytes_decoded:
+        request.meta['dont_retry'] = True
+    return failure
+
+
+def _feed_consumer(consumer, response, chunk):
+    try:
+        consumer(response, chunk)
+    except Exception:
+        logger.error("Error feeding the body of %(response)s to its body "
+                     "consumer", {'response': response}, exc_info=True)
+
+
 class _ResponseReader(protocol.Protocol):
 
     def __init__(self, finished, txresponse, request, maxsize, warnsize,
-                 fail_on_dataloss):
+                 fail_on_dataloss, spoolsize=0, consumer=None,
+                 stream_response=None, limiter=None, buckets=(), timers=None,
+                 decoding=None):
         self._finished = finished
         self._txresponse = txresponse
         self._request = request
@@ -431,6 +840,29 @@ class _ResponseReader(protocol.Protocol):
         self._fail_on_dataloss_warned = False
         self._reached_warnsize = False
         self._bytes_received = 0
+        # size of the body after decoding its content coding, if any
+        self._bytes_decoded = 0
+        self._spoolsize = spoolsize
+        self._spooled = False
+        # body chunks go to the request body consumer instead of _bodybuf
+        self._consumer = consumer
+        self._stream_response = stream_response
+        # token buckets limiting the bandwidth of the download, if any
+        self._limiter = limiter
+        self._buckets = buckets
+        self._timers = timers if timers is not None else reactor
+        self._resume_call = None
+        # body chunks are decoded as they arrive, see download_decode_content
+        self._decoding = decoding
+
+    def spool(self):
+        """Move the body buffer to a temporary file, for large bodies"""
+        if self._spooled:
+            return
+        bodyfile = tempfile.TemporaryFile()
+        bodyfile.write(self._bodybuf.getvalue())
+        self._bodybuf = bodyfile
+        self._spooled = True
 
     def dataReceived(self, bodyBytes):
         # This maybe called several times after cancel was called with buffered
@@ -438,43 +870,114 @@ class _ResponseReader(protocol.Protocol):
         if self._finished.called:
             return
 
-        self._bodybuf.write(bodyBytes)
         self._bytes_received += len(bodyBytes)
+        if self._buckets:
+            self._throttle(len(bodyBytes))
+
+        if self._decoding is None:
+            self._write(bodyBytes)
+            return
+
+        try:
+            for chunk in self._decoding.decode(bodyBytes):
+                self._write(chunk)
+                # stop decoding as soon as the decoded body is too large
+                if self._finished.called:
+                    break
+        except DecodedSizeError as e:
+            self._too_large(e.args[0])
+        except Exception:
+            self._decode_failed()
+
+    def _write(self, data):
+        if self._consumer is not None:
+            _feed_consumer(self._consumer, self._stream_response, data)
+        else:
+            self._bodybuf.write(data)
+        self._bytes_decoded += len(data)
+
+        if self._consumer is None and self._spoolsize and self._bytes_decoded > self._spoolsize:
+            self.spool()
 
-        if self._maxsize and self._bytes_received > self._maxsize:
-            logger.error("Received (%(bytes)s) bytes larger than download "
-                         "max size (%(maxsize)s) in request %(request)s.",
-                         {'bytes': self._bytes_received,
-                          'maxsize': self._maxsize,
-                          'request': self._request})
-            # Clear buffer earlier to avoid keeping data in memory for a long
-            # time.
-            self._bodybuf.truncate(0)
-            self._finished.cancel()
-
-        if self._warnsize and self._bytes_received > self._warnsize and not self._reached_warnsize:
+        if self._maxsize and self._bytes_decoded > self._maxsize:
+            self._too_large(self._bytes_decoded)
+
+        if self._warnsize and self._bytes_decoded > self._warnsize and not self._reached_warnsize:
             self._reached_warnsize = True
             logger.warning("Received more bytes than download "
                            "warn size (%(warnsize)s) in request %(request)s.",
                            {'warnsize': self._warnsize,
                             'request': self._request})
 
+    def _too_large(self, size):
+        logger.error("Received (%(bytes)s) bytes larger than download "
+                     "max size (%(maxsize)s) in request %(request)s.",
+                     {'bytes': size,
+                      'maxsize': self._maxsize,
+                      'request': self._request})
+        # Clear buffer earlier to avoid keeping data in memory for a long
+        # time.
+        self._bodybuf.truncate(0)
+        self._finished.cancel()
+
+    def _decode_failed(self):
+        logger.error("Error decoding the %(encoding)s response body of "
+                     "request %(request)s.",
+                     {'encoding': self._decoding.encoding,
+                      'request': self._request}, exc_info=True)
+        self._bodybuf.truncate(0)
+        self._finished.errback()
+        self.transport.stopProducing()
+
+    def _flush_decoding(self):
+        try:
+            data = self._decoding.flush()
+        except Exception:
+            self._decode_failed()
+            return
+        if data:
+            self._write(data)
+
+    def _throttle(self, size):
+        delay = self._limiter.consume(self._buckets, size)
+        if delay > 0 and self._resume_call is None:
+            self.transport.pauseProducing()
+            self._resume_call = self._timers.callLater(delay, self._resume)
+            self._limiter.throttled(delay)
+
+    def _resume(self):
+        self._resume_call = None
+        self.transport.resumeProducing()
+
     def connectionLost(self, reason):
+        if self._resume_call is not None:
+            self._resume_call.cancel()
+            self._resume_call = None
+        if self._buckets:
+            self._limiter.update_stats()
+        if self._decoding is not None:
+            if not self._finished.called:
+                self._flush_decoding()
+            self._decoding.record(self._bytes_decoded)
         if self._finished.called:
             return
 
-        body = self._bodybuf.getvalue()
+        if self._spooled:
+            body = self._bodybuf
+            body.flush()
+        else:
+            body = self._bodybuf.getvalue()
         if reason.check(ResponseDone):
-            self._finished.callback((self._txresponse, body, None))
+            self._done(body, [])
             return
 
         if reason.check(PotentialDataLoss):
-            self._finished.callback((self._txresponse, body, ['partial']))
+            self._done(body, ['partial'])
             return
 
         if reason.check(ResponseFailed) and any(r.check(_DataLoss) for r in reason.value.reasons):
             if not self._fail_on_dataloss:
-                self._finished.callback((self._txresponse, body, ['dataloss']))
+                self._done(body, ['dataloss'])
                 return
 
             elif not self._fail_on_dataloss_warned:
@@ -485,3 +988,10 @@ class _ResponseReader(protocol.Protocol):
                 self._fail_on_dataloss_warned = True
 
         self._finished.errback(reason)
+
+    def _done(self, body, flags):
+        if self._consumer is not None:
+            # an empty chunk tells the consumer that the body is complete
+            _feed_consumer(self._consumer, self._stream_response, b'')
+            flags.append('streamed')
+        self._finished.callback((self._txresponse, body, flags or None))
@@ -0,0 +1,703 @@
+"""Download handler for https using HTTP/2, falling back to HTTP/1.1"""
+
+import logging
+import tempfile
+from collections import defaultdict, deque, Counter
+from io import BytesIO
+from six.moves.urllib.parse import urldefrag
+
+from zope.interface import classImplements
+from twisted.internet import defer, reactor, protocol
+from twisted.internet.endpoints import TCP4ClientEndpoint, wrapClientTLS
+from twisted.internet.error import TimeoutError, ConnectionLost
+from twisted.python.failure import Failure
+from twisted.web.client import ResponseFailed
+from twisted.web.http import _DataLoss
+try:
+    from twisted.internet.interfaces import IHandshakeListener
+except ImportError:
+    # Twisted versions which don't notify protocols of TLS handshakes
+    IHandshakeListener = None
+try:
+    from h2 import events
+    from h2.config import H2Configuration
+    from h2.connection import H2Connection
+    from h2.errors import ErrorCodes
+    from h2.exceptions import ProtocolError
+except ImportError:
+    H2Connection = None
+
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.core.downloader.webclient import _parse
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler, \
+    load_context_factory, _feed_consumer, _pool_host, _DownloadTimer, \
+    _BodyDecoding, _refuse_retry
+from scrapy.utils.contentencoding import DecodedSizeError
+from scrapy.utils.python import to_bytes, to_unicode
+
+logger = logging.getLogger(__name__)
+
+# concurrent streams sent before the server tells its limit, which is the
+# minimum limit recommended by RFC 7540 and the most common one
+_INITIAL_MAX_CONCURRENT_STREAMS = 100
+
+# headers of HTTP/1.x connections, which HTTP/2 forbids
+_CONNECTION_HEADERS = frozenset([b'connection', b'keep-alive', b'proxy-connection',
+                                 b'transfer-encoding', b'upgrade', b'host'])
+
+
+class H2DownloadHandler(object):
+    """Download handler which multiplexes concurrent requests to the same
+    host over a single HTTP/2 connection, negotiated through ALPN.
+
+    Plain http URLs, requests sent through proxies and hosts which don't
+    negotiate HTTP/2 are downloaded by :class:`HTTP11DownloadHandler`.
+    """
+
+    def __init__(self, settings, crawler=None):
+        if H2Connection is None or IHandshakeListener is None:
+            raise NotConfigured('HTTP/2 downloads require the h2 library '
+                                'and Twisted >= 17.9')
+        contextFactory = load_context_factory(settings, crawler)
+        if not hasattr(contextFactory, 'acceptable_protocols'):
+            raise NotConfigured('%s does not support ALPN, needed by HTTP/2 '
+                                'downloads' % settings['DOWNLOADER_CLIENTCONTEXTFACTORY'])
+        contextFactory.acceptable_protocols = [b'h2', b'http/1.1']
+        self._contextFactory = contextFactory
+        self._pool = H2ConnectionPool(
+            reactor, contextFactory,
+            idle_timeout=settings.getfloat('DOWNLOAD_POOL_IDLE_TIMEOUT'),
+            stats=crawler.stats if crawler is not None else None)
+        self._http11 = HTTP11DownloadHandler(settings, crawler)
+        # download timeouts share the timer wheel of the HTTP/1.1 handler
+        self._timers = self._http11._timers
+        self._default_maxsize = settings.getint('DOWNLOAD_MAXSIZE')
+        self._default_warnsize = settings.getint('DOWNLOAD_WARNSIZE')
+        self._default_spoolsize = settings.getint('DOWNLOAD_SPOOLSIZE')
+        self._fail_on_dataloss = settings.getbool('DOWNLOAD_FAIL_ON_DATALOSS')
+        self._timeout = settings.getfloat('DOWNLOAD_TIMEOUT')
+        self._stats = crawler.stats if crawler is not None else None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings, crawler)
+
+    def download_request(self, request, spider):
+        """Return a deferred for the HTTP/2 download"""
+        scheme, _, host, port, _ = _parse(request.url)
+        key = (scheme, host, port)
+        if scheme != b'https' or request.meta.get('proxy') or \
+                key in self._pool.http11_hosts:
+            return self._http11.download_request(request, spider)
+
+        meta = request.meta
+        stream = _H2Stream(
+            request,
+            maxsize=meta.get('download_maxsize', getattr(
+                spider, 'download_maxsize', self._default_maxsize)),
+            warnsize=meta.get('download_warnsize', getattr(
+                spider, 'download_warnsize', self._default_warnsize)),
+            fail_on_dataloss=meta.get('download_fail_on_dataloss',
+                                      self._fail_on_dataloss),
+            spoolsize=meta.get('download_spoolsize', getattr(
+                spider, 'download_spoolsize', self._default_spoolsize)),
+            timeout=meta.get('download_timeout') or self._timeout,
+            bindaddress=meta.get('bindaddress'), stats=self._stats)
+        d = self._pool.get_connection(key, stream.timeout, stream.bindaddress)
+        d.addCallback(self._cb_connected, request, spider, stream)
+        # check download timeout
+        timeout_cl = self._timers.callLater(stream.timeout, d.cancel)
+        d.addBoth(self._cb_timeout, timeout_cl, stream.url, stream.timeout)
+        return d
+
+    def _cb_connected(self, connection, request, spider, stream):
+        if connection is None:
+            # the host negotiated HTTP/1.1
+            return self._http11.download_request(request, spider)
+        connection.request(stream)
+        return stream.finished
+
+    def _cb_timeout(self, result, timeout_cl, url, timeout):
+        if timeout_cl.active():
+            timeout_cl.cancel()
+            return result
+        raise TimeoutError("Getting %s took longer than %s seconds." % (url, timeout))
+
+    def set_max_per_host(self, count):
+        """Keep up to ``count`` persistent HTTP/1.1 connections per host; HTTP/2
+        hosts get a single connection"""
+        self._http11.set_max_per_host(count)
+
+    def close(self):
+        return defer.DeferredList([self._pool.close(), self._http11.close()])
+
+
+class H2ConnectionPool(object):
+    """Keep one HTTP/2 connection per host, and remember the hosts which
+    negotiated HTTP/1.1 instead.
+
+    Connections without active streams are closed after ``idle_timeout``
+    seconds.
+    """
+
+    counters = ('new', 'error', 'http11_fallback', 'requeued')
+
+    def __init__(self, reactor, contextFactory, idle_timeout=0, stats=None):
+        self._reactor = reactor
+        self._contextFactory = contextFactory
+        self.idle_timeout = idle_timeout
+        self.stats = stats
+        self.hosts = defaultdict(Counter)
+        self.http11_hosts = set()
+        self._connections = {}
+        self._waiting = {}
+
+    def status(self):
+        """Return a list of ``(host, counters)`` tuples, where counters
+        include the streams currently open and queued for each host"""
+        status = []
+        connections = dict((_pool_host(key), c)
+                           for key, c in self._connections.items())
+        for host in sorted(set(self.hosts) | set(connections)):
+            counters = dict((c, self.hosts[host][c]) for c in self.counters)
+            connection = connections.get(host)
+            counters['streams'] = len(connection.streams) if connection else 0
+            counters['queued'] = len(connection.queued) if connection else 0
+            status.append((host, counters))
+        return status
+
+    def _inc(self, key, counter):
+        self.hosts[_pool_host(key)][counter] += 1
+        if self.stats is not None:
+            self.stats.inc_value('downloader/h2/%s' % counter)
+
+    def get_connection(self, key, timeout, bindaddress=None):
+        """Return a deferred which fires with the HTTP/2 connection to the
+        ``(scheme, host, port)`` key, or with None if the host negotiated
+        HTTP/1.1"""
+        if key in self.http11_hosts:
+            return defer.succeed(None)
+        connection = self._connections.get(key)
+        if connection is not None and connection.available:
+            return defer.succeed(connection)
+        connect = key not in self._waiting
+        waiting = self._waiting.setdefault(key, [])
+        d = defer.Deferred(waiting.remove)
+        waiting.append(d)
+        if connect:
+            self._connect(key, timeout, bindaddress)
+        return d
+
+    def requeue(self, key, streams):
+        """Send ``streams``, which the server refused to process, over
+        a new connection"""
+        for stream in streams:
+            self._inc(key, 'requeued')
+            d = self.get_connection(key, stream.timeout, stream.bindaddress)
+            d.addCallbacks(self._requeued, stream.connection_lost,
+                           callbackArgs=(stream,))
+
+    def _requeued(self, connection, stream):
+        if connection is None:
+            stream.connection_lost(Failure(ConnectionLost(
+                "The host no longer negotiates HTTP/2")))
+        else:
+            connection.request(stream)
+
+    def _connect(self, key, timeout, bindaddress):
+        _, host, port = key
+        creator = self._contextFactory.creatorForNetloc(host, port)
+        endpoint = wrapClientTLS(creator, TCP4ClientEndpoint(
+            self._reactor, to_unicode(host), port, timeout=timeout,
+            bindAddress=bindaddress))
+        ready = defer.Deferred()
+        ready.addCallbacks(self._connected, self._connection_failed,
+                           callbackArgs=(key,), errbackArgs=(key,))
+        self._inc(key, 'new')
+        d = endpoint.connect(_H2ClientFactory(ready, self.idle_timeout))
+        d.addErrback(ready.errback)
+
+    def _connected(self, connection, key):
+        if connection is None:
+            self._inc(key, 'http11_fallback')
+            self.http11_hosts.add(key)
+        else:
+            connection.pool, connection.key = self, key
+            self._connections[key] = connection
+            connection.closed.addCallback(self._remove, key, connection)
+        for d in self._waiting.pop(key):
+            d.callback(connection)
+
+    def _connection_failed(self, failure, key):
+        self._inc(key, 'error')
+        for d in self._waiting.pop(key):
+            d.errback(failure)
+
+    def _remove(self, _, key, connection):
+        if self._connections.get(key) is connection:
+            del self._connections[key]
+
+    def close(self):
+        connections = list(self._connections.values())
+        for connection in connections:
+            connection.close()
+        return defer.DeferredList([c.closed for c in connections])
+
+
+class _H2ClientFactory(protocol.Factory):
+
+    noisy = False
+
+    def __init__(self, ready, idle_timeout):
+        self.ready = ready
+        self.idle_timeout = idle_timeout
+
+    def buildProtocol(self, addr):
+        return H2ClientProtocol(self.ready, self.idle_timeout)
+
+
+class H2ClientProtocol(protocol.Protocol):
+    """Client side of an HTTP/2 connection, which sends the streams given to
+    :meth:`request` concurrently, up to the limit set by the server.
+
+    ``ready`` fires with the protocol once the TLS handshake negotiated
+    HTTP/2, and with None if it negotiated another protocol.
+    """
+
+    pool = None
+    key = None
+
+    def __init__(self, ready, idle_timeout=0):
+        self._ready = ready
+        self._idle_timeout = idle_timeout
+        self._idle_call = None
+        self.conn = H2Connection(H2Configuration(client_side=True,
+                                                 header_encoding=None))
+        self.streams = {}
+        self.queued = deque()
+        self.available = False
+        self.closed = defer.Deferred()
+        self._settings_received = False
+
+    def handshakeCompleted(self):
+        ready, self._ready = self._ready, None
+        if self.transport.negotiatedProtocol != b'h2':
+            self.transport.loseConnection()
+            ready.callback(None)
+            return
+        self.available = True
+        self.conn.initiate_connection()
+        self._flush()
+        self._check_idle()
+        ready.callback(self)
+
+    def request(self, stream):
+        if stream.finished.called:
+            # cancelled while waiting for the connection
+            return
+        if not self.available:
+            stream.connection_lost(Failure(ConnectionLost(
+                "HTTP/2 connection closed before sending the request")))
+            return
+        stream.connection = self
+        self.queued.append(stream)
+        self._start_streams()
+
+    def reset_stream(self, stream):
+        """Cancel a stream, sent or still queued"""
+        if stream in self.queued:
+            self.queued.remove(stream)
+        if self.streams.pop(stream.stream_id, None) is None:
+            return
+        try:
+            self.conn.reset_stream(stream.stream_id, ErrorCodes.CANCEL)
+        except ProtocolError:
+            # the stream was closed meanwhile
+            pass
+        if self.available:
+            self._start_streams()
+        else:
+            self._flush()
+            if not self.streams:
+                self.transport.loseConnection()
+
+    def close(self):
+        self.available = False
+        if self._ready is None:
+            try:
+                self.conn.close_connection()
+            except ProtocolError:
+                # the connection was terminated already
+                pass
+            self._flush()
+        self.transport.loseConnection()
+
+    def _start_streams(self):
+        limit = self.conn.remote_settings.max_concurrent_streams
+        if not self._settings_received:
+            limit = min(limit, _INITIAL_MAX_CONCURRENT_STREAMS)
+        while self.queued and self.conn.open_outbound_streams < limit:
+            stream = self.queued.popleft()
+            stream.stream_id = self.conn.get_next_available_stream_id()
+            self.streams[stream.stream_id] = stream
+            self.conn.send_headers(stream.stream_id, stream.headers,
+                                   end_stream=not stream.body)
+            self._send_body(stream)
+        self._flush()
+        self._check_idle()
+
+    def _send_body(self, stream):
+        while stream.body:
+            size = min(self.conn.local_flow_control_window(stream.stream_id),
+                       self.conn.max_outbound_frame_size)
+            if size <= 0:
+                # sending resumes when the server updates the window
+                return
+            chunk, stream.body = stream.body[:size], stream.body[size:]
+            self.conn.send_data(stream.stream_id, chunk,
+                                end_stream=not stream.body)
+
+    def _flush(self):
+        data = self.conn.data_to_send()
+        if data:
+            self.transport.write(data)
+
+    def _check_idle(self):
+        if self._idle_call is not None and self._idle_call.active():
+            self._idle_call.cancel()
+        self._idle_call = None
+        if self.available and self._idle_timeout and \
+                not self.streams and not self.queued:
+            self._idle_call = reactor.callLater(self._idle_timeout, self.close)
+
+    def dataReceived(self, data):
+        try:
+            received = self.conn.receive_data(data)
+        except ProtocolError as e:
+            logger.debug("HTTP/2 protocol error, closing the connection: %s", e)
+            self.available = False
+            self._flush()
+            self.transport.loseConnection()
+            return
+
+        refused = []
+        for event in received:
+            stream = self.streams.get(getattr(event, 'stream_id', None))
+            if isinstance(event, events.ResponseReceived):
+                if stream is not None:
+                    stream.headers_received(event.headers)
+            elif isinstance(event, events.DataReceived):
+                self.conn.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id)
+                if stream is not None:
+                    stream.data_received(event.data)
+            elif isinstance(event, events.StreamEnded):
+                if stream is not None:
+                    del self.streams[event.stream_id]
+                    stream.ended()
+            elif isinstance(event, events.StreamReset):
+                if stream is not None:
+                    del self.streams[event.stream_id]
+                    if event.error_code == ErrorCodes.REFUSED_STREAM and \
+                            not stream.responded:
+                        refused.append(stream)
+                    else:
+                        stream.connection_lost(Failure(ConnectionLost(
+                            "HTTP/2 stream reset by the server: %s"
+                            % (event.error_code,))))
+            elif isinstance(event, events.RemoteSettingsChanged):
+                self._settings_received = True
+            elif isinstance(event, events.WindowUpdated):
+                if event.stream_id == 0:
+                    pending = list(self.streams.values())
+                else:
+                    pending = [stream] if stream is not None else []
+                for s in pending:
+                    self._send_body(s)
+            elif isinstance(event, events.ConnectionTerminated):
+                # streams up to last_stream_id are still processed
+                self.available = False
+                unprocessed = sorted(s for s in self.streams
+                                     if s > event.last_stream_id)
+                refused += [self.streams.pop(s) for s in unprocessed]
+                refused += self.queued
+                self.queued.clear()
+
+        if self.available:
+            self._start_streams()
+        else:
+            self._flush()
+            if not self.streams:
+                self.transport.loseConnection()
+        if refused:
+            for stream in refused:
+                stream.stream_id = stream.connection = None
+            self.pool.requeue(self.key, refused)
+
+    def connectionLost(self, reason):
+        self.available = False
+        self._check_idle()
+        if self._ready is not None:
+            # the TLS handshake failed
+            ready, self._ready = self._ready, None
+            ready.errback(reason)
+        streams = list(self.streams.values()) + list(self.queued)
+        self.streams.clear()
+        self.queued.clear()
+        for stream in streams:
+            stream.connection_lost(reason)
+        self.closed.callback(None)
+
+
+if IHandshakeListener is not None:
+    classImplements(H2ClientProtocol, IHandshakeListener)
+
+
+class _H2Stream(object):
+    """A request sent over an HTTP/2 connection, and the reader of its
+    response, which fires ``finished`` with the Scrapy response"""
+
+    def __init__(self, request, maxsize, warnsize, fail_on_dataloss,
+                 spoolsize=0, timeout=180, bindaddress=None, stats=None):
+        self.request = request
+        self.url = urldefrag(request.url)[0]
+        self.headers = _request_headers(request)
+        # request body still to be sent
+        self.body = request.body
+        self.timeout = timeout
+        self.bindaddress = bindaddress
+        self.connection = None
+        self.stream_id = None
+        self.responded = False
+        self.finished = defer.Deferred(self._cancel)
+        self._timer = _DownloadTimer(request)
+        self._maxsize = maxsize
+        self._warnsize = warnsize
+        self._fail_on_dataloss = fail_on_dataloss
+        self._spoolsize = spoolsize
+        self._status = None
+        self._response_headers = None
+        self._bodybuf = BytesIO()
+        self._spooled = False
+        self._bytes_received = 0
+        # size of the body after decoding its content coding, if any
+        self._bytes_decoded = 0
+        self._reached_warnsize = False
+        # body chunks go to the request body consumer instead of _bodybuf
+        self._consumer = None
+        self._stream_response = None
+        # body chunks are decoded as they arrive, see download_decode_content
+        self._decoding = None
+        self._stats = stats
+        self.finished.addBoth(self._record_decoding)
+        self.finished.addErrback(_refuse_retry, request, self)
+
+    def _cancel(self, _):
+        if self.connection is not None:
+            self.connection.reset_stream(self)
+        self._bodybuf.truncate(0)
+
+    def spool(self):
+        """Move the body buffer to a temporary file, for large bodies"""
+        if self._spooled:
+            return
+        bodyfile = tempfile.TemporaryFile()
+        bodyfile.write(self._bodybuf.getvalue())
+        self._bodybuf = bodyfile
+        self._spooled = True
+
+    def headers_received(self, headers):
+        if self.finished.called:
+            return
+        self.responded = True
+        self._timer.mark('ttfb')
+        self.request.meta['download_latency'] = self._timer.last - self._timer.start
+        self._response_headers = Headers()
+        for name, value in headers:
+            if name == b':status':
+                self._status = int(value)
+            elif not name.startswith(b':'):
+                self._response_headers.appendlist(name, value)
+
+        expected_size = -1
+        length = self._response_headers.get(b'Content-Length', b'')
+        if length.isdigit() and self.request.method != 'HEAD':
+            expected_size = int(length)
+
+        if self._maxsize and expected_size > self._maxsize:
+            error_msg = ("Cancelling download of %(url)s: expected response "
+                         "size (%(size)s) larger than download max size (%(maxsize)s).")
+            error_args = {'url': self.request.url, 'size': expected_size,
+                          'maxsize': self._maxsize}
+
+            logger.error(error_msg, error_args)
+            self._cancel(None)
+            self.finished.errback(defer.CancelledError(error_msg % error_args))
+            return
+
+        if self._warnsize and expected_size > self._warnsize:
+            logger.warning("Expected response size (%(size)s) larger than "
+                           "download warn size (%(warnsize)s) in request %(request)s.",
+                           {'size': expected_size, 'warnsize': self._warnsize,
+                            'request': self.request})
+
+        encodings = self._response_headers.getlist(b'Content-Encoding')
+        self._decoding = _BodyDecoding.get(self.request, encodings,
+                                           self._maxsize, self._stats)
+        if self._decoding is not None:
+            if len(encodings) > 1:
+                self._response_headers.setlist(b'Content-Encoding', encodings[:-1])
+            else:
+                del self._response_headers[b'Content-Encoding']
+
+        consumer = self.request.meta.get('body_consumer')
+        if consumer is not None and 200 <= self._status < 300:
+            self._consumer = consumer
+            self._stream_response = self._response(b'', ['streamed'])
+            self._stream_response.request = self.request
+        elif self._spoolsize and expected_size > self._spoolsize:
+            self.spool()
+
+    def data_received(self, data):
+        if self.finished.called:
+            return
+
+        self._bytes_received += len(data)
+        if self._decoding is None:
+            self._write(data)
+            return
+
+        try:
+            for chunk in self._decoding.decode(data):
+                self._write(chunk)
+                # stop decoding as soon as the decoded body is too large
+                if self.finished.called:
+                    break
+        except DecodedSizeError as e:
+            self._too_large(e.args[0])
+        except Exception:
+            self._decode_failed()
+
+    def _write(self, data):
+        if self._consumer is not None:
+            _feed_consumer(self._consumer, self._stream_response, data)
+        else:
+            self._bodybuf.write(data)
+        self._bytes_decoded += len(data)
+
+        if self._consumer is None and self._spoolsize and \
+                self._bytes_decoded > self._spoolsize:
+            self.spool()
+
+        if self._maxsize and self._bytes_decoded > self._maxsize:
+            self._too_large(self._bytes_decoded)
+            return
+
+        if self._warnsize and self._bytes_decoded > self._warnsize and \
+                not self._reached_warnsize:
+            self._reached_warnsize = True
+            logger.warning("Received more bytes than download "
+                           "warn size (%(warnsize)s) in request %(request)s.",
+                           {'warnsize': self._warnsize,
+                            'request': self.request})
+
+    def _too_large(self, size):
+        logger.error("Received (%(bytes)s) bytes larger than download "
+                     "max size (%(maxsize)s) in request %(request)s.",
+                     {'bytes': size,
+                      'maxsize': self._maxsize,
+                      'request': self.request})
+        self.finished.cancel()
+
+    def _decode_failed(self):
+        logger.error("Error decoding the %(encoding)s response body of "
+                     "request %(request)s.",
+                     {'encoding': self._decoding.encoding,
+                      'request': self.request}, exc_info=True)
+        failure = Failure()
+        self._cancel(None)
+        self.finished.errback(failure)
+
+    def _record_decoding(self, result):
+        if self._decoding is not None:
+            self._decoding.record(self._bytes_decoded)
+        return result
+
+    def ended(self):
+        if not self.finished.called:
+            self._done([])
+
+    def connection_lost(self, reason):
+        """Fail the stream, or return the partial response when the body
+        was cut and data loss is allowed"""
+        if self.finished.called:
+            return
+        if not self.responded:
+            self.finished.errback(ResponseFailed([reason]))
+            return
+        if not self._fail_on_dataloss:
+            self._done(['dataloss'])
+            return
+        logger.warning("Got data loss in %s. If you want to process broken "
+                       "responses set the setting DOWNLOAD_FAIL_ON_DATALOSS = False",
+                       self.url)
+        self.finished.errback(ResponseFailed([reason, Failure(_DataLoss())]))
+
+    def _done(self, flags):
+        if self._decoding is not None:
+            try:
+                data = self._decoding.flush()
+            except Exception:
+                self._decode_failed()
+                return
+            if data:
+                self._write(data)
+                if self.finished.called:
+                    return
+        self._timer.mark('transfer')
+        if self._spooled:
+            body = self._bodybuf
+            body.flush()
+        else:
+            body = self._bodybuf.getvalue()
+        if self._consumer is not None:
+            # an empty chunk tells the consumer that the body is complete
+            _feed_consumer(self._consumer, self._stream_response, b'')
+            flags.append('streamed')
+        self.finished.callback(self._response(body, flags or None))
+
+    def _response(self, body, flags):
+        headers = self._response_headers
+        if isinstance(body, bytes):
+            respcls = responsetypes.from_args(headers=headers, url=self.url,
+                                              body=body)
+            return respcls(url=self.url, status=self._status, headers=headers,
+                           body=body, flags=flags)
+        body.seek(0)
+        respcls = responsetypes.from_args(headers=headers, url=self.url,
+                                          body=body.read(5000))
+        return respcls(url=self.url, status=self._status, headers=headers,
+                       bodyfile=body, flags=flags)
+
+
+def _request_headers(request):
+    """Return the HTTP/2 header list of ``request``, starting with its
+    pseudo-headers"""
+    scheme, netloc, _, _, path = _parse(request.url)
+    headers = [
+        (b':method', to_bytes(request.method)),
+        (b':authority', request.headers.get(b'Host') or netloc),
+        (b':scheme', scheme),
+        (b':path', path),
+    ]
+    for name, values in request.headers.items():
+        name = name.lower()
+        if name not in _CONNECTION_HEADERS:
+            headers.extend((name, value) for value in values)
+    if (request.body or request.method == 'POST') and \
+            b'Content-Length' not in request.headers:
+        # see ScrapyAgent.download_request() about bodyless POST requests
+        headers.append((b'content-length', to_bytes(str(len(request.body)))))
+    return headers
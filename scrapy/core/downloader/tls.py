@@ -1,4 +1,6 @@
 import logging
+from collections import OrderedDict, Counter
+
 from OpenSSL import SSL
 
 from scrapy import twisted_version
@@ -20,6 +22,64 @@ openssl_methods = {
     METHOD_TLSv12: getattr(SSL, 'TLSv1_2_METHOD', 6),   # TLS 1.2 only
 }
 
+try:
+    # pyOpenSSL has no public API for SSL_session_reused()
+    from OpenSSL._util import lib as _openssl_lib
+except ImportError:
+    _openssl_lib = None
+
+
+def session_reused(connection):
+    """Return whether the handshake of ``connection`` resumed a previous
+    TLS session (``None`` if it cannot be known)"""
+    try:
+        return bool(_openssl_lib.SSL_session_reused(connection._ssl))
+    except AttributeError:
+        return None
+
+
+class TLSSessionCache(object):
+    """Bounded cache of the last TLS session of each ``(host, port)``,
+    which evicts the least recently used sessions first.
+
+    Stats are recorded under ``downloader/tls_session/`` when a stats
+    collector is given.
+    """
+
+    def __init__(self, maxsize=1000, stats=None):
+        self.maxsize = maxsize
+        self.stats = stats
+        self.counters = Counter()
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, key):
+        session = self._sessions.pop(key, None)
+        if session is None:
+            self._inc('miss')
+            return None
+        self._sessions[key] = session
+        self._inc('hit')
+        return session
+
+    def set(self, key, session):
+        self._sessions.pop(key, None)
+        self._sessions[key] = session
+        while len(self._sessions) > self.maxsize:
+            self._sessions.popitem(last=False)
+            self._inc('evicted')
+
+    def handshake_done(self, resumed):
+        self._inc('resumed' if resumed else 'full_handshake')
+
+    def _inc(self, counter):
+        self.counters[counter] += 1
+        if self.stats is not None:
+            self.stats.inc_value('downloader/tls_session/%s' % counter)
+
+
 if twisted_version >= (14, 0, 0):
     # ClientTLSOptions requires a recent-enough version of Twisted.
     # Not having ScrapyClientTLSOptions should not matter for older
@@ -31,10 +91,12 @@ if twisted_version >= (14, 0, 0):
     try:
         # XXX: this try-except is not needed in Twisted 17.0.0+ because
         # it requires pyOpenSSL 0.16+.
-        from OpenSSL.SSL import SSL_CB_HANDSHAKE_DONE, SSL_CB_HANDSHAKE_START
+        from OpenSSL.SSL import SSL_CB_HANDSHAKE_DONE, SSL_CB_HANDSHAKE_START, \
+            SSL_CB_CONNECT_EXIT
     except ImportError:
         SSL_CB_HANDSHAKE_START = 0x10
         SSL_CB_HANDSHAKE_DONE = 0x20
+        SSL_CB_CONNECT_EXIT = 0x1002
 
     from twisted.internet.ssl import AcceptableCiphers
     from twisted.internet._sslverify import (ClientTLSOptions,
@@ -66,9 +128,28 @@ if twisted_version >= (14, 0, 0):
         except that VerificationError, CertificateError and ValueError
         exceptions are caught, so that the connection is not closed, only
         logging warnings.
+
+        If a :class:`TLSSessionCache` is given, new connections try to resume
+        the last TLS session of the same host and port.
         """
 
+        def __init__(self, hostname, ctx, session_cache=None, port=None):
+            super(ScrapyClientTLSOptions, self).__init__(hostname, ctx)
+            self._session_cache = session_cache
+            self._session_key = (hostname, port)
+            self._handshake_done = False
+
+        def clientConnectionForTLS(self, tlsProtocol):
+            connection = super(ScrapyClientTLSOptions, self).clientConnectionForTLS(tlsProtocol)
+            if self._session_cache is not None:
+                session = self._session_cache.get(self._session_key)
+                if session is not None:
+                    connection.set_session(session)
+            return connection
+
         def _identityVerifyingInfoCallback(self, connection, where, ret):
+            if self._session_cache is not None:
+                self._cacheSession(connection, where)
             if where & SSL_CB_HANDSHAKE_START:
                 set_tlsext_host_name(connection, self._hostnameBytes)
             elif where & SSL_CB_HANDSHAKE_DONE:
@@ -85,4 +166,15 @@ if twisted_version >= (14, 0, 0):
                         'from host "{}" (exception: {})'.format(
                             self._hostnameASCII, repr(e)))
 
+        def _cacheSession(self, connection, where):
+            if where & SSL_CB_HANDSHAKE_DONE:
+                self._handshake_done = True
+                self._session_cache.handshake_done(session_reused(connection))
+            elif where == SSL_CB_CONNECT_EXIT and self._handshake_done:
+                # TLS 1.3 servers send session tickets after the handshake,
+                # so keep the session up to date with the last one received
+                self._session_cache.set(self._session_key,
+                                        connection.get_session())
+
+
     DEFAULT_CIPHERS = AcceptableCiphers.fromOpenSSLCipherString('DEFAULT')
@@ -119,7 +119,7 @@ class ExecutionEngine(object):
             return
 
         while not self._needs_backout(spider):
-            if not self._next_request_from_scheduler(spider):
+            if not self._next_requests_from_scheduler(spider):
                 break
 
         if slot.start_requests and not self._needs_backout(spider):
@@ -144,11 +144,37 @@ class ExecutionEngine(object):
             or self.downloader.needs_backout() \
             or self.scraper.slot.needs_backout()
 
+    def _next_requests_from_scheduler(self, spider):
+        """Fetch as many requests from the scheduler as the downloader has
+        free capacity for, and start downloading them. Return the number of
+        requests fetched."""
+        scheduler = self.slot.scheduler
+        if not hasattr(scheduler, 'next_requests'):
+            return 1 if self._next_request_from_scheduler(spider) else 0
+        capacity = self.downloader.total_concurrency - len(self.downloader.active)
+        fetched = 0
+        requests = scheduler.next_requests(max(capacity, 1))
+        try:
+            for request in requests:
+                self._download_scheduled(request, spider)
+                fetched += 1
+                # requests are popped lazily, stop before popping the next one
+                if self._needs_backout(spider):
+                    break
+        finally:
+            close = getattr(requests, 'close', None)
+            if close is not None:
+                close()
+        return fetched
+
     def _next_request_from_scheduler(self, spider):
-        slot = self.slot
-        request = slot.scheduler.next_request()
+        request = self.slot.scheduler.next_request()
         if not request:
             return
+        return self._download_scheduled(request, spider)
+
+    def _download_scheduled(self, request, spider):
+        slot = self.slot
         d = self._download(request, spider)
         d.addBoth(self._handle_downloader_output, request, spider)
         d.addErrback(lambda f: logger.info('Error while handling downloader output',
@@ -230,6 +256,9 @@ class ExecutionEngine(object):
     def _download(self, request, spider):
         slot = self.slot
         slot.add_request(request)
+        if request.meta.get('body_consumer') is not None:
+            request.meta['body_consumer'] = self.scraper.body_consumer(
+                request.meta['body_consumer'], request, spider)
         def _on_success(response):
             assert isinstance(response, (Response, Request))
             if isinstance(response, Response):
@@ -1,19 +1,34 @@
 import os
 import json
 import logging
+import shutil
+import tempfile
 from os.path import join, exists
 
+from twisted.internet import task
+
 from scrapy.utils.reqser import request_to_dict, request_from_dict
 from scrapy.utils.misc import load_object, create_instance
-from scrapy.utils.job import job_dir
+from scrapy.utils.job import job_dir, atomic_json_dump
+from scrapy.pqueues import _path_safe
 
 logger = logging.getLogger(__name__)
 
+# rough per-request memory overhead (Request, Headers, meta dict, ...) used
+# when estimating the size of the memory queue
+_REQUEST_OVERHEAD = 512
+
+
+def _estimate_size(request):
+    return _REQUEST_OVERHEAD + len(request.url) + len(request.body)
+
 
 class Scheduler(object):
 
     def __init__(self, dupefilter, jobdir=None, dqclass=None, mqclass=None,
-                 logunser=False, stats=None, pqclass=None):
+                 logunser=False, stats=None, pqclass=None, crawler=None,
+                 mqmaxrequests=0, mqmaxbytes=0, refillbatch=100,
+                 checkpoint_interval=0):
         self.df = dupefilter
         self.dqdir = self._dqdir(jobdir)
         self.pqclass = pqclass
@@ -21,6 +36,13 @@ class Scheduler(object):
         self.mqclass = mqclass
         self.logunser = logunser
         self.stats = stats
+        self.crawler = crawler
+        self.mqmaxrequests = mqmaxrequests
+        self.mqmaxbytes = mqmaxbytes
+        self.refillbatch = refillbatch
+        self.spilldir = None
+        self.checkpoint_interval = checkpoint_interval
+        self._checkpoint_loop = None
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -32,31 +54,82 @@ class Scheduler(object):
         mqclass = load_object(settings['SCHEDULER_MEMORY_QUEUE'])
         logunser = settings.getbool('LOG_UNSERIALIZABLE_REQUESTS', settings.getbool('SCHEDULER_DEBUG'))
         return cls(dupefilter, jobdir=job_dir(settings), logunser=logunser,
-                   stats=crawler.stats, pqclass=pqclass, dqclass=dqclass, mqclass=mqclass)
+                   stats=crawler.stats, pqclass=pqclass, dqclass=dqclass,
+                   mqclass=mqclass, crawler=crawler,
+                   mqmaxrequests=settings.getint('SCHEDULER_MEMORY_QUEUE_MAXREQUESTS'),
+                   mqmaxbytes=settings.getint('SCHEDULER_MEMORY_QUEUE_MAXBYTES'),
+                   refillbatch=settings.getint('SCHEDULER_REFILL_BATCH'),
+                   checkpoint_interval=settings.getfloat('SCHEDULER_CHECKPOINT_INTERVAL'))
 
     def has_pending_requests(self):
         return len(self) > 0
 
     def open(self, spider):
         self.spider = spider
-        self.mqs = self.pqclass(self._newmq)
-        self.dqs = self._dq() if self.dqdir else None
+        self.mqs = self._newpq(self._newmq)
+        self.mqlen = self.mqbytes = 0
+        if self.dqdir:
+            self.dqs = self._dq()
+            if self.checkpoint_interval:
+                self._start_checkpoints()
+        elif self.mqmaxrequests or self.mqmaxbytes:
+            # no JOBDIR: spill the overflow of the memory queue to a
+            # temporary disk queue
+            self.spilldir = self.dqdir = tempfile.mkdtemp(prefix='scrapy-spill-')
+            self.dqs = self._newpq(self._newdq)
+        else:
+            self.dqs = None
         return self.df.open()
 
     def close(self, reason):
-        if self.dqs:
+        if self._checkpoint_loop and self._checkpoint_loop.running:
+            self._checkpoint_loop.stop()
+        if self.spilldir:
+            self.dqs.close()
+            shutil.rmtree(self.spilldir, ignore_errors=True)
+            self.spilldir = self.dqdir = None
+        elif self.dqs is not None:
             prios = self.dqs.close()
-            with open(join(self.dqdir, 'active.json'), 'w') as f:
-                json.dump(prios, f)
+            atomic_json_dump(prios, join(self.dqdir, 'active.json'))
         return self.df.close(reason)
 
+    def checkpoint(self):
+        """Persist the state of the disk queues and of the dupefilter without
+        closing them, so that a crawl which is not shut down cleanly can be
+        resumed from this point."""
+        prios = self.dqs.checkpoint()
+        atomic_json_dump(prios, join(self.dqdir, 'active.json'))
+        df_checkpoint = getattr(self.df, 'checkpoint', None)
+        if df_checkpoint:
+            df_checkpoint()
+        logger.debug("Scheduler state checkpointed (%(queuesize)d requests "
+                     "scheduled)", {'queuesize': len(self)},
+                     extra={'spider': self.spider})
+
+    def _start_checkpoints(self):
+        for cls in (self.pqclass, self.dqclass):
+            if not hasattr(cls, 'checkpoint'):
+                logger.warning("%(cls)s does not support checkpoints, the "
+                               "scheduler state will only be saved when the "
+                               "spider is closed",
+                               {'cls': cls.__name__},
+                               extra={'spider': self.spider})
+                return
+        self._checkpoint_loop = task.LoopingCall(self.checkpoint)
+        self._checkpoint_loop.start(self.checkpoint_interval, now=False)
+
     def enqueue_request(self, request):
         if not request.dont_filter and self.df.request_seen(request):
             self.df.log(request, self.spider)
             return False
-        dqok = self._dqpush(request)
+        if self.spilldir and not self._mq_full():
+            dqok = False
+        else:
+            dqok = self._dqpush(request)
         if dqok:
             self.stats.inc_value('scheduler/enqueued/disk', spider=self.spider)
+            if self.spilldir:
+                self.stats.inc_value('scheduler/spilled', spider=self.spider)
         else:
             self._mqpush(request)
             self.stats.inc_value('scheduler/enqueued/memory', spider=self.spider)
@@ -64,16 +137,46 @@ class Scheduler(object):
         return True
 
     def next_request(self):
-        request = self.mqs.pop()
-        if request:
-            self.stats.inc_value('scheduler/dequeued/memory', spider=self.spider)
-        else:
-            request = self._dqpop()
-            if request:
-                self.stats.inc_value('scheduler/dequeued/disk', spider=self.spider)
-        if request:
-            self.stats.inc_value('scheduler/dequeued', spider=self.spider)
-        return request
+        requests = list(self.next_requests(1))
+        return requests[0] if requests else None
+
+    def next_requests(self, count):
+        """Return an iterator over up to ``count`` requests, in the order
+        successive :meth:`next_request` calls would return them.
+
+        Requests are popped as the iterator is consumed, so that priority
+        queues looking at the downloader state (like
+        :class:`~scrapy.pqueues.DownloaderAwarePriorityQueue`) take into
+        account the requests handed out earlier in the batch. Stats are
+        updated once, when the iterator is exhausted or closed.
+        """
+        mqcount = dqcount = 0
+        try:
+            while mqcount + dqcount < count:
+                if self.spilldir and not self.mqlen:
+                    self._refill()
+                if self.spilldir and self._spilled_first():
+                    request = None
+                else:
+                    request = self._mqpop()
+                if request:
+                    mqcount += 1
+                else:
+                    request = self._dqpop()
+                    if not request:
+                        break
+                    dqcount += 1
+                yield request
+        finally:
+            if mqcount:
+                self.stats.inc_value('scheduler/dequeued/memory', mqcount,
+                                     spider=self.spider)
+            if dqcount:
+                self.stats.inc_value('scheduler/dequeued/disk', dqcount,
+                                     spider=self.spider)
+            if mqcount or dqcount:
+                self.stats.inc_value('scheduler/dequeued', mqcount + dqcount,
+                                     spider=self.spider)
 
     def __len__(self):
         return len(self.dqs) + len(self.mqs) if self.dqs else len(self.mqs)
@@ -100,6 +203,40 @@ class Scheduler(object):
 
     def _mqpush(self, request):
         self.mqs.push(request, -request.priority)
+        self.mqlen += 1
+        if self.mqmaxbytes:
+            self.mqbytes += _estimate_size(request)
+
+    def _mqpop(self):
+        request = self.mqs.pop()
+        if request:
+            self.mqlen -= 1
+            if self.mqmaxbytes:
+                self.mqbytes -= _estimate_size(request)
+        return request
+
+    def _mq_full(self):
+        return bool(
+            (self.mqmaxrequests and self.mqlen >= self.mqmaxrequests) or
+            (self.mqmaxbytes and self.mqbytes >= self.mqmaxbytes))
+
+    def _spilled_first(self):
+        # respect priorities across both tiers when the queues expose the
+        # priority of their next request (like queuelib.PriorityQueue)
+        dqprio = getattr(self.dqs, 'curprio', None)
+        mqprio = getattr(self.mqs, 'curprio', None)
+        return dqprio is not None and mqprio is not None and dqprio < mqprio
+
+    def _refill(self):
+        count = 0
+        while count < self.refillbatch and not self._mq_full():
+            request = self._dqpop()
+            if not request:
+                break
+            self._mqpush(request)
+            count += 1
+        if count:
+            self.stats.inc_value('scheduler/refilled', count, spider=self.spider)
 
     def _dqpop(self):
         if self.dqs:
@@ -107,11 +244,22 @@ class Scheduler(object):
             if d:
                 return request_from_dict(d, self.spider)
 
-    def _newmq(self, priority):
+    def _newpq(self, qfactory, startprios=()):
+        if self.crawler is None:
+            return self.pqclass(qfactory, startprios=startprios)
+        return create_instance(self.pqclass, None, self.crawler, qfactory,
+                               startprios=startprios)
+
+    def _newmq(self, priority, slot=None):
         return self.mqclass()
 
-    def _newdq(self, priority):
-        return self.dqclass(join(self.dqdir, 'p%s' % priority))
+    def _newdq(self, priority, slot=None):
+        dqdir = self.dqdir
+        if slot is not None:
+            dqdir = join(dqdir, _path_safe(str(slot)))
+            if not exists(dqdir):
+                os.makedirs(dqdir)
+        return self.dqclass(join(dqdir, 'p%s' % priority))
 
     def _dq(self):
         activef = join(self.dqdir, 'active.json')
@@ -120,7 +268,7 @@ class Scheduler(object):
                 prios = json.load(f)
         else:
             prios = ()
-        q = self.pqclass(self._newdq, startprios=prios)
+        q = self._newpq(self._newdq, startprios=prios)
         if q:
             logger.info("Resuming crawl (%(queuesize)d requests scheduled)",
                         {'queuesize': len(q)}, extra={'spider': self.spider})
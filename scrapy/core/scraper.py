@@ -32,6 +32,7 @@ class Slot(object):
         self.active = set()
         self.active_size = 0
         self.itemproc_size = 0
+        self.streaming = set()
         self.closing = None
 
     def add_response_request(self, response, request):
@@ -56,12 +57,27 @@ class Slot(object):
             self.active_size -= self.MIN_RESPONSE_SIZE
 
     def is_idle(self):
-        return not (self.queue or self.active)
+        return not (self.queue or self.active or self.streaming)
 
     def needs_backout(self):
         return self.active_size > self.max_active_size
 
 
+class _BodyConsumer(object):
+    """Wrapper of a ``body_consumer`` request meta callable that handles its
+    output like the output of spider callbacks"""
+
+    def __init__(self, scraper, consumer, request, spider):
+        self.scraper = scraper
+        self.consumer = consumer
+        self.request = request
+        self.spider = spider
+
+    def __call__(self, response, chunk):
+        self.scraper.scrape_body_chunk(self.consumer, response, chunk,
+                                       self.request, self.spider)
+
+
 class Scraper(object):
 
     def __init__(self, crawler):
@@ -113,6 +129,36 @@ class Scraper(object):
         self._scrape_next(spider, slot)
         return dfd
 
+    def body_consumer(self, consumer, request, spider):
+        """Return the callable the download handlers should feed the body
+        chunks of ``request`` to, given its ``body_consumer`` meta key"""
+        if isinstance(consumer, _BodyConsumer):
+            # request copied from an already downloaded one (e.g. redirects)
+            consumer = consumer.consumer
+        return _BodyConsumer(self, consumer, request, spider)
+
+    def scrape_body_chunk(self, consumer, response, chunk, request, spider):
+        """Feed a body chunk to a body consumer, and process its output
+        through the spider middlewares like spider callback output"""
+        def consume(result, request, spider):
+            if isinstance(result, Failure):
+                return result
+            return iterate_spider_output(consumer(result, chunk))
+
+        slot = self.slot
+        dfd = self.spidermw.scrape_response(consume, response, request, spider)
+        dfd.addErrback(self.handle_spider_error, request, response, spider)
+        dfd.addCallback(self.handle_spider_output, request, response, spider)
+        if not dfd.called:
+            slot.streaming.add(dfd)
+            dfd.addBoth(self._finish_body_chunk, dfd, slot, spider)
+        return dfd
+
+    def _finish_body_chunk(self, result, dfd, slot, spider):
+        slot.streaming.discard(dfd)
+        self._check_if_closing(spider, slot)
+        return result
+
     def _scrape_next(self, spider, slot):
         while slot.queue:
             response, request, deferred = slot.next_response_request_deferred()
@@ -8,14 +8,13 @@ from twisted.internet import reactor, defer
 from zope.interface.verify import verifyClass, DoesNotImplement
 
 from scrapy.core.engine import ExecutionEngine
-from scrapy.resolver import CachingThreadedResolver
 from scrapy.interfaces import ISpiderLoader
 from scrapy.extension import ExtensionManager
 from scrapy.settings import overridden_settings, Settings
 from scrapy.signalmanager import SignalManager
 from scrapy.exceptions import ScrapyDeprecationWarning
 from scrapy.utils.ossignal import install_shutdown_handlers, signal_names
-from scrapy.utils.misc import load_object
+from scrapy.utils.misc import load_object, create_instance
 from scrapy.utils.log import (
     LogCounterHandler, configure_logging, log_scrapy_info,
     get_scrapy_root_handler, install_scrapy_root_handler)
@@ -50,6 +49,10 @@ class Crawler(object):
         self.__remove_handler = lambda: logging.root.removeHandler(handler)
         self.signals.connect(self.__remove_handler, signals.engine_stopped)
 
+        self.request_fingerprinter = create_instance(
+            load_object(self.settings['REQUEST_FINGERPRINTER_CLASS']),
+            self.settings, self)
+
         lf_cls = load_object(self.settings['LOG_FORMATTER'])
         self.logformatter = lf_cls.from_crawler(self)
         self.extensions = ExtensionManager.from_crawler(self)
@@ -270,8 +273,9 @@ class CrawlerProcess(CrawlerRunner):
     def start(self, stop_after_crawl=True):
         """
         This method starts a Twisted `reactor`_, adjusts its pool size to
-        :setting:`REACTOR_THREADPOOL_MAXSIZE`, and installs a DNS cache based
-        on :setting:`DNSCACHE_ENABLED` and :setting:`DNSCACHE_SIZE`.
+        :setting:`REACTOR_THREADPOOL_MAXSIZE`, and installs the
+        :setting:`DNS_RESOLVER`, with a DNS cache based on
+        :setting:`DNSCACHE_ENABLED` and :setting:`DNSCACHE_SIZE`.
 
         If `stop_after_crawl` is True, the reactor will be stopped after all
         crawlers have finished, using :meth:`join`.
@@ -293,15 +297,8 @@ class CrawlerProcess(CrawlerRunner):
         reactor.run(installSignalHandlers=False)  # blocking call
 
     def _get_dns_resolver(self):
-        if self.settings.getbool('DNSCACHE_ENABLED'):
-            cache_size = self.settings.getint('DNSCACHE_SIZE')
-        else:
-            cache_size = 0
-        return CachingThreadedResolver(
-            reactor=reactor,
-            cache_size=cache_size,
-            timeout=self.settings.getfloat('DNS_TIMEOUT')
-        )
+        resolver_class = load_object(self.settings['DNS_RESOLVER'])
+        return resolver_class.from_settings(self.settings, reactor)
 
     def _graceful_stop_reactor(self):
         d = self.stop()
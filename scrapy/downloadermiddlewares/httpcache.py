@@ -16,17 +16,21 @@ class HttpCacheMiddleware(object):
                            ConnectionLost, TCPTimedOutError, ResponseFailed,
                            IOError)
 
-    def __init__(self, settings, stats):
+    def __init__(self, settings, stats, crawler=None):
         if not settings.getbool('HTTPCACHE_ENABLED'):
             raise NotConfigured
         self.policy = load_object(settings['HTTPCACHE_POLICY'])(settings)
-        self.storage = load_object(settings['HTTPCACHE_STORAGE'])(settings)
+        storagecls = load_object(settings['HTTPCACHE_STORAGE'])
+        if crawler is not None and hasattr(storagecls, 'from_crawler'):
+            self.storage = storagecls.from_crawler(crawler)
+        else:
+            self.storage = storagecls(settings)
         self.ignore_missing = settings.getbool('HTTPCACHE_IGNORE_MISSING')
         self.stats = stats
 
     @classmethod
     def from_crawler(cls, crawler):
-        o = cls(crawler.settings, crawler.stats)
+        o = cls(crawler.settings, crawler.stats, crawler)
         crawler.signals.connect(o.spider_opened, signal=signals.spider_opened)
         crawler.signals.connect(o.spider_closed, signal=signals.spider_closed)
         return o
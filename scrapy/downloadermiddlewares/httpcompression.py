@@ -1,23 +1,19 @@
 import zlib
 
 from scrapy.utils.gz import gunzip
+from scrapy.utils.contentencoding import ACCEPTED_ENCODINGS, decode
 from scrapy.http import Response, TextResponse
 from scrapy.responsetypes import responsetypes
 from scrapy.exceptions import NotConfigured
 
 
-ACCEPTED_ENCODINGS = [b'gzip', b'deflate']
-
-try:
-    import brotli
-    ACCEPTED_ENCODINGS.append(b'br')
-except ImportError:
-    pass
-
-
 class HttpCompressionMiddleware(object):
-    """This middleware allows compressed (gzip, deflate) traffic to be
-    sent/received from web sites"""
+    """This middleware allows compressed (gzip, deflate, br, zstd) traffic to
+    be sent/received from web sites.
+
+    Download handlers which support it decode the responses as they are
+    downloaded, otherwise they are decoded here.
+    """
     @classmethod
     def from_crawler(cls, crawler):
         if not crawler.settings.getbool('COMPRESSION_ENABLED'):
@@ -27,6 +23,7 @@ class HttpCompressionMiddleware(object):
     def process_request(self, request, spider):
         request.headers.setdefault('Accept-Encoding',
                                    b",".join(ACCEPTED_ENCODINGS))
+        request.meta.setdefault('download_decode_content', True)
 
     def process_response(self, request, response, spider):
 
@@ -64,6 +61,6 @@ class HttpCompressionMiddleware(object):
                 # http://www.port80software.com/200ok/archive/2005/10/31/868.aspx
                 # http://www.gzip.org/zlib/zlib_faq.html#faq38
                 body = zlib.decompress(body, -15)
-        if encoding == b'br' and b'br' in ACCEPTED_ENCODINGS:
-            body = brotli.decompress(body)
+        if encoding in (b'br', b'zstd') and encoding in ACCEPTED_ENCODINGS:
+            body = decode(body, encoding)
         return body
@@ -1,3 +1,5 @@
+import os
+
 from scrapy.exceptions import NotConfigured
 from scrapy.utils.request import request_httprepr
 from scrapy.utils.response import response_httprepr
@@ -24,7 +26,13 @@ class DownloaderStats(object):
     def process_response(self, request, response, spider):
         self.stats.inc_value('downloader/response_count', spider=spider)
         self.stats.inc_value('downloader/response_status_count/%s' % response.status, spider=spider)
-        reslen = len(response_httprepr(response))
+        if response.bodyfile is None:
+            reslen = len(response_httprepr(response))
+        else:
+            # do not load spooled bodies just to measure them
+            response.bodyfile.flush()
+            reslen = len(response_httprepr(response.replace(body=b''))) + \
+                os.fstat(response.bodyfile.fileno()).st_size
         self.stats.inc_value('downloader/response_bytes', reslen, spider=spider)
         return response
 
@@ -1,9 +1,24 @@
 from __future__ import print_function
 import os
+import re
+import json
+import math
+import mmap
+import struct
+import hashlib
 import logging
+import shutil
+import binascii
+import tempfile
+import heapq
 
-from scrapy.utils.job import job_dir
-from scrapy.utils.request import request_fingerprint
+import six
+from twisted.internet import defer, threads
+
+from scrapy.utils.job import job_dir, atomic_json_dump
+from scrapy.utils.log import failure_to_exc_info
+from scrapy.utils.python import to_bytes
+from scrapy.utils.request import RequestFingerprinter
 
 
 class BaseDupeFilter(object):
@@ -18,6 +33,9 @@ class BaseDupeFilter(object):
     def open(self):  # can return deferred
         pass
 
+    def checkpoint(self):  # persist the state without closing
+        pass
+
     def close(self, reason):  # can return a deferred
         pass
 
@@ -28,14 +46,18 @@ class BaseDupeFilter(object):
 class RFPDupeFilter(BaseDupeFilter):
     """Request Fingerprint duplicates filter"""
 
-    def __init__(self, path=None, debug=False):
+    def __init__(self, path=None, debug=False, fingerprinter=None):
+        self.fingerprinter = fingerprinter or RequestFingerprinter()
         self.file = None
         self.fingerprints = set()
         self.logdupes = True
         self.debug = debug
         self.logger = logging.getLogger(__name__)
         if path:
-            self.file = open(os.path.join(path, 'requests.seen'), 'a+')
+            seenpath = os.path.join(path, 'requests.seen')
+            self.checkpointpath = seenpath + '.checkpoint'
+            self._restore_checkpoint(seenpath)
+            self.file = open(seenpath, 'a+')
             self.file.seek(0)
             self.fingerprints.update(x.rstrip() for x in self.file)
 
@@ -44,6 +66,12 @@ class RFPDupeFilter(BaseDupeFilter):
         debug = settings.getbool('DUPEFILTER_DEBUG')
         return cls(job_dir(settings), debug)
 
+    @classmethod
+    def from_crawler(cls, crawler):
+        dupefilter = cls.from_settings(crawler.settings)
+        dupefilter.fingerprinter = crawler.request_fingerprinter
+        return dupefilter
+
     def request_seen(self, request):
         fp = self.request_fingerprint(request)
         if fp in self.fingerprints:
@@ -53,11 +81,28 @@ class RFPDupeFilter(BaseDupeFilter):
             self.file.write(fp + os.linesep)
 
     def request_fingerprint(self, request):
-        return request_fingerprint(request)
+        return self.fingerprinter.fingerprint(request)
+
+    def _restore_checkpoint(self, seenpath):
+        # drop fingerprints written after the last checkpoint if the file
+        # was not closed cleanly, as their requests were not checkpointed
+        if os.path.exists(self.checkpointpath) and os.path.exists(seenpath):
+            with open(self.checkpointpath) as f:
+                offset = json.load(f)['offset']
+            with open(seenpath, 'r+') as f:
+                f.truncate(offset)
+
+    def checkpoint(self):
+        if self.file:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            atomic_json_dump({'offset': self.file.tell()}, self.checkpointpath)
 
     def close(self, reason):
         if self.file:
             self.file.close()
+            if os.path.exists(self.checkpointpath):
+                os.remove(self.checkpointpath)
 
     def log(self, request, spider):
         if self.debug:
@@ -71,3 +116,783 @@ class RFPDupeFilter(BaseDupeFilter):
             self.logdupes = False
 
         spider.crawler.stats.inc_value('dupefilter/filtered', spider=spider)
+
+
+if six.PY2:
+    def _getbyte(buf, index):
+        return ord(buf[index])
+
+    def _setbyte(buf, index, value):
+        buf[index] = chr(value)
+else:
+    def _getbyte(buf, index):
+        return buf[index]
+
+    def _setbyte(buf, index, value):
+        buf[index] = value
+
+
+class _BloomFilter(object):
+    """Bloom filter whose header and bit array live in a memory-mapped file,
+    or in anonymous memory if ``path`` is ``None``.
+
+    Keys are given as two hashes, which are combined to get the positions of
+    the bits (double hashing).
+    """
+
+    _header = struct.Struct('>4sQQQBd')  # magic, bits, capacity, count, hashes, error rate
+    _magic = b'SBF1'
+    _count_offset = 4 + 8 + 8
+
+    def __init__(self, path=None, capacity=None, error_rate=None):
+        if path and os.path.exists(path):
+            with open(path, 'r+b') as f:
+                self.mm = mmap.mmap(f.fileno(), 0)
+            magic, self.nbits, self.capacity, self.count, self.hashes, \
+                self.error_rate = self._header.unpack_from(self.mm)
+            if magic != self._magic:
+                raise ValueError('%s is not a Bloom filter file' % path)
+            return
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.nbits = int(math.ceil(-capacity * math.log(error_rate) /
+                                   math.log(2) ** 2))
+        self.hashes = max(1, int(math.ceil(-math.log(error_rate, 2))))
+        self.count = 0
+        size = self._header.size + (self.nbits + 7) // 8
+        if path:
+            with open(path, 'w+b') as f:
+                f.truncate(size)
+                self.mm = mmap.mmap(f.fileno(), size)
+        else:
+            self.mm = mmap.mmap(-1, size)
+        self._header.pack_into(self.mm, 0, self._magic, self.nbits,
+                               self.capacity, self.count, self.hashes,
+                               self.error_rate)
+
+    def __contains__(self, hashes):
+        h1, h2 = hashes
+        mm, offset, nbits = self.mm, self._header.size, self.nbits
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % nbits
+            if not _getbyte(mm, offset + (pos >> 3)) & (1 << (pos & 7)):
+                return False
+        return True
+
+    def add(self, hashes):
+        h1, h2 = hashes
+        mm, offset, nbits = self.mm, self._header.size, self.nbits
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % nbits
+            index = offset + (pos >> 3)
+            _setbyte(mm, index, _getbyte(mm, index) | (1 << (pos & 7)))
+        self.count += 1
+        struct.pack_into('>Q', mm, self._count_offset, self.count)
+
+    @property
+    def fill_ratio(self):
+        """Estimated ratio of bits set"""
+        return 1 - math.exp(-float(self.hashes) * self.count / self.nbits)
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.mm.close()
+
+
+class ScalableBloomFilter(object):
+    """Scalable Bloom filter (Almeida et al., 2007) of strings.
+
+    It starts as a single Bloom filter for ``capacity`` keys. Every time the
+    last filter is full, a new one with ``growth`` times its capacity and
+    half its error rate is added, so that the overall probability of false
+    positives stays below ``error_rate`` whatever the number of keys.
+
+    If ``path`` is given, the filters are stored in memory-mapped files in
+    that directory, and loaded back from there. In that case ``capacity``,
+    ``error_rate`` and ``growth`` only apply to a new filter.
+    """
+
+    ratio = 0.5  # error rate ratio between consecutive filters
+
+    def __init__(self, path=None, capacity=1000000, error_rate=0.001, growth=2):
+        if capacity < 1 or not 0 < error_rate < 1 or growth < 1:
+            raise ValueError('Invalid Bloom filter parameters: capacity=%r, '
+                             'error_rate=%r, growth=%r'
+                             % (capacity, error_rate, growth))
+        self.path = path
+        self.growth = growth
+        self.filters = []
+        if path:
+            if not os.path.exists(path):
+                os.makedirs(path)
+            names = sorted((int(m.group(1)), m.group(0))
+                           for m in map(re.compile(r'^filter(\d+)$').match,
+                                        os.listdir(path)) if m)
+            for _, name in names:
+                self.filters.append(_BloomFilter(os.path.join(path, name)))
+        if not self.filters:
+            self.filters.append(self._newfilter(capacity,
+                                                error_rate * (1 - self.ratio)))
+
+    def _newfilter(self, capacity, error_rate):
+        path = None
+        if self.path:
+            path = os.path.join(self.path, 'filter%d' % len(self.filters))
+        return _BloomFilter(path, int(capacity), error_rate)
+
+    @staticmethod
+    def _hashes(key):
+        return struct.unpack('>QQ', hashlib.md5(to_bytes(key)).digest())
+
+    def __contains__(self, key):
+        hashes = self._hashes(key)
+        return any(hashes in f for f in self.filters)
+
+    def add(self, key):
+        """Add ``key`` to the filter. Return ``True`` if it (probably) was
+        already there, ``False`` otherwise."""
+        hashes = self._hashes(key)
+        if any(hashes in f for f in self.filters):
+            return True
+        last = self.filters[-1]
+        if last.count >= last.capacity:
+            last = self._newfilter(last.capacity * self.growth,
+                                   last.error_rate * self.ratio)
+            self.filters.append(last)
+        last.add(hashes)
+        return False
+
+    def __len__(self):
+        return sum(f.count for f in self.filters)
+
+    @property
+    def fill_ratio(self):
+        """Estimated ratio of bits set in the filter that keys are added to"""
+        return self.filters[-1].fill_ratio
+
+    @property
+    def error_rate(self):
+        """Estimated probability of false positives"""
+        p = 1.0
+        for f in self.filters:
+            p *= 1 - f.fill_ratio ** f.hashes
+        return 1 - p
+
+    def flush(self):
+        for f in self.filters:
+            f.flush()
+
+    def close(self):
+        for f in self.filters:
+            f.close()
+
+
+class BloomDupeFilter(RFPDupeFilter):
+    """Request Fingerprint duplicates filter which stores the fingerprints in
+    a :class:`ScalableBloomFilter`, using a few bytes per request instead of
+    keeping every fingerprint in memory.
+
+    A small share of requests (see ``DUPEFILTER_BLOOM_ERROR_RATE``) are
+    wrongly considered duplicates. With a job directory, the filter is kept in
+    memory-mapped files under ``requests.bloom`` and is available right away
+    when the crawl is resumed.
+    """
+
+    def __init__(self, path=None, debug=False, capacity=1000000,
+                 error_rate=0.001, growth=2, stats=None):
+        super(BloomDupeFilter, self).__init__(debug=debug)
+        bloompath = os.path.join(path, 'requests.bloom') if path else None
+        self.bloom = ScalableBloomFilter(bloompath, capacity, error_rate, growth)
+        self.stats = stats
+        self._nfilters = len(self.bloom.filters)
+
+    @classmethod
+    def from_settings(cls, settings, stats=None):
+        return cls(job_dir(settings),
+                   debug=settings.getbool('DUPEFILTER_DEBUG'),
+                   capacity=settings.getint('DUPEFILTER_BLOOM_CAPACITY'),
+                   error_rate=settings.getfloat('DUPEFILTER_BLOOM_ERROR_RATE'),
+                   growth=settings.getint('DUPEFILTER_BLOOM_GROWTH'),
+                   stats=stats)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        dupefilter = cls.from_settings(crawler.settings, crawler.stats)
+        dupefilter.fingerprinter = crawler.request_fingerprinter
+        return dupefilter
+
+    def request_seen(self, request):
+        fp = self.request_fingerprint(request)
+        if self.bloom.add(fp):
+            return True
+        if len(self.bloom.filters) != self._nfilters:
+            self._nfilters = len(self.bloom.filters)
+            self._update_stats()
+
+    def _update_stats(self):
+        if self.stats is None:
+            return
+        self.stats.set_value('dupefilter/bloom/filters', len(self.bloom.filters))
+        self.stats.set_value('dupefilter/bloom/fingerprints', len(self.bloom))
+        self.stats.set_value('dupefilter/bloom/fill_ratio',
+                             round(self.bloom.fill_ratio, 4))
+        self.stats.set_value('dupefilter/bloom/error_rate',
+                             self.bloom.error_rate)
+
+    def open(self):
+        self._update_stats()
+
+    def checkpoint(self):
+        self.bloom.flush()
+        self._update_stats()
+
+    def close(self, reason):
+        self._update_stats()
+        self.bloom.close()
+
+
+def _fingerprint_digest(fp, size):
+    """Return the first ``size`` bytes of the binary form of the ``fp``
+    request fingerprint"""
+    if len(fp) == 40:
+        try:
+            return binascii.unhexlify(fp)[:size]
+        except (TypeError, ValueError):  # not a hex sha1 fingerprint
+            pass
+    return hashlib.sha1(to_bytes(fp)).digest()[:size]
+
+
+class _DigestSet(object):
+    """Hash set of fixed-size binary digests, stored in an open addressing
+    table (linear probing) in a memory-mapped file, or in anonymous memory if
+    ``path`` is ``None``.
+
+    Digests are expected to be uniformly distributed (e.g. cryptographic
+    hashes), as their first 8 bytes are used as the hash. All-zeros slots
+    are empty, so an all-zeros digest is always considered as present.
+
+    The header tells whether the table was modified since the last
+    :meth:`sync`, and the size of the fingerprints log it matched then.
+    """
+
+    _header = struct.Struct('>4sBBQQQ')  # magic, width, dirty, capacity, count, log size
+    _magic = b'FPS1'
+    _max_load = 0.7
+
+    def __init__(self, path=None, width=16, capacity=1024):
+        self.path = path
+        if path and os.path.exists(path):
+            with open(path, 'r+b') as f:
+                self.mm = mmap.mmap(f.fileno(), 0)
+            magic, self.width, self.dirty, self.capacity, self.count, \
+                self.logsize = self._header.unpack_from(self.mm)
+            if magic != self._magic:
+                raise ValueError('%s is not a fingerprint set file' % path)
+        else:
+            self.width = width
+            self.capacity = capacity
+            self.count = self.logsize = 0
+            self.dirty = True
+            size = self._header.size + capacity * width
+            if path:
+                with open(path, 'w+b') as f:
+                    f.truncate(size)
+                    self.mm = mmap.mmap(f.fileno(), size)
+            else:
+                self.mm = mmap.mmap(-1, size)
+            self._write_header()
+        self._empty = b'\0' * self.width
+
+    def _write_header(self):
+        self._header.pack_into(self.mm, 0, self._magic, self.width, self.dirty,
+                               self.capacity, self.count, self.logsize)
+
+    def _slot(self, digest):
+        # offset of the slot holding digest, or of the empty slot for it
+        mm, width, capacity = self.mm, self.width, self.capacity
+        offset = self._header.size
+        i = struct.unpack_from('>Q', digest)[0] % capacity
+        while True:
+            start = offset + i * width
+            slot = mm[start:start + width]
+            if slot == digest or slot == self._empty:
+                return start, slot == digest
+            i += 1
+            if i == capacity:
+                i = 0
+
+    def __contains__(self, digest):
+        return self._slot(digest)[1]
+
+    def add(self, digest):
+        """Add ``digest`` to the set. Return ``True`` if it was already
+        there, ``False`` otherwise."""
+        start, found = self._slot(digest)
+        if found:
+            return True
+        if not self.dirty and self.path:
+            # make sure that a crash from now on does not leave a table
+            # which looks consistent with the log
+            self.dirty = True
+            self._write_header()
+            self.mm.flush()
+        self.mm[start:start + self.width] = digest
+        self.count += 1
+        if self.count > self.capacity * self._max_load:
+            self._grow()
+        return False
+
+    def __iter__(self):
+        mm, width, empty = self.mm, self.width, self._empty
+        offset = self._header.size
+        for i in range(self.capacity):
+            start = offset + i * width
+            slot = mm[start:start + width]
+            if slot != empty:
+                yield slot
+
+    def _grow(self):
+        tmppath = self.path + '.tmp' if self.path else None
+        new = _DigestSet(tmppath, self.width, self.capacity * 2)
+        for digest in self:
+            start, _ = new._slot(digest)
+            new.mm[start:start + new.width] = digest
+        new.count = self.count
+        new.logsize = self.logsize
+        new._write_header()
+        self.mm.close()
+        if self.path:
+            new.mm.flush()
+            os.rename(tmppath, self.path)
+            new.path = self.path
+        self.mm, self.capacity = new.mm, new.capacity
+
+    def __len__(self):
+        return self.count
+
+    def sync(self, logsize):
+        """Flush the table and mark it as matching a log of ``logsize``
+        bytes."""
+        self.logsize = logsize
+        self.dirty = False
+        self._write_header()
+        self.mm.flush()
+
+    def close(self):
+        self.mm.close()
+
+
+class CompactRFPDupeFilter(RFPDupeFilter):
+    """Request Fingerprint duplicates filter which stores fingerprints as
+    fixed-size binary digests instead of hex strings.
+
+    Fingerprints are kept in a :class:`_DigestSet`, which takes about 1.5
+    times their size in memory. With a job directory they are appended to
+    ``requests.seen.bin`` and the table itself is kept in the memory-mapped
+    ``requests.seen.index`` file, so that resuming a crawl does not need to
+    read the fingerprints again, unless the crawl was not closed cleanly.
+    A text ``requests.seen`` file left by :class:`RFPDupeFilter` is
+    converted the first time.
+    """
+
+    _log_header = struct.Struct('>4sB')  # magic, width
+    _log_magic = b'FPL1'
+
+    def __init__(self, path=None, debug=False, digest_size=16):
+        super(CompactRFPDupeFilter, self).__init__(debug=debug)
+        if not 8 <= digest_size <= 20:
+            raise ValueError('Invalid fingerprint digest size: %r (valid '
+                             'sizes are 8 to 20)' % digest_size)
+        self.digest_size = digest_size
+        if not path:
+            self.digests = _DigestSet(width=digest_size)
+            return
+        logpath = os.path.join(path, 'requests.seen.bin')
+        indexpath = os.path.join(path, 'requests.seen.index')
+        self.checkpointpath = logpath + '.checkpoint'
+        if not os.path.exists(logpath):
+            with open(logpath, 'wb') as f:
+                f.write(self._log_header.pack(self._log_magic, digest_size))
+                self._migrate(os.path.join(path, 'requests.seen'), f)
+            if os.path.exists(indexpath):
+                os.remove(indexpath)
+        self._restore_checkpoint(logpath)
+        self.file = open(logpath, 'r+b')
+        magic, self.digest_size = self._log_header.unpack(
+            self.file.read(self._log_header.size))
+        if magic != self._log_magic:
+            raise ValueError('%s is not a fingerprints file' % logpath)
+        self.file.seek(0, os.SEEK_END)
+        self.digests = self._load_index(indexpath, self.file.tell())
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(job_dir(settings),
+                   debug=settings.getbool('DUPEFILTER_DEBUG'),
+                   digest_size=settings.getint('DUPEFILTER_DIGEST_SIZE'))
+
+    def _digest(self, fp):
+        return _fingerprint_digest(fp, self.digest_size)
+
+    def _migrate(self, seenpath, logfile):
+        if not os.path.exists(seenpath):
+            return
+        count = 0
+        with open(seenpath) as f:
+            for line in f:
+                logfile.write(self._digest(line.rstrip()))
+                count += 1
+        self.logger.info("Converted %(count)d fingerprints from %(path)s",
+                         {'count': count, 'path': seenpath})
+
+    def _load_index(self, indexpath, logsize):
+        if os.path.exists(indexpath):
+            digests = _DigestSet(indexpath)
+            if not digests.dirty and digests.logsize == logsize:
+                return digests
+            digests.close()
+            os.remove(indexpath)
+        # the index is missing or out of date: build it from the log
+        self.file.seek(self._log_header.size)
+        data = self.file.read()
+        width = self.digest_size
+        count = len(data) // width
+        capacity = 1024
+        while count > capacity * _DigestSet._max_load / 2:
+            capacity *= 2
+        digests = _DigestSet(indexpath, width, capacity)
+        for i in range(0, count * width, width):
+            digests.add(data[i:i + width])
+        digests.sync(logsize)
+        return digests
+
+    def request_seen(self, request):
+        digest = self._digest(self.request_fingerprint(request))
+        if self.digests.add(digest):
+            return True
+        if self.file:
+            self.file.write(digest)
+
+    def checkpoint(self):
+        super(CompactRFPDupeFilter, self).checkpoint()
+        if self.file:
+            self.digests.sync(self.file.tell())
+
+    def close(self, reason):
+        if self.file:
+            self.file.flush()
+            self.digests.sync(self.file.tell())
+        self.digests.close()
+        super(CompactRFPDupeFilter, self).close(reason)
+
+
+_RUN_DIGEST_SIZE = 16
+_RUN_ERROR_RATE = 0.01
+
+
+class _SortedRun(object):
+    """Sorted file of unique 16-byte digests, with a Bloom filter of them
+    stored next to it, so that most misses do not need a binary search."""
+
+    width = _RUN_DIGEST_SIZE
+
+    def __init__(self, path, level=0):
+        self.path = path
+        self.level = level
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = len(self.mm) // self.width
+        self.bloom = _BloomFilter(path + '.bloom')
+
+    @classmethod
+    def write(cls, path, digests, count, level=0):
+        """Write the sorted and unique ``digests`` to a new run at ``path``.
+        ``count`` is their maximum number, used to size the Bloom filter.
+        """
+        bloom = _BloomFilter(path + '.bloom', max(count, 1), _RUN_ERROR_RATE)
+        buf = []
+        with open(path, 'wb') as f:
+            for digest in digests:
+                bloom.add(struct.unpack_from('>QQ', digest))
+                buf.append(digest)
+                if len(buf) == 4096:
+                    f.write(b''.join(buf))
+                    buf = []
+            f.write(b''.join(buf))
+            f.flush()
+            os.fsync(f.fileno())
+        bloom.flush()
+        bloom.close()
+        return cls(path, level)
+
+    def __contains__(self, digest):
+        if struct.unpack_from('>QQ', digest) not in self.bloom:
+            return False
+        mm, width = self.mm, self.width
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = mm[mid * width:(mid + 1) * width]
+            if value < digest:
+                lo = mid + 1
+            elif value > digest:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def __iter__(self):
+        mm, width = self.mm, self.width
+        for start in range(0, self.count * width, width):
+            yield mm[start:start + width]
+
+    def close(self):
+        self.mm.close()
+        self.bloom.close()
+
+    def remove(self):
+        self.close()
+        os.remove(self.path)
+        os.remove(self.path + '.bloom')
+
+
+def _unique(iterable):
+    last = None
+    for value in iterable:
+        if value != last:
+            yield value
+            last = value
+
+
+class TieredDupeFilter(RFPDupeFilter):
+    """Request Fingerprint duplicates filter for sets of fingerprints larger
+    than the available memory.
+
+    Fingerprints are kept in memory as 16-byte digests until there are
+    ``max_memory`` of them. Then they are written, in a thread, to a sorted
+    run on disk with its own Bloom filter, LSM-tree style. Whenever
+    ``fanout`` runs of the same level exist, they are merged, also in a
+    thread, into a run of the next level, so that the number of runs grows
+    logarithmically with the number of fingerprints.
+
+    Runs are stored in ``requests.seen.d`` in the job directory (or in a
+    temporary directory, removed on close), together with logs of the
+    fingerprints held in memory, so that a crawl can be resumed.
+    :meth:`open` and :meth:`close` return Deferreds, which fire once the
+    fingerprints are loaded and once pending writes and merges are done.
+    """
+
+    def __init__(self, path=None, debug=False, max_memory=1000000, fanout=4):
+        super(TieredDupeFilter, self).__init__(debug=debug)
+        if max_memory < 1 or fanout < 2:
+            raise ValueError('Invalid tiered dupefilter parameters: '
+                             'max_memory=%r, fanout=%r' % (max_memory, fanout))
+        self.path = os.path.join(path, 'requests.seen.d') if path else None
+        self.persist = bool(path)
+        self.max_memory = max_memory
+        self.fanout = fanout
+        self.hot = set()
+        self.hotlogs = []  # logs of the fingerprints in self.hot
+        self.frozen = None  # fingerprints being written to a run
+        self.runs = []
+        self.hotlog = None
+        self.logseq = None
+        self.seq = 0
+        self.pending = None  # Deferred of the write or merge in progress
+        self.closing = False
+        self._checkpoint = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(job_dir(settings),
+                   debug=settings.getbool('DUPEFILTER_DEBUG'),
+                   max_memory=settings.getint('DUPEFILTER_MEMORY_FINGERPRINTS'),
+                   fanout=settings.getint('DUPEFILTER_RUNS_FANOUT'))
+
+    def open(self):
+        if not self.persist:
+            self.path = tempfile.mkdtemp(prefix='scrapy-dupefilter-')
+        return threads.deferToThread(self._load)
+
+    def _manifestpath(self):
+        return os.path.join(self.path, 'manifest.json')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        manifest = {'seq': 0, 'runs': []}
+        if os.path.exists(self._manifestpath()):
+            with open(self._manifestpath()) as f:
+                manifest = json.load(f)
+        self.seq = manifest['seq']
+        listed = set()
+        for name, level in manifest['runs']:
+            self.runs.append(_SortedRun(os.path.join(self.path, name), level))
+            listed.update([name, name + '.bloom'])
+        checkpoint = self._checkpoint = manifest.get('checkpoint')
+        logs = []
+        for name in os.listdir(self.path):
+            if name.startswith('run-') and name not in listed:
+                # left by a write or merge which did not finish
+                os.remove(os.path.join(self.path, name))
+            elif name.startswith('hot-'):
+                logs.append((int(name[4:]), name))
+        for seq, name in sorted(logs):
+            logpath = os.path.join(self.path, name)
+            if checkpoint and seq > checkpoint['seq']:
+                # written after the last checkpoint of a crawl which was
+                # not closed cleanly
+                os.remove(logpath)
+                continue
+            with open(logpath, 'r+b') as f:
+                if checkpoint and seq == checkpoint['seq']:
+                    f.truncate(checkpoint['offset'])
+                data = f.read()
+            width = _RUN_DIGEST_SIZE
+            self.hot.update(data[i:i + width]
+                            for i in range(0, len(data) - width + 1, width))
+            self.hotlogs.append(logpath)
+        if self.persist:
+            self._newlog()
+
+    def _newname(self, prefix):
+        self.seq += 1
+        return os.path.join(self.path, '%s-%d' % (prefix, self.seq))
+
+    def _newlog(self):
+        if self.hotlog:
+            self.hotlog.close()
+        self.hotlog = open(self._newname('hot'), 'wb')
+        self.logseq = self.seq
+        self.hotlogs.append(self.hotlog.name)
+
+    def _save_manifest(self):
+        if not self.persist:
+            return
+        manifest = {
+            'seq': self.seq,
+            'runs': [[os.path.basename(r.path), r.level] for r in self.runs],
+        }
+        if self._checkpoint:
+            manifest['checkpoint'] = self._checkpoint
+        atomic_json_dump(manifest, self._manifestpath())
+
+    def request_seen(self, request):
+        digest = _fingerprint_digest(self.request_fingerprint(request),
+                                     _RUN_DIGEST_SIZE)
+        if digest in self.hot:
+            return True
+        if self.frozen is not None and digest in self.frozen:
+            return True
+        for run in self.runs:
+            if digest in run:
+                return True
+        self.hot.add(digest)
+        if self.hotlog:
+            self.hotlog.write(digest)
+        if len(self.hot) >= self.max_memory and self.pending is None:
+            self._flush()
+
+    def _flush(self):
+        self.frozen, self.hot = self.hot, set()
+        frozenlogs, self.hotlogs = self.hotlogs, []
+        if self.persist:
+            self._newlog()
+        path = self._newname('run')
+        frozen = self.frozen
+        self.pending = threads.deferToThread(
+            lambda: _SortedRun.write(path, sorted(frozen), len(frozen)))
+        self.pending.addCallbacks(self._flushed, self._flush_failed,
+                                  callbackArgs=(frozenlogs,),
+                                  errbackArgs=(frozenlogs,))
+
+    def _flushed(self, run, frozenlogs):
+        self.runs.insert(0, run)
+        self.frozen = self.pending = None
+        self._save_manifest()
+        for logpath in frozenlogs:
+            os.remove(logpath)
+        self._next()
+
+    def _flush_failed(self, failure, frozenlogs):
+        self.logger.error("Unable to write fingerprints to disk: %(error)s",
+                          {'error': failure.getErrorMessage()},
+                          exc_info=failure_to_exc_info(failure))
+        self.hot.update(self.frozen)
+        self.hotlogs = frozenlogs + self.hotlogs
+        self.frozen = self.pending = None
+
+    def _next(self):
+        if self.closing:
+            return
+        if len(self.hot) >= self.max_memory:
+            self._flush()
+            return
+        levels = {}
+        for run in self.runs:
+            levels.setdefault(run.level, []).append(run)
+        for level in sorted(levels):
+            group = levels[level]
+            if len(group) >= self.fanout:
+                self._merge(group, level + 1)
+                return
+
+    def _merge(self, group, level):
+        path = self._newname('run')
+        count = sum(run.count for run in group)
+        self.pending = threads.deferToThread(
+            lambda: _SortedRun.write(path, _unique(heapq.merge(*group)),
+                                     count, level))
+        self.pending.addCallbacks(self._merged, self._merge_failed,
+                                  callbackArgs=(group,))
+
+    def _merged(self, run, group):
+        self.runs = [run] + [r for r in self.runs if r not in group]
+        self.pending = None
+        self._save_manifest()
+        for r in group:
+            r.remove()
+        self._next()
+
+    def _merge_failed(self, failure):
+        # the runs are still usable, try again later
+        self.logger.error("Unable to merge fingerprint runs: %(error)s",
+                          {'error': failure.getErrorMessage()},
+                          exc_info=failure_to_exc_info(failure))
+        self.pending = None
+
+    def _wait_pending(self):
+        """Return a Deferred which fires when the current write or merge
+        is done."""
+        if self.pending is None:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self.pending.addBoth(lambda result: d.callback(None))
+        return d
+
+    def checkpoint(self):
+        if self.hotlog:
+            self.hotlog.flush()
+            os.fsync(self.hotlog.fileno())
+            self._checkpoint = {'seq': self.logseq, 'offset': self.hotlog.tell()}
+            self._save_manifest()
+
+    def close(self, reason):
+        self.closing = True
+        d = self._wait_pending()
+        d.addCallback(lambda _: self._close())
+        return d
+
+    def _close(self):
+        if self.hotlog:
+            self.hotlog.flush()
+            os.fsync(self.hotlog.fileno())
+            self.hotlog.close()
+        self._checkpoint = None
+        self._save_manifest()
+        for run in self.runs:
+            run.close()
+        if not self.persist and self.path:
+            shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,75 @@
+"""
+Extensions for the DNS resolver installed in the reactor
+
+See documentation in docs/topics/extensions.rst
+"""
+from collections import Counter
+
+from twisted.internet import reactor
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+
+
+class DNSPrefetch(object):
+    """Start resolving the hostnames of requests as soon as they are
+    scheduled, when the installed resolver supports it"""
+
+    def __init__(self, crawler):
+        if not crawler.settings.getbool('DNS_PREFETCH'):
+            raise NotConfigured
+        crawler.signals.connect(self.request_scheduled,
+                                signal=signals.request_scheduled)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def request_scheduled(self, request, spider):
+        prefetch = getattr(reactor.resolver, 'prefetch', None)
+        if prefetch is None or 'proxy' in request.meta:
+            return
+        hostname = urlparse_cached(request).hostname
+        if hostname:
+            prefetch(hostname)
+
+
+class DNSStats(object):
+    """Record the lookup stats of the installed resolver, from the time the
+    spider was opened, when the resolver keeps them"""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.start = (None, Counter())
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        o = cls(crawler.stats)
+        crawler.signals.connect(o.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(o.spider_closed, signal=signals.spider_closed)
+        return o
+
+    def spider_opened(self, spider):
+        # CrawlerProcess installs its resolver after opening the spiders
+        resolver_stats = getattr(reactor.resolver, 'stats', None)
+        if resolver_stats is not None:
+            self.start = (reactor.resolver, Counter(resolver_stats))
+
+    def spider_closed(self, spider):
+        resolver_stats = getattr(reactor.resolver, 'stats', None)
+        if resolver_stats is None:
+            return
+        counters = Counter(resolver_stats)
+        resolver, start = self.start
+        if resolver is reactor.resolver:
+            counters.subtract(start)
+        latency = counters.pop('latency', 0)
+        for name, value in counters.items():
+            self.stats.set_value('dns/%s' % name, value, spider=spider)
+        lookups = counters['lookup']
+        if lookups:
+            self.stats.set_value('dns/latency/avg', latency / lookups,
+                                 spider=spider)
+            self.stats.set_value('dns/latency/max', reactor.resolver.max_latency,
+                                 spider=spider)
@@ -0,0 +1,153 @@
+"""
+DownloadTimings extension
+
+See documentation in docs/topics/extensions.rst
+"""
+from collections import defaultdict, Counter, OrderedDict
+from math import ceil, log
+
+import six
+from twisted.internet import task
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+
+class Histogram(object):
+    """Histogram of durations, in seconds, with logarithmic buckets.
+
+    Percentiles are accurate to ``precision`` (a relative error) and memory
+    use doesn't grow with the number of values added.
+    """
+
+    def __init__(self, precision=0.05, minvalue=0.0001):
+        self.minvalue = minvalue
+        self.count = 0
+        self.max = 0
+        self._growth = 1 + precision
+        self._log_growth = log(self._growth)
+        self._buckets = Counter()
+
+    def add(self, value):
+        if value <= self.minvalue:
+            index = 0
+        else:
+            index = int(ceil(log(value / self.minvalue) / self._log_growth))
+        self._buckets[index] += 1
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """Return the duration which ``q`` percent of the durations added
+        don't exceed, or ``None`` for empty histograms"""
+        if not self.count:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                break
+        return min(self.minvalue * self._growth ** index, self.max)
+
+
+class DownloadTimings(object):
+    """Aggregate the durations of the phases of downloads, and their
+    latency, in histograms per phase and per download slot, and store their
+    percentiles in the crawl stats
+
+    Only the ``DOWNLOAD_TIMINGS_MAX_SLOTS`` slots with the most recent
+    downloads keep histograms, to bound memory use and stats size in broad
+    crawls.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('DOWNLOAD_TIMINGS_ENABLED'):
+            raise NotConfigured
+        self.stats = crawler.stats
+        self.interval = settings.getfloat('DOWNLOAD_TIMINGS_INTERVAL')
+        self.percentiles = [float(q) for q in
+                            settings.getlist('DOWNLOAD_TIMINGS_PERCENTILES')]
+        self.per_slot = settings.getbool('DOWNLOAD_TIMINGS_PER_SLOT')
+        self.max_slots = settings.getint('DOWNLOAD_TIMINGS_MAX_SLOTS')
+        # keyed by phase, for all downloads
+        self.histograms = defaultdict(Histogram)
+        # keyed by slot, least recently downloaded first
+        self.slot_histograms = OrderedDict()
+        # slots with percentiles in the crawl stats
+        self._slots_in_stats = set()
+        self.task = None
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(self.response_downloaded,
+                                signal=signals.response_downloaded)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        if self.interval:
+            self.task = task.LoopingCall(self.update_stats, spider)
+            self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.task and self.task.running:
+            self.task.stop()
+        self.update_stats(spider)
+
+    def response_downloaded(self, response, request, spider):
+        timings = dict(request.meta.get('download_timings') or {})
+        if 'download_latency' in request.meta:
+            timings['latency'] = request.meta['download_latency']
+        slot = request.meta.get('download_slot') if self.per_slot else None
+        slot_histograms = self._get_slot_histograms(slot) if timings else None
+        for phase, duration in six.iteritems(timings):
+            self.histograms[phase].add(duration)
+            if slot_histograms is not None:
+                slot_histograms[phase].add(duration)
+
+    def _get_slot_histograms(self, slot):
+        if slot is None or self.max_slots <= 0:
+            return None
+        histograms = self.slot_histograms.pop(slot, None)
+        if histograms is None:
+            histograms = defaultdict(Histogram)
+            while len(self.slot_histograms) >= self.max_slots:
+                self.slot_histograms.popitem(last=False)
+        self.slot_histograms[slot] = histograms
+        return histograms
+
+    def percentile(self, phase, q, slot=None):
+        """Return the ``q`` percentile of the durations of ``phase``, in
+        the downloads of ``slot`` or in all downloads, or ``None``"""
+        if slot is None:
+            histograms = self.histograms
+        else:
+            histograms = self.slot_histograms.get(slot, {})
+        histogram = histograms.get(phase)
+        return histogram.percentile(q) if histogram is not None else None
+
+    def update_stats(self, spider):
+        evicted = self._slots_in_stats.difference(self.slot_histograms)
+        if evicted:
+            prefixes = tuple('download_timings/slots/%s/' % slot
+                             for slot in evicted)
+            stats = self.stats.get_stats(spider)
+            self.stats.set_stats(dict((k, v) for k, v in six.iteritems(stats)
+                                      if not k.startswith(prefixes)),
+                                 spider=spider)
+        self._slots_in_stats = set(self.slot_histograms)
+        for phase, histogram in list(self.histograms.items()):
+            self._set_percentiles('download_timings/%s' % phase, histogram,
+                                  spider)
+        for slot, histograms in list(self.slot_histograms.items()):
+            for phase, histogram in list(histograms.items()):
+                self._set_percentiles('download_timings/slots/%s/%s' % (
+                    slot, phase), histogram, spider)
+
+    def _set_percentiles(self, prefix, histogram, spider):
+        for q in self.percentiles:
+            self.stats.set_value('%s/p%g' % (prefix, q),
+                                 histogram.percentile(q), spider=spider)
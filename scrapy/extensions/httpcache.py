@@ -2,6 +2,7 @@ from __future__ import print_function
 import os
 import gzip
 import logging
+import shutil
 from six.moves import cPickle as pickle
 from importlib import import_module
 from time import time
@@ -10,7 +11,7 @@ from email.utils import mktime_tz, parsedate_tz
 from w3lib.http import headers_raw_to_dict, headers_dict_to_raw
 from scrapy.http import Headers, Response
 from scrapy.responsetypes import responsetypes
-from scrapy.utils.request import request_fingerprint
+from scrapy.utils.request import RequestFingerprinter
 from scrapy.utils.project import data_path
 from scrapy.utils.httpobj import urlparse_cached
 from scrapy.utils.python import to_bytes, to_unicode, garbage_collect
@@ -18,6 +19,9 @@ from scrapy.utils.python import to_bytes, to_unicode, garbage_collect
 
 logger = logging.getLogger(__name__)
 
+# os.rename does not overwrite on Windows
+_replace = getattr(os, 'replace', os.rename)
+
 
 class DummyPolicy(object):
 
@@ -219,6 +223,13 @@ class DbmCacheStorage(object):
         self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
         self.dbmodule = import_module(settings['HTTPCACHE_DBM_MODULE'])
         self.db = None
+        self.fingerprinter = RequestFingerprinter()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        storage = cls(crawler.settings)
+        storage.fingerprinter = crawler.request_fingerprinter
+        return storage
 
     def open_spider(self, spider):
         dbpath = os.path.join(self.cachedir, '%s.db' % spider.name)
@@ -266,7 +277,7 @@ class DbmCacheStorage(object):
         return pickle.loads(db['%s_data' % key])
 
     def _request_key(self, request):
-        return request_fingerprint(request)
+        return self.fingerprinter.fingerprint(request)
 
 
 class FilesystemCacheStorage(object):
@@ -276,6 +287,14 @@ class FilesystemCacheStorage(object):
         self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
         self.use_gzip = settings.getbool('HTTPCACHE_GZIP')
         self._open = gzip.open if self.use_gzip else open
+        self.spoolsize = settings.getint('DOWNLOAD_SPOOLSIZE')
+        self.fingerprinter = RequestFingerprinter()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        storage = cls(crawler.settings)
+        storage.fingerprinter = crawler.request_fingerprinter
+        return storage
 
     def open_spider(self, spider):
         logger.debug("Using filesystem cache storage in %(cachedir)s" % {'cachedir': self.cachedir},
@@ -290,14 +309,22 @@ class FilesystemCacheStorage(object):
         if metadata is None:
             return  # not cached
         rpath = self._get_request_path(spider, request)
-        with self._open(os.path.join(rpath, 'response_body'), 'rb') as f:
-            body = f.read()
         with self._open(os.path.join(rpath, 'response_headers'), 'rb') as f:
             rawheaders = f.read()
         url = metadata.get('response_url')
         status = metadata['status']
         headers = Headers(headers_raw_to_dict(rawheaders))
         respcls = responsetypes.from_args(headers=headers, url=url)
+        bodypath = os.path.join(rpath, 'response_body')
+        spoolsize = getattr(spider, 'download_spoolsize', self.spoolsize)
+        if (not self.use_gzip and spoolsize and
+                os.path.getsize(bodypath) > spoolsize):
+            # large bodies are served from the cache file itself, which
+            # store_response never overwrites in place
+            return respcls(url=url, headers=headers, status=status,
+                           bodyfile=open(bodypath, 'rb'))
+        with self._open(bodypath, 'rb') as f:
+            body = f.read()
         response = respcls(url=url, headers=headers, status=status, body=body)
         return response
 
@@ -319,15 +346,21 @@ class FilesystemCacheStorage(object):
             pickle.dump(metadata, f, protocol=2)
         with self._open(os.path.join(rpath, 'response_headers'), 'wb') as f:
             f.write(headers_dict_to_raw(response.headers))
-        with self._open(os.path.join(rpath, 'response_body'), 'wb') as f:
-            f.write(response.body)
+        bodypath = os.path.join(rpath, 'response_body')
+        with self._open(bodypath + '.tmp', 'wb') as f:
+            if response.bodyfile is None:
+                f.write(response.body)
+            else:
+                with response.open_body() as body:
+                    shutil.copyfileobj(body, f)
+        _replace(bodypath + '.tmp', bodypath)
         with self._open(os.path.join(rpath, 'request_headers'), 'wb') as f:
             f.write(headers_dict_to_raw(request.headers))
         with self._open(os.path.join(rpath, 'request_body'), 'wb') as f:
             f.write(request.body)
 
     def _get_request_path(self, spider, request):
-        key = request_fingerprint(request)
+        key = self.fingerprinter.fingerprint(request)
         return os.path.join(self.cachedir, spider.name, key[0:2], key)
 
     def _read_meta(self, spider, request):
@@ -350,6 +383,13 @@ class LeveldbCacheStorage(object):
         self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
         self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
         self.db = None
+        self.fingerprinter = RequestFingerprinter()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        storage = cls(crawler.settings)
+        storage.fingerprinter = crawler.request_fingerprinter
+        return storage
 
     def open_spider(self, spider):
         dbpath = os.path.join(self.cachedir, '%s.leveldb' % spider.name)
@@ -407,7 +447,7 @@ class LeveldbCacheStorage(object):
             return pickle.loads(data)
 
     def _request_key(self, request):
-        return to_bytes(request_fingerprint(request))
+        return to_bytes(self.fingerprinter.fingerprint(request))
 
 
 
@@ -1,7 +1,14 @@
 import logging
+from collections import deque
+from email.utils import mktime_tz, parsedate_tz
+from time import time
+
+from twisted.internet import defer
+from twisted.internet.error import TimeoutError, TCPTimedOutError
 
 from scrapy.exceptions import NotConfigured
 from scrapy import signals
+from scrapy.utils.python import to_native_str
 
 logger = logging.getLogger(__name__)
 
@@ -91,3 +98,202 @@ class AutoThrottle(object):
             return
 
         slot.delay = new_delay
+
+
+class AdaptiveConcurrency(object):
+    """Tune the concurrency and the delay of each downloader slot together,
+    with an AIMD (additive increase, multiplicative decrease) controller.
+
+    The concurrency of a slot grows by one after each window of ``concurrency``
+    responses received while the slot was saturated, and is multiplied by
+    ``ADAPTIVE_CONCURRENCY_BACKOFF`` on signs of overload: timeouts, 429 and
+    503 responses, and latencies which grow beyond
+    ``ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE`` times the lowest recent
+    latency. Once the concurrency is at its minimum, further overload
+    increases the download delay instead, and ``Retry-After`` headers set it.
+    The download handlers are allowed to keep as many persistent connections
+    per host as the highest slot concurrency.
+    """
+
+    # decreased delays below this many seconds, or below twice the minimum
+    # delay, are set to the minimum delay
+    min_delay_step = 0.01
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED'):
+            raise NotConfigured
+        if settings.getbool('AUTOTHROTTLE_ENABLED'):
+            logger.warning("AutoThrottle and AdaptiveConcurrency are both "
+                           "enabled, and will both adjust download delays")
+
+        self.debug = settings.getbool('ADAPTIVE_CONCURRENCY_DEBUG')
+        self.minconcurrency = max(1, settings.getint('ADAPTIVE_CONCURRENCY_MIN'))
+        self.maxconcurrency = max(self.minconcurrency,
+                                  settings.getint('ADAPTIVE_CONCURRENCY_MAX'))
+        self.backoff = settings.getfloat('ADAPTIVE_CONCURRENCY_BACKOFF')
+        self.tolerance = settings.getfloat('ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE')
+        self.maxdelay = settings.getfloat('ADAPTIVE_CONCURRENCY_MAX_DELAY')
+        self.maxperhost = settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN')
+        self.stats = crawler.stats
+        crawler.signals.connect(self._spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self._response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(self._download_error, signal=signals.download_error)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _spider_opened(self, spider):
+        self.mindelay = getattr(spider, 'download_delay',
+                                self.crawler.settings.getfloat('DOWNLOAD_DELAY'))
+
+    def _get_slot(self, request, spider):
+        key = request.meta.get('download_slot')
+        return key, self.crawler.engine.downloader.slots.get(key)
+
+    def _state(self, slot):
+        if slot.controller is None:
+            slot.controller = _SlotState()
+        return slot.controller
+
+    def _response_downloaded(self, response, request, spider):
+        key, slot = self._get_slot(request, spider)
+        if slot is None:
+            return
+        state = self._state(slot)
+        if response.status in (429, 503):
+            self._decrease(key, slot, state, 'http_%d' % response.status,
+                           request, spider, _retry_after(response))
+            return
+
+        latency = request.meta.get('download_latency')
+        if latency is not None and response.status == 200:
+            state.add_latency(latency)
+            if state.congested(self.tolerance):
+                self._decrease(key, slot, state, 'latency', request, spider)
+                return
+        self._increase(key, slot, state, spider)
+
+    def _download_error(self, failure, request, spider):
+        if not failure.check(TimeoutError, defer.TimeoutError, TCPTimedOutError):
+            return
+        key, slot = self._get_slot(request, spider)
+        if slot is not None:
+            self._decrease(key, slot, self._state(slot), 'timeout', request,
+                           spider)
+
+    def _increase(self, key, slot, state, spider):
+        if time() < state.hold_until:
+            return
+        state.acked += 1
+        if state.acked < slot.concurrency:
+            return
+        state.acked = 0
+        if slot.delay > self.mindelay:
+            delay = slot.delay * self.backoff
+            # multiplying alone never gets back to a minimum delay of 0
+            if delay < max(2 * self.mindelay, self.min_delay_step):
+                delay = self.mindelay
+            slot.delay = delay
+        elif slot.concurrency < self.maxconcurrency and \
+                len(slot.transferring) >= slot.concurrency:
+            # only grow the concurrency that the slot is actually using
+            slot.concurrency += 1
+            if slot.concurrency > self.maxperhost:
+                # let the additional requests reuse their connections instead
+                # of closing them once downloaded
+                self.maxperhost = slot.concurrency
+                self.crawler.engine.downloader.handlers.set_max_per_host(
+                    self.maxperhost)
+        else:
+            return
+        self.stats.inc_value('adaptive_concurrency/increase', spider=spider)
+        self._log(key, slot, state, 'increase', 'window', spider)
+
+    def _decrease(self, key, slot, state, reason, request, spider,
+                  retry_after=None):
+        now = time()
+        if retry_after is not None:
+            slot.delay = min(max(slot.delay, retry_after), self.maxdelay)
+        # back off once for each congestion event, ignoring the responses of
+        # the requests that were already in flight
+        if now < state.hold_until:
+            return
+        latency = state.latency or request.meta.get('download_latency') or 0
+        state.hold_until = now + max(latency, slot.delay)
+        state.acked = 0
+        if slot.concurrency > self.minconcurrency:
+            slot.concurrency = max(self.minconcurrency,
+                                   int(slot.concurrency * self.backoff))
+        elif retry_after is None:
+            delay = slot.delay or state.latency or 1.0
+            slot.delay = min(delay / self.backoff, self.maxdelay)
+        self.stats.inc_value('adaptive_concurrency/decrease/%s' % reason,
+                             spider=spider)
+        self._log(key, slot, state, 'decrease', reason, spider)
+
+    def _log(self, key, slot, state, decision, reason, spider):
+        if not self.debug:
+            return
+        logger.info(
+            "slot: %(slot)s | %(decision)s (%(reason)s) | "
+            "conc:%(concurrency)2d | delay:%(delay)5d ms | "
+            "latency:%(latency)5d ms (min %(minlatency)d ms)",
+            {
+                'slot': key, 'decision': decision, 'reason': reason,
+                'concurrency': slot.concurrency, 'delay': slot.delay * 1000,
+                'latency': (state.latency or 0) * 1000,
+                'minlatency': state.min_latency() * 1000,
+            },
+            extra={'spider': spider}
+        )
+
+
+class _SlotState(object):
+    """Latency samples and AIMD state of a downloader slot"""
+
+    # number of recent latencies of which the lowest is the baseline
+    window = 100
+    # weight of a new sample in the moving average of latencies
+    alpha = 0.3
+    # latency variations below this many seconds are ignored as noise
+    min_baseline = 0.01
+
+    def __init__(self):
+        self.latencies = deque(maxlen=self.window)
+        self.latency = None
+        self.acked = 0
+        self.hold_until = 0
+
+    def add_latency(self, latency):
+        self.latencies.append(latency)
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.alpha * (latency - self.latency)
+
+    def min_latency(self):
+        return min(self.latencies) if self.latencies else 0
+
+    def congested(self, tolerance):
+        """Whether the average latency grew beyond ``tolerance`` times the
+        lowest recent latency"""
+        baseline = max(self.min_latency(), self.min_baseline)
+        return self.latency is not None and self.latency > tolerance * baseline
+
+
+def _retry_after(response):
+    """Return the seconds to wait given by the ``Retry-After`` header of
+    ``response``, or None"""
+    value = response.headers.get(b'Retry-After')
+    if not value:
+        return None
+    value = to_native_str(value).strip()
+    if value.isdigit():
+        return float(value)
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0, mktime_tz(date) - time())
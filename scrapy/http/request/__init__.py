@@ -41,6 +41,8 @@ class Request(object_ref):
 
         self._meta = dict(meta) if meta else None
         self.flags = [] if flags is None else list(flags)
+        # fingerprints cached by scrapy.utils.request
+        self._fingerprints = None
 
     @property
     def meta(self):
@@ -91,8 +93,14 @@ class Request(object_ref):
         """Create a new Request with the same attributes except for those
         given new values.
         """
+        # fingerprints only depend on these attributes
+        keep_fingerprints = self._fingerprints and not args and not any(
+            x in kwargs for x in ['url', 'method', 'headers', 'body'])
         for x in ['url', 'method', 'headers', 'body', 'cookies', 'meta', 'flags',
                   'encoding', 'priority', 'dont_filter', 'callback', 'errback']:
             kwargs.setdefault(x, getattr(self, x))
         cls = kwargs.pop('cls', self.__class__)
-        return cls(*args, **kwargs)
+        request = cls(*args, **kwargs)
+        if keep_fingerprints:
+            request._fingerprints = dict(self._fingerprints)
+        return request
@@ -4,6 +4,11 @@ responses in Scrapy.
 
 See documentation in docs/topics/request-response.rst
 """
+import io
+import mmap
+import os
+from io import BytesIO
+
 from six.moves.urllib.parse import urljoin
 
 from scrapy.http.request import Request
@@ -14,12 +19,54 @@ from scrapy.http.common import obsolete_setter
 from scrapy.exceptions import NotSupported
 
 
+class _MmapReader(io.RawIOBase):
+    """Read-only raw stream over a memory-mapped file, with its own position,
+    closing the map when closed"""
+
+    def __init__(self, fileno):
+        self._mmap = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._mmap[self._pos:self._pos + len(b)]
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._mmap)
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._mmap.close()
+        super(_MmapReader, self).close()
+
+
 class Response(object_ref):
 
-    def __init__(self, url, status=200, headers=None, body=b'', flags=None, request=None):
+    def __init__(self, url, status=200, headers=None, body=b'', flags=None,
+                 request=None, bodyfile=None):
         self.headers = Headers(headers or {})
         self.status = int(status)
-        self._set_body(body)
+        self._bodyfile = bodyfile
+        if bodyfile is None:
+            self._set_body(body)
+        else:
+            self._body = None
         self._set_url(url)
         self.request = request
         self.flags = [] if flags is None else list(flags)
@@ -47,6 +94,10 @@ class Response(object_ref):
     url = property(_get_url, obsolete_setter(_set_url, 'url'))
 
     def _get_body(self):
+        if self._body is None:
+            # spooled body, loaded on first access
+            self._bodyfile.seek(0)
+            self._body = self._bodyfile.read()
         return self._body
 
     def _set_body(self, body):
@@ -62,6 +113,25 @@ class Response(object_ref):
 
     body = property(_get_body, obsolete_setter(_set_body, 'body'))
 
+    @property
+    def bodyfile(self):
+        """The file holding the response body when it was spooled to disk
+        (see :setting:`DOWNLOAD_SPOOLSIZE`), or ``None``"""
+        return self._bodyfile
+
+    def open_body(self):
+        """Return a read-only file-like object over the response body.
+
+        Spooled bodies are memory-mapped instead of being read in memory, so
+        close the returned object once done with it.
+        """
+        if self._bodyfile is not None:
+            self._bodyfile.flush()
+            fileno = self._bodyfile.fileno()
+            if os.fstat(fileno).st_size:
+                return io.BufferedReader(_MmapReader(fileno))
+        return BytesIO(self.body)
+
     def __str__(self):
         return "<%d %s>" % (self.status, self.url)
 
@@ -75,8 +145,12 @@ class Response(object_ref):
         """Create a new Response with the same attributes except for those
         given new values.
         """
-        for x in ['url', 'status', 'headers', 'body', 'request', 'flags']:
+        if self._bodyfile is not None and 'body' not in kwargs:
+            kwargs.setdefault('bodyfile', self._bodyfile)
+        for x in ['url', 'status', 'headers', 'request', 'flags']:
             kwargs.setdefault(x, getattr(self, x))
+        if 'bodyfile' not in kwargs:
+            kwargs.setdefault('body', self.body)
         cls = kwargs.pop('cls', self.__class__)
         return cls(*args, **kwargs)
 
@@ -32,7 +32,11 @@ class TextResponse(Response):
 
     def _set_url(self, url):
         if isinstance(url, six.text_type):
-            if six.PY2 and self.encoding is None:
+            if six.PY3:
+                # native str, no need to look up the (body) encoding
+                self._url = url
+                return
+            if self.encoding is None:
                 raise TypeError("Cannot convert unicode url - %s "
                                 "has no encoding" % type(self).__name__)
             self._url = to_native_str(url, self.encoding)
@@ -9,11 +9,10 @@ import re
 
 from six.moves.urllib.parse import urlparse
 from parsel.csstranslator import HTMLTranslator
-from w3lib.url import canonicalize_url
 
 from scrapy.utils.misc import arg_to_iter
 from scrapy.utils.url import (
-    url_is_from_any_domain, url_has_any_extension,
+    url_is_from_any_domain, url_has_any_extension, cached_canonicalize_url,
 )
 
 
@@ -102,7 +101,7 @@ class FilteringLinkExtractor(object):
         links = [x for x in links if self._link_allowed(x)]
         if self.canonicalize:
             for link in links:
-                link.url = canonicalize_url(link.url)
+                link.url = cached_canonicalize_url(link.url)
         links = self.link_extractor._process_links(links)
         return links
 
@@ -6,12 +6,12 @@ from six.moves.urllib.parse import urljoin
 
 import lxml.etree as etree
 from w3lib.html import strip_html5_whitespace
-from w3lib.url import canonicalize_url
 
 from scrapy.link import Link
 from scrapy.utils.misc import arg_to_iter, rel_has_nofollow
 from scrapy.utils.python import unique as unique_list, to_native_str
 from scrapy.utils.response import get_base_url
+from scrapy.utils.url import cached_canonicalize_url
 from scrapy.linkextractors import FilteringLinkExtractor
 
 
@@ -39,8 +39,8 @@ class LxmlParserLinkExtractor(object):
         if canonicalized:
             self.link_key = lambda link: link.url
         else:
-            self.link_key = lambda link: canonicalize_url(link.url,
-                                                          keep_fragments=True)
+            self.link_key = lambda link: cached_canonicalize_url(
+                link.url, keep_fragments=True)
 
     def _iter_links(self, document):
         for el in document.iter(etree.Element):
@@ -6,7 +6,7 @@ from six.moves.urllib.parse import urljoin
 import warnings
 from sgmllib import SGMLParser
 
-from w3lib.url import safe_url_string, canonicalize_url
+from w3lib.url import safe_url_string
 from w3lib.html import strip_html5_whitespace
 
 from scrapy.link import Link
@@ -14,6 +14,7 @@ from scrapy.linkextractors import FilteringLinkExtractor
 from scrapy.utils.misc import arg_to_iter, rel_has_nofollow
 from scrapy.utils.python import unique as unique_list, to_unicode
 from scrapy.utils.response import get_base_url
+from scrapy.utils.url import cached_canonicalize_url
 from scrapy.exceptions import ScrapyDeprecationWarning
 
 
@@ -36,8 +37,8 @@ class BaseSgmlLinkExtractor(SGMLParser):
         if canonicalized:
             self.link_key = lambda link: link.url
         else:
-            self.link_key = lambda link: canonicalize_url(link.url,
-                                                          keep_fragments=True)
+            self.link_key = lambda link: cached_canonicalize_url(
+                link.url, keep_fragments=True)
 
     def _extract_links(self, response_text, response_url, response_encoding, base_url=None):
         """ Do the real extraction work """
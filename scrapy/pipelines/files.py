@@ -7,6 +7,7 @@ import functools
 import hashlib
 import os
 import os.path
+import shutil
 import time
 import logging
 from email.utils import parsedate_tz, mktime_tz
@@ -50,8 +51,9 @@ class FSFilesStore(object):
     def persist_file(self, path, buf, info, meta=None, headers=None):
         absolute_path = self._get_filesystem_path(path)
         self._mkdir(os.path.dirname(absolute_path), info)
+        buf.seek(0)
         with open(absolute_path, 'wb') as f:
-            f.write(buf.getvalue())
+            shutil.copyfileobj(buf, f)
 
     def stat_file(self, path, info):
         absolute_path = self._get_filesystem_path(path)
@@ -169,7 +171,7 @@ class S3FilesStore(object):
             if headers:
                 h.update(headers)
             return threads.deferToThread(
-                k.set_contents_from_string, buf.getvalue(),
+                k.set_contents_from_string, buf.read(),
                 headers=h, policy=self.POLICY)
 
     def _headers_to_botocore_kwargs(self, headers):
@@ -240,14 +242,20 @@ class GCSFilesStore(object):
         blob = self.bucket.blob(self.prefix + path)
         blob.cache_control = self.CACHE_CONTROL
         blob.metadata = {k: str(v) for k, v in six.iteritems(meta or {})}
+        buf.seek(0)
         return threads.deferToThread(
             blob.upload_from_string,
-            data=buf.getvalue(),
+            data=buf.read(),
             content_type=self._get_content_type(headers),
             predefined_acl=self.POLICY
         )
 
 
+def _close_after(result, buf):
+    buf.close()
+    return result
+
+
 class FilesPipeline(MediaPipeline):
     """Abstract pipeline that implement the file downloading
 
@@ -396,7 +404,7 @@ class FilesPipeline(MediaPipeline):
             )
             raise FileException('download-error')
 
-        if not response.body:
+        if response.bodyfile is None and not response.body:
             logger.warning(
                 'File (empty-content): Empty file from %(request)s referred '
                 'in <%(referer)s>: no-content',
@@ -446,10 +454,19 @@ class FilesPipeline(MediaPipeline):
 
     def file_downloaded(self, response, request, info):
         path = self.file_path(request, response=response, info=info)
-        buf = BytesIO(response.body)
-        checksum = md5sum(buf)
-        buf.seek(0)
-        self.store.persist_file(path, buf, info)
+        buf = response.open_body()
+        try:
+            checksum = md5sum(buf)
+            buf.seek(0)
+            dfd = self.store.persist_file(path, buf, info)
+        except Exception:
+            buf.close()
+            raise
+        if isinstance(dfd, defer.Deferred):
+            # stores may upload the file from a thread
+            dfd.addBoth(_close_after, buf)
+        else:
+            buf.close()
         return checksum
 
     def item_completed(self, results, item, info):
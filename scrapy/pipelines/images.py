@@ -116,7 +116,9 @@ class ImagesPipeline(FilesPipeline):
 
     def get_images(self, response, request, info):
         path = self.file_path(request, response=response, info=info)
-        orig_image = Image.open(BytesIO(response.body))
+        with response.open_body() as body:
+            orig_image = Image.open(body)
+            orig_image.load()
 
         width, height = orig_image.size
         if width < self.min_width or height < self.min_height:
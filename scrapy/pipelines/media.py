@@ -9,7 +9,7 @@ from twisted.python.failure import Failure
 from scrapy.settings import Settings
 from scrapy.utils.datatypes import SequenceExclude
 from scrapy.utils.defer import mustbe_deferred, defer_result
-from scrapy.utils.request import request_fingerprint
+from scrapy.utils.request import RequestFingerprinter
 from scrapy.utils.misc import arg_to_iter
 from scrapy.utils.log import failure_to_exc_info
 
@@ -29,6 +29,7 @@ class MediaPipeline(object):
 
     def __init__(self, download_func=None, settings=None):
         self.download_func = download_func
+        self.fingerprinter = RequestFingerprinter()
 
         if isinstance(settings, dict) or settings is None:
             settings = Settings(settings)
@@ -69,6 +70,7 @@ class MediaPipeline(object):
         except AttributeError:
             pipe = cls()
         pipe.crawler = crawler
+        pipe.fingerprinter = crawler.request_fingerprinter
         return pipe
 
     def open_spider(self, spider):
@@ -82,7 +84,7 @@ class MediaPipeline(object):
         return dfd.addCallback(self.item_completed, item, info)
 
     def _process_request(self, request, info):
-        fp = request_fingerprint(request)
+        fp = self.fingerprinter.fingerprint(request)
         cb = request.callback or (lambda _: _)
         eb = request.errback
         request.callback = None
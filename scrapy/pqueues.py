@@ -0,0 +1,189 @@
+"""
+Scheduler priority queues
+"""
+import hashlib
+
+from queuelib import PriorityQueue
+
+from scrapy.http import Request
+from scrapy.utils.python import to_bytes
+
+
+def _sign(x):
+    return (x > 0) - (x < 0)
+
+
+def _path_safe(text):
+    """Return a filesystem-safe version of a download slot key.
+
+    The result keeps the alphanumeric characters of ``text`` for readability
+    and appends a hash of it, so that two different slots never share a
+    directory.
+
+    >>> _path_safe('www.example.com:8080')
+    'www.example.com_8080-afe612d2a436e0800bac01884a4aaf08'
+    """
+    pathable = ''.join(c if c.isalnum() or c in '-._' else '_' for c in text)
+    unique = hashlib.md5(to_bytes(text)).hexdigest()
+    return '-'.join([pathable, unique])
+
+
+class ScrapyPriorityQueue(PriorityQueue):
+    """:class:`queuelib.PriorityQueue` which supports checkpoints of its
+    internal queues (see ``Scheduler.checkpoint``).
+    """
+
+    def checkpoint(self):
+        """Checkpoint the non-empty internal queues and return their
+        priorities, like :meth:`close` does, without closing them."""
+        active = []
+        for p, q in self.queues.items():
+            if len(q):
+                q.checkpoint()
+                active.append(p)
+        return active
+
+
+class BucketPriorityQueue(ScrapyPriorityQueue):
+    """Priority queue which maps priorities into a fixed number of buckets, so
+    that the number of internal queues (and of disk queue files) does not grow
+    with the number of distinct priorities in use.
+
+    Priorities between ``minprio`` and ``maxprio`` are split in ``buckets``
+    ranges of the same size, and priorities outside of them go to the first or
+    last bucket. Requests in the same bucket are popped in the order of the
+    internal queue (FIFO or LIFO), regardless of their exact priority.
+    """
+
+    def __init__(self, qfactory, startprios=(), buckets=16, minprio=-100,
+                 maxprio=100):
+        if buckets < 1 or minprio >= maxprio:
+            raise ValueError('Invalid priority buckets: %d buckets for the '
+                             '%d..%d range' % (buckets, minprio, maxprio))
+        self.buckets = buckets
+        self.minprio = minprio
+        self.maxprio = maxprio
+        super(BucketPriorityQueue, self).__init__(qfactory, startprios)
+
+    @classmethod
+    def from_settings(cls, settings, qfactory, startprios=()):
+        # the range is given in request priorities, which are pushed negated
+        low, high = map(int, settings.getlist('SCHEDULER_PRIORITY_BUCKET_RANGE'))
+        return cls(qfactory, startprios,
+                   buckets=settings.getint('SCHEDULER_PRIORITY_BUCKETS'),
+                   minprio=-high, maxprio=-low)
+
+    def bucket(self, priority):
+        priority = min(max(priority, self.minprio), self.maxprio)
+        span = self.maxprio - self.minprio + 1
+        return (priority - self.minprio) * self.buckets // span
+
+    def push(self, obj, priority=0):
+        super(BucketPriorityQueue, self).push(obj, self.bucket(priority))
+
+
+class LogBucketPriorityQueue(ScrapyPriorityQueue):
+    """Priority queue which maps priorities into logarithmic ranges:
+    0, 1, 2-3, 4-7, 8-15... (and the same ranges for negative priorities).
+
+    Unlike :class:`BucketPriorityQueue` it needs no configuration, and still
+    bounds the number of internal queues to about 64 per sign.
+    """
+
+    @staticmethod
+    def bucket(priority):
+        return _sign(priority) * abs(priority).bit_length()
+
+    def push(self, obj, priority=0):
+        super(LogBucketPriorityQueue, self).push(obj, self.bucket(priority))
+
+
+class DownloaderAwarePriorityQueue(object):
+    """Priority queue which keeps a separate :class:`ScrapyPriorityQueue`
+    for each downloader slot, and pops requests from the slot which has the
+    fewest requests active in the downloader.
+
+    In broad crawls this prevents the engine from filling the downloader with
+    requests for a few busy hosts while other hosts sit idle. Priorities are
+    respected within each slot, and are used to break ties between slots with
+    the same number of active requests.
+
+    The queue factory is called with the priority and the slot key, so that
+    disk queues can be stored in a per-slot directory (see
+    ``Scheduler._newdq``).
+
+    ``startprios`` is the value returned by :meth:`close` on a previous run:
+    a dict mapping slot keys to the priorities left in them.
+    """
+
+    def __init__(self, qfactory, startprios=(), downloader=None):
+        if downloader is None:
+            raise ValueError('%s requires a downloader'
+                             % self.__class__.__name__)
+        if startprios and not isinstance(startprios, dict):
+            raise ValueError("DownloaderAwarePriorityQueue accepts "
+                             "``startprios`` as a dict; %r instance is passed."
+                             " Most likely, it means the state is created by "
+                             "an incompatible priority queue. Only a crawl "
+                             "started with the same priority queue class can "
+                             "be resumed." % startprios.__class__)
+        self.qfactory = qfactory
+        self.downloader = downloader
+        self.pqueues = {}  # slot key -> PriorityQueue
+        for slot, prios in (startprios or {}).items():
+            self.pqueues[slot] = self._newpq(slot, prios)
+
+    @classmethod
+    def from_crawler(cls, crawler, qfactory, startprios=()):
+        return cls(qfactory, startprios, downloader=crawler.engine.downloader)
+
+    def _newpq(self, slot, startprios=()):
+        return ScrapyPriorityQueue(lambda priority: self.qfactory(priority, slot),
+                                   startprios)
+
+    def _slot_key(self, obj):
+        # disk queues receive requests already serialized by request_to_dict
+        if isinstance(obj, dict):
+            obj = Request(obj['url'], meta=obj['meta'])
+        return self.downloader._get_slot_key(obj, None)
+
+    def _active(self, slot):
+        slot = self.downloader.slots.get(slot)
+        return len(slot.active) if slot else 0
+
+    def push(self, obj, priority=0):
+        slot = self._slot_key(obj)
+        if slot not in self.pqueues:
+            self.pqueues[slot] = self._newpq(slot)
+        self.pqueues[slot].push(obj, priority)
+
+    def pop(self):
+        if not self.pqueues:
+            return
+        slot = min(self.pqueues, key=lambda s: (self._active(s),
+                                                self.pqueues[s].curprio))
+        queue = self.pqueues[slot]
+        obj = queue.pop()
+        if len(queue) == 0:
+            del self.pqueues[slot]
+        return obj
+
+    def checkpoint(self):
+        active = {}
+        for slot, queue in self.pqueues.items():
+            prios = queue.checkpoint()
+            if prios:
+                active[slot] = prios
+        return active
+
+    def close(self):
+        active = {}
+        for slot, queue in self.pqueues.items():
+            prios = queue.close()
+            if prios:
+                active[slot] = prios
+        self.pqueues.clear()
+        return active
+
+    def __len__(self):
+        return sum(len(x) for x in self.pqueues.values()) if self.pqueues else 0
@@ -1,10 +1,18 @@
+from collections import Counter
+from time import time
+
+from zope.interface import implementer
 from twisted.internet import defer
+from twisted.internet.abstract import isIPAddress, isIPv6Address
 from twisted.internet.base import ThreadedResolver
+from twisted.internet.error import DNSLookupError
+from twisted.internet.interfaces import IResolverSimple
+from twisted.names import client, dns, hosts, resolve
+from twisted.names.cache import CacheResolver
+from twisted.python.failure import Failure
 
 from scrapy.utils.datatypes import LocalCache
 
-# TODO: cache misses
-
 dnscache = LocalCache(10000)
 
 class CachingThreadedResolver(ThreadedResolver):
@@ -13,6 +21,14 @@ class CachingThreadedResolver(ThreadedResolver):
         dnscache.limit = cache_size
         self.timeout = timeout
 
+    @classmethod
+    def from_settings(cls, settings, reactor):
+        if settings.getbool('DNSCACHE_ENABLED'):
+            cache_size = settings.getint('DNSCACHE_SIZE')
+        else:
+            cache_size = 0
+        return cls(reactor, cache_size, settings.getfloat('DNS_TIMEOUT'))
+
     def getHostByName(self, name, timeout=None):
         if name in dnscache:
             return defer.succeed(dnscache[name])
@@ -29,3 +45,165 @@ class CachingThreadedResolver(ThreadedResolver):
     def _cache_result(self, result, name):
         dnscache[name] = result
         return result
+
+
+@implementer(IResolverSimple)
+class CachingAsyncResolver(object):
+    """DNS resolver which queries name servers asynchronously, without
+    blocking reactor threads.
+
+    Addresses are cached for the TTL of their DNS records, and failed lookups
+    (including unknown names) for ``negative_ttl`` seconds. Concurrent
+    lookups of the same name share a single DNS query.
+    """
+
+    def __init__(self, reactor, cache_size, timeout, servers=None,
+                 negative_ttl=60):
+        self.reactor = reactor
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.stats = Counter()
+        self.max_latency = 0
+        self._cache = LocalCache(cache_size) if cache_size else None
+        self._pending = {}
+        self._resolver = self._create_resolver(reactor, servers)
+        dnscache.limit = cache_size
+
+    @classmethod
+    def from_settings(cls, settings, reactor):
+        if settings.getbool('DNSCACHE_ENABLED'):
+            cache_size = settings.getint('DNSCACHE_SIZE')
+        else:
+            cache_size = 0
+        servers = [_parse_server(s) for s in settings.getlist('DNS_SERVERS')]
+        return cls(reactor, cache_size, settings.getfloat('DNS_TIMEOUT'),
+                   servers=servers,
+                   negative_ttl=settings.getfloat('DNSCACHE_NEGATIVE_TTL'))
+
+    @staticmethod
+    def _create_resolver(reactor, servers):
+        if servers:
+            return resolve.ResolverChain([
+                hosts.Resolver(), client.Resolver(servers=servers, reactor=reactor)])
+        # name servers from the system configuration, without the cache of
+        # createResolver() which would keep records beyond DNSCACHE_SIZE
+        chain = client.createResolver()
+        chain.resolvers = [r for r in chain.resolvers
+                           if not isinstance(r, CacheResolver)]
+        return chain
+
+    def getHostByName(self, name, timeout=None):
+        if isIPAddress(name) or isIPv6Address(name):
+            return defer.succeed(name)
+        entry = self._cached(name)
+        if entry is not None:
+            address, failure = entry
+            if failure is not None:
+                self.stats['negative_hit'] += 1
+                return defer.fail(failure)
+            self.stats['hit'] += 1
+            return defer.succeed(address)
+        d = defer.Deferred()
+        if name in self._pending:
+            self.stats['collapsed'] += 1
+            self._pending[name].append(d)
+        else:
+            self._lookup(name, [d])
+        return d
+
+    def prefetch(self, name):
+        """Start resolving ``name`` if it is not cached or being resolved"""
+        if name in self._pending or self._cached(name) is not None:
+            return
+        self.stats['prefetch'] += 1
+        self._lookup(name, [])
+
+    def _cached(self, name):
+        if self._cache is None:
+            return None
+        entry = self._cache.get(name)
+        if entry is None:
+            return None
+        expires, address, failure = entry
+        if expires <= time():
+            del self._cache[name]
+            return None
+        return address, failure
+
+    def _lookup(self, name, waiting):
+        self.stats['lookup'] += 1
+        self._pending[name] = waiting
+        started = time()
+        d = self._resolver.lookupAddress(name, timeout=_timeouts(self.timeout))
+        d.addCallbacks(self._got_answer, self._lookup_failed,
+                       callbackArgs=(name, started), errbackArgs=(name, started))
+
+    def _got_answer(self, result, name, started):
+        answers = result[0]
+        address, ttl = _address_from_answers(name, answers)
+        if address is None:
+            failure = Failure(DNSLookupError("address %r not found" % name))
+            return self._lookup_failed(failure, name, started)
+        self._done(name, started, address, None, ttl)
+
+    def _lookup_failed(self, failure, name, started):
+        self.stats['error'] += 1
+        if not failure.check(DNSLookupError):
+            # e.g. DNSNameError for unknown names, or DNS query timeouts
+            failure = Failure(DNSLookupError(
+                "address %r not found: %s" % (name, failure.value)))
+        self._done(name, started, None, failure, self.negative_ttl)
+
+    def _done(self, name, started, address, failure, ttl):
+        latency = time() - started
+        self.stats['latency'] += latency
+        self.max_latency = max(self.max_latency, latency)
+        if self._cache is not None and ttl > 0:
+            self._cache[name] = (time() + ttl, address, failure)
+            if address is not None:
+                dnscache[name] = address
+        for d in self._pending.pop(name):
+            if failure is not None:
+                d.errback(failure)
+            else:
+                d.callback(address)
+
+
+def _address_from_answers(name, answers):
+    """Return the first IPv4 address of ``name`` in DNS ``answers``,
+    following CNAME records, with the lowest TTL of the records used"""
+    name = dns.Name(name)
+    ttl = None
+    for _ in range(len(answers) + 1):
+        for record in answers:
+            if record.name != name:
+                continue
+            ttl = record.ttl if ttl is None else min(ttl, record.ttl)
+            if record.type == dns.A:
+                return record.payload.dottedQuad(), ttl
+            if record.type == dns.CNAME:
+                name = record.payload.name
+                break
+        else:
+            break
+    return None, None
+
+
+def _timeouts(total):
+    """Split a total timeout into retry timeouts, like the default
+    (1, 3, 11, 45) of twisted.names"""
+    timeouts = []
+    for timeout in (1, 3, 11, 45):
+        if sum(timeouts) + timeout >= total:
+            break
+        timeouts.append(timeout)
+    timeouts.append(total - sum(timeouts))
+    return tuple(timeouts)
+
+
+def _parse_server(server):
+    """Return the ``(host, port)`` of a ``host[:port]`` name server"""
+    host, _, port = server.rpartition(':')
+    if not port.isdigit() or (':' in host and not host.endswith(']')):
+        return server, 53
+    return host.strip('[]'), int(port)
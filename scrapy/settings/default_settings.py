@@ -21,6 +21,14 @@ import six
 
 AJAXCRAWL_ENABLED = False
 
+ADAPTIVE_CONCURRENCY_ENABLED = False
+ADAPTIVE_CONCURRENCY_BACKOFF = 0.5
+ADAPTIVE_CONCURRENCY_DEBUG = False
+ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE = 2.0
+ADAPTIVE_CONCURRENCY_MAX = 64
+ADAPTIVE_CONCURRENCY_MAX_DELAY = 60.0
+ADAPTIVE_CONCURRENCY_MIN = 1
+
 AUTOTHROTTLE_ENABLED = False
 AUTOTHROTTLE_DEBUG = False
 AUTOTHROTTLE_MAX_DELAY = 60.0
@@ -60,8 +68,16 @@ DEPTH_PRIORITY = 0
 
 DNSCACHE_ENABLED = True
 DNSCACHE_SIZE = 10000
+DNSCACHE_NEGATIVE_TTL = 60
+DNS_PREFETCH = False
+DNS_RESOLVER = 'scrapy.resolver.CachingThreadedResolver'
+DNS_SERVERS = []
 DNS_TIMEOUT = 60
 
+DOWNLOAD_BANDWIDTH_LIMIT = 0
+DOWNLOAD_BANDWIDTH_BURST = 1.0
+DOWNLOAD_SLOT_BANDWIDTH_LIMIT = 0
+
 DOWNLOAD_DELAY = 0
 
 DOWNLOAD_HANDLERS = {}
@@ -75,18 +91,34 @@ DOWNLOAD_HANDLERS_BASE = {
 }
 
 DOWNLOAD_TIMEOUT = 180      # 3mins
+DOWNLOAD_TIMER_RESOLUTION = 0.01
+
+DOWNLOAD_TIMINGS_ENABLED = False
+DOWNLOAD_TIMINGS_INTERVAL = 60.0
+DOWNLOAD_TIMINGS_MAX_SLOTS = 100
+DOWNLOAD_TIMINGS_PERCENTILES = [50, 95, 99]
+DOWNLOAD_TIMINGS_PER_SLOT = True
 
 DOWNLOAD_MAXSIZE = 1024*1024*1024   # 1024m
 DOWNLOAD_WARNSIZE = 32*1024*1024    # 32m
+DOWNLOAD_SPOOLSIZE = 0
 
 DOWNLOAD_FAIL_ON_DATALOSS = True
 
+DOWNLOAD_RESERVED_PRIORITY = 1000
+DOWNLOAD_RESERVED_CONCURRENCY = 1
+
+DOWNLOAD_POOL_IDLE_TIMEOUT = 240
+DOWNLOAD_POOL_MAXSIZE = 0
+DOWNLOAD_POOL_EVICTION = 'lru'
+
 DOWNLOADER = 'scrapy.core.downloader.Downloader'
 
 DOWNLOADER_HTTPCLIENTFACTORY = 'scrapy.core.downloader.webclient.ScrapyHTTPClientFactory'
 DOWNLOADER_CLIENTCONTEXTFACTORY = 'scrapy.core.downloader.contextfactory.ScrapyClientContextFactory'
 DOWNLOADER_CLIENT_TLS_METHOD = 'TLS' # Use highest TLS/SSL protocol version supported by the platform,
                                      # also allowing negotiation
+DOWNLOADER_CLIENT_TLS_SESSION_CACHE_SIZE = 1000
 
 DOWNLOADER_MIDDLEWARES = {}
 
@@ -111,7 +143,13 @@ DOWNLOADER_MIDDLEWARES_BASE = {
 
 DOWNLOADER_STATS = True
 
+DUPEFILTER_BLOOM_CAPACITY = 1000000
+DUPEFILTER_BLOOM_ERROR_RATE = 0.001
+DUPEFILTER_BLOOM_GROWTH = 2
 DUPEFILTER_CLASS = 'scrapy.dupefilters.RFPDupeFilter'
+DUPEFILTER_DIGEST_SIZE = 16
+DUPEFILTER_MEMORY_FINGERPRINTS = 1000000
+DUPEFILTER_RUNS_FANOUT = 4
 
 EDITOR = 'vi'
 if sys.platform == 'win32':
@@ -121,6 +159,9 @@ EXTENSIONS = {}
 
 EXTENSIONS_BASE = {
     'scrapy.extensions.corestats.CoreStats': 0,
+    'scrapy.extensions.dns.DNSPrefetch': 0,
+    'scrapy.extensions.dns.DNSStats': 0,
+    'scrapy.extensions.downloadtimings.DownloadTimings': 0,
     'scrapy.extensions.telnet.TelnetConsole': 0,
     'scrapy.extensions.memusage.MemoryUsage': 0,
     'scrapy.extensions.memdebug.MemoryDebugger': 0,
@@ -129,6 +170,7 @@ EXTENSIONS_BASE = {
     'scrapy.extensions.logstats.LogStats': 0,
     'scrapy.extensions.spiderstate.SpiderState': 0,
     'scrapy.extensions.throttle.AutoThrottle': 0,
+    'scrapy.extensions.throttle.AdaptiveConcurrency': 0,
 }
 
 FEED_TEMPDIR = None
@@ -234,6 +276,8 @@ REDIRECT_PRIORITY_ADJUST = +2
 REFERER_ENABLED = True
 REFERRER_POLICY = 'scrapy.spidermiddlewares.referer.DefaultReferrerPolicy'
 
+REQUEST_FINGERPRINTER_CLASS = 'scrapy.utils.request.RequestFingerprinter'
+
 RETRY_ENABLED = True
 RETRY_TIMES = 2  # initial response + 2 retries = 3 requests
 RETRY_HTTP_CODES = [500, 502, 503, 504, 522, 524, 408]
@@ -242,9 +286,15 @@ RETRY_PRIORITY_ADJUST = -1
 ROBOTSTXT_OBEY = False
 
 SCHEDULER = 'scrapy.core.scheduler.Scheduler'
+SCHEDULER_CHECKPOINT_INTERVAL = 60.0
 SCHEDULER_DISK_QUEUE = 'scrapy.squeues.PickleLifoDiskQueue'
 SCHEDULER_MEMORY_QUEUE = 'scrapy.squeues.LifoMemoryQueue'
-SCHEDULER_PRIORITY_QUEUE = 'queuelib.PriorityQueue'
+SCHEDULER_MEMORY_QUEUE_MAXBYTES = 0
+SCHEDULER_MEMORY_QUEUE_MAXREQUESTS = 0
+SCHEDULER_PRIORITY_BUCKETS = 16
+SCHEDULER_PRIORITY_BUCKET_RANGE = (-100, 100)
+SCHEDULER_PRIORITY_QUEUE = 'scrapy.pqueues.ScrapyPriorityQueue'
+SCHEDULER_REFILL_BATCH = 100
 
 SPIDER_LOADER_CLASS = 'scrapy.spiderloader.SpiderLoader'
 SPIDER_LOADER_WARN_ONLY = False
@@ -16,6 +16,7 @@ request_dropped = object()
 request_reached_downloader = object()
 response_received = object()
 response_downloaded = object()
+download_error = object()
 item_scraped = object()
 item_dropped = object()
 item_error = object()
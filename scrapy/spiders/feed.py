@@ -5,7 +5,8 @@ for scraping from an XML feed.
 See documentation in docs/topics/spiders.rst
 """
 from scrapy.spiders import Spider
-from scrapy.utils.iterators import xmliter, csviter
+from scrapy.http import TextResponse
+from scrapy.utils.iterators import xmliter, csviter, XmlNodeFeeder, CsvRowFeeder
 from scrapy.utils.spider import iterate_spider_output
 from scrapy.selector import Selector
 from scrapy.exceptions import NotConfigured, NotSupported
@@ -24,6 +25,7 @@ class XMLFeedSpider(Spider):
     iterator = 'iternodes'
     itertag = 'item'
     namespaces = ()
+    stream = False
 
     def process_results(self, response, results):
         """This overridable method is called for each result (item or request)
@@ -61,9 +63,35 @@ class XMLFeedSpider(Spider):
             for result_item in self.process_results(response, ret):
                 yield result_item
 
+    def start_requests(self):
+        for request in super(XMLFeedSpider, self).start_requests():
+            if self.stream:
+                request.meta.setdefault('body_consumer', self.body_consumer())
+            yield request
+
+    def body_consumer(self):
+        """Return a new ``body_consumer`` request meta value which parses
+        the feed nodes as the body is downloaded"""
+        if ':' in self.itertag:
+            prefix, nodename = self.itertag.split(':', 1)
+            feeder = XmlNodeFeeder(nodename, dict(self.namespaces)[prefix],
+                                   prefix)
+        else:
+            feeder = XmlNodeFeeder(self.itertag)
+
+        def consume(response, chunk):
+            nodes = feeder.feed(chunk)
+            for node in nodes:
+                self._register_namespaces(node)
+            return self.parse_nodes(response, nodes)
+        return consume
+
     def parse(self, response):
         if not hasattr(self, 'parse_node'):
             raise NotConfigured('You must define parse_node method in order to scrape this XML feed')
+        if 'streamed' in response.flags:
+            # nodes were parsed by the body consumer during the download
+            return []
 
         response = self.adapt_response(response)
         if self.iterator == 'iternodes':
@@ -103,6 +131,7 @@ class CSVFeedSpider(Spider):
     delimiter = None # When this is None, python's csv module's default delimiter is used
     quotechar = None # When this is None, python's csv module's default quotechar is used
     headers = None
+    stream = False
 
     def process_results(self, response, results):
         """This method has the same purpose as the one in XMLFeedSpider"""
@@ -123,7 +152,31 @@ class CSVFeedSpider(Spider):
         process_results methods for pre and post-processing purposes.
         """
 
-        for row in csviter(response, self.delimiter, self.headers, self.quotechar):
+        rows = csviter(response, self.delimiter, self.headers, self.quotechar)
+        return self._parse_feed_rows(response, rows)
+
+    def start_requests(self):
+        for request in super(CSVFeedSpider, self).start_requests():
+            if self.stream:
+                request.meta.setdefault('body_consumer', self.body_consumer())
+            yield request
+
+    def body_consumer(self):
+        """Return a new ``body_consumer`` request meta value which parses
+        the feed rows as the body is downloaded"""
+        feeder = []
+
+        def consume(response, chunk):
+            if not feeder:
+                encoding = response.encoding \
+                    if isinstance(response, TextResponse) else None
+                feeder.append(CsvRowFeeder(self.delimiter, self.headers,
+                                           encoding, self.quotechar))
+            return self._parse_feed_rows(response, feeder[0].feed(chunk))
+        return consume
+
+    def _parse_feed_rows(self, response, rows):
+        for row in rows:
             ret = iterate_spider_output(self.parse_row(response, row))
             for result_item in self.process_results(response, ret):
                 yield result_item
@@ -131,6 +184,9 @@ class CSVFeedSpider(Spider):
     def parse(self, response):
         if not hasattr(self, 'parse_row'):
             raise NotConfigured('You must define parse_row method in order to scrape this CSV feed')
+        if 'streamed' in response.flags:
+            # rows were parsed by the body consumer during the download
+            return []
         response = self.adapt_response(response)
         return self.parse_rows(response)
 
@@ -2,11 +2,201 @@
 Scheduler queues
 """
 
+import os
+import glob
+import json
 import marshal
+import shutil
+import struct
+import zlib
 from six.moves import cPickle as pickle
 
 from queuelib import queue
 
+from scrapy.http import Request
+from scrapy.utils.job import atomic_json_dump
+from scrapy.utils.reqser import request_from_dict
+
+
+class FifoDiskQueue(queue.FifoDiskQueue):
+    """:class:`queuelib.queue.FifoDiskQueue` which supports checkpoints.
+
+    :meth:`checkpoint` persists the state of the queue without closing it. If
+    the queue is not closed cleanly afterwards, it is reopened in the state of
+    the last checkpoint: records pushed later are dropped, and records popped
+    later are popped again.
+
+    The chunks of a checkpoint are hard linked into the ``checkpoint``
+    directory of the queue, so that they survive being fully read until the
+    next checkpoint.
+    """
+
+    def __init__(self, path, chunksize=100000):
+        self.checkpointdir = os.path.join(path, 'checkpoint')
+        if os.path.isdir(self.checkpointdir):
+            self._restore_chunks(path)
+        super(FifoDiskQueue, self).__init__(path, chunksize)
+        headsize = self.info.pop('headsize', None)
+        if headsize is not None:
+            self._restore_checkpoint(headsize)
+
+    def _restore_chunks(self, path):
+        for name in os.listdir(self.checkpointdir):
+            chunk = os.path.join(path, name)
+            if not os.path.exists(chunk):
+                _link(os.path.join(self.checkpointdir, name), chunk)
+
+    def _restore_checkpoint(self, headsize):
+        tnum, hnum = self.info['tail'][0], self.info['head'][0]
+        os.ftruncate(self.headf.fileno(), headsize)
+        for chunk in glob.glob(os.path.join(self.path, 'q*')):
+            if not tnum <= int(os.path.basename(chunk)[1:]) <= hnum:
+                os.remove(chunk)
+
+    def checkpoint(self):
+        headfd = self.headf.fileno()
+        os.fsync(headfd)
+        info = dict(self.info, headsize=os.fstat(headfd).st_size)
+        tnum, hnum = info['tail'][0], info['head'][0]
+        if not os.path.isdir(self.checkpointdir):
+            os.mkdir(self.checkpointdir)
+        for number in range(tnum, hnum + 1):
+            name = 'q%05d' % number
+            link = os.path.join(self.checkpointdir, name)
+            if not os.path.exists(link):
+                _link(os.path.join(self.path, name), link)
+        atomic_json_dump(info, self._infopath())
+        # the links of the chunks read before this checkpoint are not needed
+        for name in os.listdir(self.checkpointdir):
+            if int(name[1:]) < tnum:
+                os.remove(os.path.join(self.checkpointdir, name))
+
+    def close(self):
+        if os.path.isdir(self.checkpointdir):
+            shutil.rmtree(self.checkpointdir)
+        super(FifoDiskQueue, self).close()
+
+
+def _link(src, dst):
+    # fall back to copies where hard links are not supported
+    if hasattr(os, 'link'):
+        os.link(src, dst)
+    else:
+        shutil.copyfile(src, dst)
+
+
+class LifoDiskQueue(queue.LifoDiskQueue):
+    """:class:`queuelib.queue.LifoDiskQueue` which supports checkpoints.
+
+    :meth:`checkpoint` persists the state of the queue without closing it. If
+    the queue is not closed cleanly afterwards, it is reopened in the state of
+    the last checkpoint: records pushed later are dropped, and records popped
+    later are popped again.
+
+    To that end, records of the last checkpoint are not overwritten until the
+    next one: records popped from the file are not truncated, and records
+    pushed after popping records of the checkpoint are written after them. The
+    next checkpoint marks the resulting gap with a padding record.
+
+    Pops read the file backwards in blocks of at least ``READ_SIZE`` bytes, so
+    that successive pops of small records are served by a single read.
+    """
+
+    # flag of the size of padding records, which are skipped by pop()
+    PADDING = 0x80000000
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        super(LifoDiskQueue, self).__init__(path)
+        # the records of the queue are those up to self.low, followed by those
+        # from self.protected up to self.end
+        self.end = self.f.tell()
+        self.protected = self.low = self.SIZE_SIZE
+        # bytes of the file read ahead, from offset self.bufstart
+        self.buf = b''
+        self.bufstart = 0
+        if os.path.exists(self._checkpointpath()):
+            with open(self._checkpointpath()) as f:
+                self._restore_checkpoint(json.load(f))
+
+    def _checkpointpath(self):
+        return self.path + '.checkpoint'
+
+    def _restore_checkpoint(self, state):
+        self.f.truncate(state['end'])
+        if state.get('gap'):
+            self._write_padding(*state['gap'])
+        self.size = state['size']
+        self.end = self.protected = self.low = state['end']
+
+    def _read(self, start, stop):
+        """Return the bytes of the file from ``start`` to ``stop``, reading
+        the bytes before them ahead"""
+        if not self.bufstart <= start <= stop <= self.bufstart + len(self.buf):
+            self.bufstart = max(0, min(start, stop - self.READ_SIZE))
+            self.f.seek(self.bufstart)
+            self.buf = self.f.read(stop - self.bufstart)
+        return self.buf[start - self.bufstart:stop - self.bufstart]
+
+    def _write_padding(self, start, stop):
+        self.buf = b''
+        self.f.seek(stop - self.SIZE_SIZE)
+        self.f.write(struct.pack(self.SIZE_FORMAT,
+                                 self.PADDING | (stop - start - self.SIZE_SIZE)))
+
+    def push(self, string):
+        if not isinstance(string, bytes):
+            raise TypeError('Unsupported type: {}'.format(type(string).__name__))
+        # drop the bytes read ahead which are about to be overwritten
+        self.buf = self.buf[:max(0, self.end - self.bufstart)]
+        self.f.seek(self.end)
+        self.f.write(string + struct.pack(self.SIZE_FORMAT, len(string)))
+        self.end += len(string) + self.SIZE_SIZE
+        self.size += 1
+
+    def pop(self):
+        while self.size:
+            if self.end > self.protected:
+                top = self.end
+            else:
+                top = self.low
+            size, = struct.unpack(self.SIZE_FORMAT,
+                                  self._read(top - self.SIZE_SIZE, top))
+            start = top - self.SIZE_SIZE - (size & ~self.PADDING)
+            if self.end > self.protected:
+                self.end = start
+            else:
+                self.low = start
+            if not size & self.PADDING:
+                self.size -= 1
+                return self._read(start, start + size)
+
+    def checkpoint(self):
+        gap = None
+        if self.low < self.protected:
+            if self.end > self.protected:
+                gap = [self.low, self.protected]
+            else:
+                self.end = self.low
+        self.f.seek(0)
+        self.f.write(struct.pack(self.SIZE_FORMAT, self.size))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        atomic_json_dump({'size': self.size, 'end': self.end, 'gap': gap},
+                         self._checkpointpath())
+        # the previous checkpoint is replaced, its records can be overwritten
+        if gap:
+            self._write_padding(*gap)
+        self.f.truncate(self.end)
+        self.f.flush()
+        self.protected = self.low = self.end
+
+    def close(self):
+        self.checkpoint()
+        super(LifoDiskQueue, self).close()
+        os.remove(self._checkpointpath())
+
+
 def _serializable_queue(queue_class, serialize, deserialize):
 
     class SerializableQueue(queue_class):
@@ -31,13 +221,326 @@ def _pickle_serialize(obj):
     except (pickle.PicklingError, AttributeError, TypeError) as e:
         raise ValueError(str(e))
 
-PickleFifoDiskQueue = _serializable_queue(queue.FifoDiskQueue, \
+
+# Compact request records
+#
+# A record is a 2-byte header (format version, flags) followed by a payload.
+# Serialized requests (as returned by request_to_dict) are stored as a
+# marshalled tuple: a bitmask telling which fields are present, the url, and
+# the values of the fields which differ from their defaults, in the order of
+# _RECORD_FIELDS. Callback, errback, method, encoding and class names, as well
+# as header names, are replaced by ids from a per-queue symbol table which is
+# persisted next to the queue. Any other object is pickled.
+
+_RECORD_VERSION = 2
+_RECORD_HEADER = struct.Struct('>BB')
+_FLAG_ZLIB = 1
+_FLAG_PICKLE = 2
+
+_PLAIN, _SYMBOL, _HEADERS, _PICKLEABLE = range(4)
+_RECORD_FIELDS = (
+    # (key, kind, default)
+    ('callback', _SYMBOL, None),
+    ('errback', _SYMBOL, None),
+    ('method', _SYMBOL, 'GET'),
+    ('headers', _HEADERS, {}),
+    ('body', _PLAIN, b''),
+    ('cookies', _PICKLEABLE, {}),
+    ('meta', _PICKLEABLE, {}),
+    ('_encoding', _SYMBOL, 'utf-8'),
+    ('priority', _PLAIN, 0),
+    ('flags', _PLAIN, []),
+    ('_class', _SYMBOL, None),
+    ('fingerprints', _PICKLEABLE, None),
+)
+_RECORD_LAYOUT = tuple((1 << bit, key, kind, default) for bit, (key, kind, default)
+                       in enumerate(_RECORD_FIELDS))
+_RECORD_DEFAULTS = dict((key, default) for key, _, default in _RECORD_FIELDS
+                        if key != '_class')
+_RECORD_KEYS = frozenset([key for key, _, _ in _RECORD_FIELDS] +
+                         ['url', 'dont_filter'])
+_MASK_DONT_FILTER = 1 << len(_RECORD_FIELDS)
+_MASK_PICKLED_META = 1 << (len(_RECORD_FIELDS) + 1)
+
+# (layout, dont_filter mask, pickled meta mask) of each readable version;
+# version 1 records, written before fingerprints were cached in requests,
+# lack the fingerprints field
+_RECORD_VERSIONS = {
+    1: (_RECORD_LAYOUT[:-1], _MASK_DONT_FILTER >> 1, _MASK_PICKLED_META >> 1),
+    2: (_RECORD_LAYOUT, _MASK_DONT_FILTER, _MASK_PICKLED_META),
+}
+
+_COMPRESS_MIN_SIZE = 512
+
+
+class _SymbolTable(object):
+    """Append-only table of interned strings, stored in ``path``"""
+
+    _entry = struct.Struct('>BH')
+
+    def __init__(self, path):
+        self.path = path
+        self.symbols = []
+        self.ids = {}
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            pos = 0
+            while pos < len(data):
+                isbytes, size = self._entry.unpack_from(data, pos)
+                pos += self._entry.size
+                value = data[pos:pos + size]
+                pos += size
+                self._add(value if isbytes else value.decode('utf-8'))
+        self.file = open(path, 'ab')
+
+    def _add(self, value):
+        self.ids[value] = len(self.symbols)
+        self.symbols.append(value)
+
+    def intern(self, value):
+        try:
+            return self.ids[value]
+        except KeyError:
+            isbytes = isinstance(value, bytes)
+            data = value if isbytes else value.encode('utf-8')
+            self.file.write(self._entry.pack(isbytes, len(data)) + data)
+            self.file.flush()
+            self._add(value)
+            return self.ids[value]
+
+    def close(self):
+        self.file.close()
+
+
+class _RequestRecordCodec(object):
+
+    def __init__(self, symbols, compress=False):
+        self.symbols = symbols
+        self.compress = compress
+
+    def encode(self, obj):
+        flags = 0
+        if isinstance(obj, dict) and 'url' in obj and _RECORD_KEYS.issuperset(obj):
+            try:
+                payload = self._encode_request(obj)
+            except ValueError:
+                payload = None
+        else:
+            payload = None
+        if payload is None:
+            payload = _pickle_serialize(obj)
+            flags |= _FLAG_PICKLE
+        if self.compress and len(payload) >= _COMPRESS_MIN_SIZE:
+            compressed = zlib.compress(payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+                flags |= _FLAG_ZLIB
+        return _RECORD_HEADER.pack(_RECORD_VERSION, flags) + payload
+
+    def _encode_request(self, d):
+        intern = self.symbols.intern
+        mask = _MASK_DONT_FILTER if d.get('dont_filter') else 0
+        values = [mask, d['url']]
+        pickleable = []
+        for bit, key, kind, default in _RECORD_LAYOUT:
+            value = d.get(key)
+            if not value or value == default:
+                continue
+            mask |= bit
+            if kind == _SYMBOL:
+                value = intern(value)
+            elif kind == _HEADERS:
+                value = tuple(x for k, v in value.items()
+                              for x in (intern(k), v))
+            elif kind == _PICKLEABLE:
+                pickleable.append(len(values))
+            values.append(value)
+        values[0] = mask
+        try:
+            return marshal.dumps(tuple(values))
+        except ValueError:
+            # meta and cookies may hold objects that only pickle can handle
+            values[0] = mask | _MASK_PICKLED_META
+            for idx in pickleable:
+                values[idx] = _pickle_serialize(values[idx])
+            return marshal.dumps(tuple(values))
+
+    def decode(self, data):
+        version, flags = _RECORD_HEADER.unpack_from(data)
+        if version not in _RECORD_VERSIONS:
+            raise ValueError('Unsupported record format version: %d' % version)
+        payload = data[_RECORD_HEADER.size:]
+        if flags & _FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        if flags & _FLAG_PICKLE:
+            return pickle.loads(payload)
+        return self._decode_request(marshal.loads(payload), version)
+
+    def _decode_request(self, values, version=_RECORD_VERSION):
+        layout, dont_filter_mask, pickled_meta_mask = _RECORD_VERSIONS[version]
+        symbols = self.symbols.symbols
+        mask = values[0]
+        d = dict(_RECORD_DEFAULTS, url=values[1], headers={}, cookies={},
+                 meta={}, flags=[], dont_filter=bool(mask & dont_filter_mask))
+        values = iter(values[2:])
+        for bit, key, kind, _ in layout:
+            if not mask & bit:
+                continue
+            value = next(values)
+            if kind == _SYMBOL:
+                value = symbols[value]
+            elif kind == _HEADERS:
+                value = dict((symbols[value[i]], value[i + 1])
+                             for i in range(0, len(value), 2))
+            elif kind == _PICKLEABLE and mask & pickled_meta_mask:
+                value = pickle.loads(value)
+            d[key] = value
+        return d
+
+
+def _compact_queue(queue_class, compress=False):
+
+    class CompactQueue(queue_class):
+
+        def __init__(self, path, *args, **kwargs):
+            super(CompactQueue, self).__init__(path, *args, **kwargs)
+            if os.path.isdir(path):
+                spath = os.path.join(path, 'symbols')
+            else:
+                spath = path + '.symbols'
+            self.codec = _RequestRecordCodec(_SymbolTable(spath), compress)
+
+        def push(self, obj):
+            s = self.codec.encode(obj)
+            super(CompactQueue, self).push(s)
+
+        def pop(self):
+            s = super(CompactQueue, self).pop()
+            if s:
+                return self.codec.decode(s)
+
+        def checkpoint(self):
+            os.fsync(self.codec.symbols.file.fileno())
+            super(CompactQueue, self).checkpoint()
+
+        def close(self):
+            empty = not len(self)
+            super(CompactQueue, self).close()
+            symbols = self.codec.symbols
+            symbols.close()
+            if empty:
+                os.remove(symbols.path)
+                dirname = os.path.dirname(symbols.path)
+                if os.path.isdir(self.path) and not os.listdir(dirname):
+                    os.rmdir(dirname)
+
+    return CompactQueue
+
+
+# Compact in-memory requests
+#
+# Memory queues built with _compact_memory_queue hold requests as tuples with
+# the same layout as the compact records above (a bitmask, the url and the
+# non-default fields), except that callbacks are kept as they are, and
+# rebuild them with request_from_dict when they are popped. This avoids
+# keeping a Headers object, empty cookies/meta dicts, a flags list and a
+# live_refs entry around for each scheduled request.
+
+_REQUEST_ATTRS = frozenset(['_url', 'callback', 'errback', 'method', 'headers',
+                            '_body', 'cookies', '_meta', '_encoding',
+                            'priority', 'dont_filter', 'flags',
+                            '_fingerprints'])
+
+
+def _reduce_request(request):
+    if not (isinstance(request, Request) and
+            _REQUEST_ATTRS.issuperset(vars(request))):
+        # keep objects which request_from_dict would not fully restore, like
+        # requests with custom attributes, as they are
+        return request
+    d = {
+        'callback': request.callback,
+        'errback': request.errback,
+        'method': request.method,
+        'headers': request.headers,
+        'body': request.body,
+        'cookies': request.cookies,
+        'meta': request._meta,  # request.meta would create an empty dict
+        '_encoding': request._encoding,
+        'priority': request.priority,
+        'flags': request.flags,
+        'fingerprints': request._fingerprints,
+    }
+    if type(request) is not Request:
+        d['_class'] = request.__module__ + '.' + request.__class__.__name__
+    mask = _MASK_DONT_FILTER if request.dont_filter else 0
+    values = [mask, request.url]
+    for bit, key, kind, default in _RECORD_LAYOUT:
+        value = d.get(key)
+        if not value or value == default:
+            continue
+        mask |= bit
+        if kind == _HEADERS:
+            value = tuple(x for k, v in value.items() for x in (k, tuple(v)))
+        elif key == 'flags':
+            value = tuple(value)
+        values.append(value)
+    values[0] = mask
+    return tuple(values)
+
+
+def _rebuild_request(record):
+    mask = record[0]
+    d = dict(_RECORD_DEFAULTS, url=record[1], headers=None, cookies=None,
+             meta=None, flags=None, dont_filter=bool(mask & _MASK_DONT_FILTER))
+    values = iter(record[2:])
+    for bit, key, kind, _ in _RECORD_LAYOUT:
+        if not mask & bit:
+            continue
+        value = next(values)
+        if kind == _HEADERS:
+            value = dict((value[i], value[i + 1]) for i in range(0, len(value), 2))
+        elif key == 'flags':
+            value = list(value)
+        d[key] = value
+    return request_from_dict(d)
+
+
+def _compact_memory_queue(queue_class):
+
+    class CompactMemoryQueue(queue_class):
+
+        def __init__(self):
+            super(CompactMemoryQueue, self).__init__()
+            # queuelib binds push to the deque append method
+            del self.push
+
+        def push(self, request):
+            self.q.append(_reduce_request(request))
+
+        def pop(self):
+            record = super(CompactMemoryQueue, self).pop()
+            if isinstance(record, tuple):
+                return _rebuild_request(record)
+            return record
+
+    return CompactMemoryQueue
+
+
+PickleFifoDiskQueue = _serializable_queue(FifoDiskQueue, \
     _pickle_serialize, pickle.loads)
-PickleLifoDiskQueue = _serializable_queue(queue.LifoDiskQueue, \
+PickleLifoDiskQueue = _serializable_queue(LifoDiskQueue, \
     _pickle_serialize, pickle.loads)
-MarshalFifoDiskQueue = _serializable_queue(queue.FifoDiskQueue, \
+MarshalFifoDiskQueue = _serializable_queue(FifoDiskQueue, \
     marshal.dumps, marshal.loads)
-MarshalLifoDiskQueue = _serializable_queue(queue.LifoDiskQueue, \
+MarshalLifoDiskQueue = _serializable_queue(LifoDiskQueue, \
     marshal.dumps, marshal.loads)
+CompactFifoDiskQueue = _compact_queue(FifoDiskQueue)
+CompactLifoDiskQueue = _compact_queue(LifoDiskQueue)
+CompactZlibFifoDiskQueue = _compact_queue(FifoDiskQueue, compress=True)
+CompactZlibLifoDiskQueue = _compact_queue(LifoDiskQueue, compress=True)
 FifoMemoryQueue = queue.FifoMemoryQueue
 LifoMemoryQueue = queue.LifoMemoryQueue
+CompactFifoMemoryQueue = _compact_memory_queue(FifoMemoryQueue)
+CompactLifoMemoryQueue = _compact_memory_queue(LifoMemoryQueue)
@@ -0,0 +1,247 @@
+"""Incremental decoders of HTTP content codings (``Content-Encoding``)"""
+
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ACCEPTED_ENCODINGS = [b'gzip', b'deflate']
+if brotli is not None:
+    ACCEPTED_ENCODINGS.append(b'br')
+if zstandard is not None:
+    ACCEPTED_ENCODINGS.append(b'zstd')
+
+# default upper bound of the size of decoded chunks, so that limits on the
+# decoded size can stop decompression bombs before they fill the memory
+DECODED_CHUNK_SIZE = 64 * 1024
+
+
+class DecodedSizeError(ValueError):
+    """Raised by decoders which can't yield bounded chunks when the decoded
+    data goes above their ``max_size``"""
+
+
+class GzipDecoder(object):
+    """Decode gzip data, including multiple concatenated gzip members.
+
+    Like :func:`scrapy.utils.gz.gunzip`, this is resilient to CRC checksum
+    errors: once some data is decoded, decoding errors end the data instead
+    of being raised.
+    """
+
+    encoding = b'gzip'
+    wbits = 16 + zlib.MAX_WBITS
+
+    def __init__(self, chunk_size=DECODED_CHUNK_SIZE, max_size=0):
+        self.chunk_size = chunk_size
+        self._decompressor = zlib.decompressobj(self.wbits)
+        self._decoded = False
+        self._broken = False
+
+    def decompress(self, data):
+        """Return an iterator over the decoded chunks of ``data``"""
+        while data and not self._broken:
+            try:
+                chunk = self._decompressor.decompress(data, self.chunk_size)
+            except zlib.error:
+                if not self._decoded:
+                    raise
+                self._broken = True
+                return
+            if chunk:
+                self._decoded = True
+                yield chunk
+            data = self._decompressor.unconsumed_tail
+            if not data and self._decompressor.unused_data:
+                # the next gzip member
+                data = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(self.wbits)
+
+    def flush(self):
+        """Return the decoded data left once all the data was fed"""
+        if self._broken:
+            return b''
+        return self._decompressor.flush()
+
+
+class DeflateDecoder(object):
+    """Decode zlib-wrapped deflate data or, as sent by some servers, raw
+    deflate data"""
+
+    encoding = b'deflate'
+
+    def __init__(self, chunk_size=DECODED_CHUNK_SIZE, max_size=0):
+        self.chunk_size = chunk_size
+        self._decompressor = None
+        self._pending = b''
+
+    def decompress(self, data):
+        """Return an iterator over the decoded chunks of ``data``"""
+        if self._decompressor is None:
+            # the first 2 bytes tell zlib headers from raw deflate data, see
+            # http://www.gzip.org/zlib/zlib_faq.html#faq38
+            data = self._pending + data
+            if len(data) < 2:
+                self._pending = data
+                return
+            self._pending = b''
+            header = bytearray(data[:2])
+            if header[0] & 0x0f == 8 and (header[0] << 8 | header[1]) % 31 == 0:
+                self._decompressor = zlib.decompressobj()
+            else:
+                self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        while data:
+            chunk = self._decompressor.decompress(data, self.chunk_size)
+            if chunk:
+                yield chunk
+            data = self._decompressor.unconsumed_tail
+
+    def flush(self):
+        """Return the decoded data left once all the data was fed"""
+        if self._decompressor is None:
+            data, self._pending = self._pending, b''
+            return zlib.decompress(data, -zlib.MAX_WBITS) if data else b''
+        return self._decompressor.flush()
+
+
+class BrotliDecoder(object):
+    """Decode brotli data, with either the ``brotli`` or the ``brotlipy``
+    library.
+
+    Only ``brotli`` 1.2 or later can bound the size of decoded chunks; with
+    older versions and ``brotlipy`` each chunk of data is decoded at once,
+    however large, before ``max_size`` can be checked.
+    """
+
+    encoding = b'br'
+
+    def __init__(self, chunk_size=DECODED_CHUNK_SIZE, max_size=0):
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self._decoded = 0
+        self._decompressor = brotli.Decompressor()
+        self._bounded = hasattr(self._decompressor, 'can_accept_more_data')
+        if hasattr(self._decompressor, 'process'):
+            self._process = self._decompressor.process
+        else:
+            self._process = self._decompressor.decompress
+
+    def decompress(self, data):
+        """Return an iterator over the decoded chunks of ``data``"""
+        if not self._bounded:
+            output = self._process(data)
+            self._check_size(len(output))
+            for chunk in self._split(output):
+                yield chunk
+            return
+        # the output buffer limit is loose, brotli grows it in blocks
+        output = self._process(data, output_buffer_limit=self.chunk_size)
+        while True:
+            for chunk in self._split(output):
+                yield chunk
+            # brotli may hold more output even when it can take more input
+            if self._decompressor.is_finished() or (
+                    not output and self._decompressor.can_accept_more_data()):
+                break
+            output = self._process(b'', output_buffer_limit=self.chunk_size)
+
+    def _split(self, output):
+        for i in range(0, len(output), self.chunk_size):
+            yield output[i:i + self.chunk_size]
+
+    def _check_size(self, size):
+        self._decoded += size
+        if self.max_size and self._decoded > self.max_size:
+            raise DecodedSizeError(self._decoded)
+
+    def flush(self):
+        """Return the decoded data left once all the data was fed"""
+        finish = getattr(self._decompressor, 'finish', None)
+        return finish() if finish is not None else b''
+
+
+class _ZstdSink(object):
+    """File-like object collecting the output of a zstandard stream writer,
+    which raises :exc:`DecodedSizeError` above ``max_size`` bytes to stop
+    decoding"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        if self.max_size and self.size > self.max_size:
+            raise DecodedSizeError(self.size)
+        return len(data)
+
+
+class ZstdDecoder(object):
+    """Decode zstd data, with the ``zstandard`` library.
+
+    zstandard can't pause decoding once a chunk is decoded, so the decoded
+    data is collected until the end of the data fed, or until it goes above
+    ``max_size`` bytes, which raises :exc:`DecodedSizeError`.
+    """
+
+    encoding = b'zstd'
+
+    def __init__(self, chunk_size=DECODED_CHUNK_SIZE, max_size=0):
+        self.chunk_size = chunk_size
+        self._sink = _ZstdSink(max_size)
+        self._writer = zstandard.ZstdDecompressor().stream_writer(
+            self._sink, write_size=chunk_size)
+
+    def decompress(self, data):
+        """Return an iterator over the decoded chunks of ``data``"""
+        self._writer.write(data)
+        chunks, self._sink.chunks = self._sink.chunks, []
+        return iter(chunks)
+
+    def flush(self):
+        """Return the decoded data left once all the data was fed"""
+        return b''
+
+
+DECODERS = {
+    b'gzip': GzipDecoder,
+    b'x-gzip': GzipDecoder,
+    b'deflate': DeflateDecoder,
+}
+if brotli is not None:
+    DECODERS[b'br'] = BrotliDecoder
+if zstandard is not None:
+    DECODERS[b'zstd'] = ZstdDecoder
+
+
+def get_decoder(encoding, chunk_size=DECODED_CHUNK_SIZE, max_size=0):
+    """Return a decoder of the ``encoding`` content coding, or ``None`` if it
+    is not supported.
+
+    Decoders yield decoded chunks of up to about ``chunk_size`` bytes, so that
+    their caller can stop decoding once it got enough. Those which can't
+    raise :exc:`DecodedSizeError` instead once they decoded more than
+    ``max_size`` bytes, unless it is 0.
+    """
+    decodercls = DECODERS.get(encoding.strip().lower())
+    if decodercls is None:
+        return None
+    return decodercls(chunk_size, max_size)
+
+
+def decode(data, encoding):
+    """Decode the whole ``data`` of the ``encoding`` content coding"""
+    decoder = get_decoder(encoding)
+    if decoder is None:
+        return data
+    return b''.join(decoder.decompress(data)) + decoder.flush()
@@ -32,6 +32,18 @@ def get_engine_status(engine):
 
     return checks
 
+def get_pool_status(engine):
+    """Return a report of the connection pools of the download handlers, as
+    a list of ``(scheme, host, counters)`` tuples"""
+    status = []
+    handlers = engine.downloader.handlers._handlers
+    for scheme in sorted(handlers):
+        pool = getattr(handlers[scheme], '_pool', None)
+        if hasattr(pool, 'status'):
+            status += [(scheme, host, counters)
+                       for host, counters in pool.status()]
+    return status
+
 def format_engine_status(engine=None):
     checks = get_engine_status(engine)
     s = "Execution engine status\n\n"
@@ -39,6 +51,14 @@ def format_engine_status(engine=None):
         s += "%-47s : %s\n" % (test, result)
     s += "\n"
 
+    pools = get_pool_status(engine)
+    if pools:
+        s += "Connection pools\n\n"
+        for scheme, host, counters in pools:
+            s += "%-6s %-40s : %s\n" % (scheme, host, " ".join(
+                "%s=%s" % (k, counters[k]) for k in sorted(counters)))
+        s += "\n"
+
     return s
 
 def print_engine_status(engine):
@@ -1,5 +1,6 @@
 import re
 import csv
+import codecs
 import logging
 try:
     from cStringIO import StringIO as BytesIO
@@ -56,6 +57,52 @@ def xmliter_lxml(obj, nodename, namespace=None, prefix='x'):
         yield xs.xpath(selxpath)[0]
 
 
+class XmlNodeFeeder(object):
+    """Incremental counterpart of :func:`xmliter_lxml`: :meth:`feed` it body
+    chunks as they arrive and it returns Selectors for the ``nodename`` nodes
+    completed so far. An empty chunk marks the end of the document.
+
+    Completed nodes are discarded from the parsed tree, so memory usage does
+    not grow with the document size.
+    """
+
+    def __init__(self, nodename, namespace=None, prefix='x'):
+        from lxml import etree
+        self._etree = etree
+        tag = '{%s}%s' % (namespace, nodename) if namespace else nodename
+        self._parser = etree.XMLPullParser(events=('end',), tag=tag,
+                                           resolve_entities=False)
+        self._selxpath = '//' + ('%s:%s' % (prefix, nodename) if namespace
+                                 else nodename)
+        self._namespace = namespace
+        self._prefix = prefix
+        self._started = False
+
+    def feed(self, chunk):
+        if not self._started:
+            # the XML declaration must be at the very start of the document
+            chunk = chunk.lstrip()
+            self._started = bool(chunk)
+            if not chunk:
+                return []
+        if chunk:
+            self._parser.feed(chunk)
+        else:
+            self._parser.close()
+        return list(self._read_nodes())
+
+    def _read_nodes(self):
+        for _, node in self._parser.read_events():
+            nodetext = self._etree.tostring(node, encoding='unicode')
+            node.clear()
+            while node.getprevious() is not None:
+                del node.getparent()[0]
+            xs = Selector(text=nodetext, type='xml')
+            if self._namespace:
+                xs.register_namespace(self._prefix, self._namespace)
+            yield xs.xpath(self._selxpath)[0]
+
+
 class _StreamReader(object):
 
     def __init__(self, obj):
@@ -132,6 +179,68 @@ def csviter(obj, delimiter=None, headers=None, encoding=None, quotechar=None):
             yield dict(zip(headers, row))
 
 
+class CsvRowFeeder(object):
+    """Incremental counterpart of :func:`csviter`: :meth:`feed` it body chunks
+    as they arrive and it returns dictionaries for the rows completed so far.
+    An empty chunk marks the end of the file.
+    """
+
+    def __init__(self, delimiter=None, headers=None, encoding=None,
+                 quotechar=None):
+        self.headers = headers
+        self.encoding = encoding or 'utf-8'
+        self._decoder = codecs.getincrementaldecoder(self.encoding)('replace')
+        self._kwargs = {}
+        if delimiter: self._kwargs['delimiter'] = delimiter
+        if quotechar: self._kwargs['quotechar'] = quotechar
+        self._quotechar = quotechar or '"'
+        self._pending = u''
+        self._line_num = 0
+
+    def feed(self, chunk):
+        text = self._pending + self._decoder.decode(chunk, final=not chunk)
+        if chunk:
+            end = self._records_end(text)
+            text, self._pending = text[:end], text[end:]
+        else:
+            self._pending = u''
+        return list(self._parse_rows(text)) if text else []
+
+    def _records_end(self, text):
+        """Return the position after the last line break that is not inside
+        a quoted field"""
+        end = 0
+        quoted = False
+        for match in re.finditer(u'%s|\n' % re.escape(self._quotechar), text):
+            if match.group() == u'\n':
+                if not quoted:
+                    end = match.end()
+            else:
+                quoted = not quoted
+        return end
+
+    def _parse_rows(self, text):
+        # Python 2 csv reader input object needs to return bytes
+        if six.PY3:
+            lines = StringIO(text)
+        else:
+            lines = BytesIO(text.encode('utf-8'))
+        csv_r = csv.reader(lines, **self._kwargs)
+        for row in csv_r:
+            self._line_num += 1
+            row = [to_unicode(field, 'utf-8') for field in row]
+            if self.headers is None:
+                self.headers = row
+                continue
+            if len(row) != len(self.headers):
+                logger.warning("ignoring row %(csvlnum)d (length: %(csvrow)d, "
+                               "should be: %(csvheader)d)",
+                               {'csvlnum': self._line_num, 'csvrow': len(row),
+                                'csvheader': len(self.headers)})
+                continue
+            yield dict(zip(self.headers, row))
+
+
 def _body_or_str(obj, unicode=True):
     expected_types = (Response, six.text_type, six.binary_type)
     assert isinstance(obj, expected_types), \
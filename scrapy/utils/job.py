@@ -1,7 +1,20 @@
 import os
+import json
 
 def job_dir(settings):
     path = settings['JOBDIR']
     if path and not os.path.exists(path):
         os.makedirs(path)
     return path
+
+
+def atomic_json_dump(obj, path):
+    """Write ``obj`` as JSON to ``path`` so that, even after a crash, the file
+    holds either its previous content or the new one, never a partial write.
+    """
+    tmppath = path + '.tmp'
+    with open(tmppath, 'w') as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmppath, path)
@@ -1,5 +1,11 @@
+import logging
+from math import ceil
+
 from twisted.internet import reactor, error
 
+logger = logging.getLogger(__name__)
+
+
 def listen_tcp(portrange, host, factory):
     """Like reactor.listenTCP but tries different ports in a range."""
     assert len(portrange) <= 2, "invalid portrange: %s" % portrange
@@ -39,3 +45,130 @@ class CallLaterOnce(object):
     def __call__(self):
         self._call = None
         return self._func(*self._a, **self._kw)
+
+
+class TimerWheel(object):
+    """Call functions after a delay, like ``reactor.callLater``, rounding
+    the delay up to a multiple of ``resolution`` seconds.
+
+    Timers are kept in buckets hashed by the tick in which they are due, so
+    that starting and cancelling one takes constant time, however many are
+    pending. A single reactor call, repeated every ``resolution`` seconds
+    while timers are pending, runs those that are due.
+    """
+
+    def __init__(self, resolution=0.01, clock=None):
+        if resolution <= 0:
+            raise ValueError("TimerWheel resolution must be positive: %r"
+                             % (resolution,))
+        self.resolution = resolution
+        self._clock = clock if clock is not None else reactor
+        self._buckets = {}
+        self._pending = 0
+        # the last tick whose timers have run
+        self._tick = None
+        self._call = None
+        self._running = False
+
+    def seconds(self):
+        return self._clock.seconds()
+
+    def callLater(self, delay, func, *args, **kwargs):
+        """Return a :class:`WheelTimer` calling ``func(*args, **kwargs)``
+        after ``delay`` seconds, or up to ``resolution`` seconds later"""
+        if not self._pending:
+            self._tick = self._current_tick()
+        due = self.seconds() + delay
+        tick = max(int(ceil(due / self.resolution)), self._tick + 1)
+        timer = WheelTimer(self, tick, func, args, kwargs)
+        self._buckets.setdefault(tick, []).append(timer)
+        self._pending += 1
+        if self._call is None and not self._running:
+            self._schedule()
+        return timer
+
+    def clear(self):
+        """Cancel all pending timers"""
+        for bucket in self._buckets.values():
+            for timer in bucket:
+                timer._clear()
+        self._buckets.clear()
+        self._pending = 0
+        self._stop()
+
+    def __len__(self):
+        return self._pending
+
+    def _current_tick(self):
+        return int(self.seconds() / self.resolution)
+
+    def _schedule(self):
+        delay = (self._tick + 1) * self.resolution - self.seconds()
+        self._call = self._clock.callLater(max(0, delay), self._run)
+
+    def _stop(self):
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+
+    def _done(self):
+        self._pending -= 1
+        if not self._pending:
+            # cancelled timers are only removed from their buckets when due
+            self._buckets.clear()
+            self._stop()
+
+    def _run(self):
+        self._call = None
+        self._running = True
+        try:
+            now = self._current_tick()
+            while self._tick < now and self._pending:
+                self._tick += 1
+                for timer in self._buckets.pop(self._tick, ()):
+                    if timer.active():
+                        self._done()
+                        timer._fire()
+        finally:
+            self._running = False
+        if self._pending and self._call is None:
+            self._schedule()
+
+
+class WheelTimer(object):
+    """A timer of a :class:`TimerWheel`, with the ``active()``,
+    ``cancel()`` and ``getTime()`` methods of Twisted delayed calls"""
+
+    __slots__ = ('_wheel', '_tick', '_func', '_args', '_kwargs')
+
+    def __init__(self, wheel, tick, func, args, kwargs):
+        self._wheel = wheel
+        self._tick = tick
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+
+    def getTime(self):
+        return self._tick * self._wheel.resolution
+
+    def active(self):
+        return self._func is not None
+
+    def cancel(self):
+        if self._func is None:
+            return
+        # drop references right away, e.g. to the deferred of a download
+        self._clear()
+        self._wheel._done()
+
+    def _clear(self):
+        self._func = self._args = self._kwargs = None
+
+    def _fire(self):
+        func, args, kwargs = self._func, self._args, self._kwargs
+        self._clear()
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.error("Error calling %(func)r from a timer wheel",
+                         {'func': func}, exc_info=True)
@@ -32,7 +32,8 @@ def request_to_dict(request, spider=None):
         '_encoding': request._encoding,
         'priority': request.priority,
         'dont_filter': request.dont_filter,
-        'flags': request.flags
+        'flags': request.flags,
+        'fingerprints': request._fingerprints,
     }
     if type(request) is not Request:
         d['_class'] = request.__module__ + '.' + request.__class__.__name__
@@ -52,7 +53,7 @@ def request_from_dict(d, spider=None):
     if eb and spider:
         eb = _get_method(spider, eb)
     request_cls = load_object(d['_class']) if '_class' in d else Request
-    return request_cls(
+    request = request_cls(
         url=to_native_str(d['url']),
         callback=cb,
         errback=eb,
@@ -65,6 +66,8 @@ def request_from_dict(d, spider=None):
         priority=d['priority'],
         dont_filter=d['dont_filter'],
         flags=d.get('flags'))
+    request._fingerprints = d.get('fingerprints')
+    return request
 
 
 def _find_method(obj, func):
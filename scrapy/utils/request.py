@@ -5,17 +5,15 @@ scrapy.http.Request objects
 
 from __future__ import print_function
 import hashlib
-import weakref
 from six.moves.urllib.parse import urlunparse
 
 from w3lib.http import basic_auth_header
 from scrapy.utils.python import to_bytes, to_native_str
 
-from w3lib.url import canonicalize_url
 from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.url import cached_canonicalize_url
 
 
-_fingerprint_cache = weakref.WeakKeyDictionary()
 def request_fingerprint(request, include_headers=None):
     """
     Return the request fingerprint.
@@ -42,15 +40,20 @@ def request_fingerprint(request, include_headers=None):
     the fingeprint. If you want to include specific headers use the
     include_headers argument, which is a list of Request headers to include.
 
+    The fingerprint is cached in the request, so it is only computed once,
+    even if the request is serialized to a disk queue or copied.
+
     """
     if include_headers:
         include_headers = tuple(to_bytes(h.lower())
                                  for h in sorted(include_headers))
-    cache = _fingerprint_cache.setdefault(request, {})
+    cache = request._fingerprints
+    if cache is None:
+        cache = request._fingerprints = {}
     if include_headers not in cache:
         fp = hashlib.sha1()
         fp.update(to_bytes(request.method))
-        fp.update(to_bytes(canonicalize_url(request.url)))
+        fp.update(to_bytes(cached_canonicalize_url(request.url)))
         fp.update(request.body or b'')
         if include_headers:
             for hdr in include_headers:
@@ -62,6 +65,36 @@ def request_fingerprint(request, include_headers=None):
     return cache[include_headers]
 
 
+class RequestFingerprinter(object):
+    """Default request fingerprinter, which returns the same fingerprints as
+    :func:`request_fingerprint`.
+
+    The fingerprinter used by a crawler is set with the
+    ``REQUEST_FINGERPRINTER_CLASS`` setting, and available as its
+    ``request_fingerprinter`` attribute. Fingerprinters may override
+    :meth:`compute`: :meth:`fingerprint` caches what it returns in the
+    request, under a key unique to the fingerprinter class.
+    """
+
+    @property
+    def cache_key(self):
+        if type(self) is RequestFingerprinter:
+            return None  # shared with request_fingerprint()
+        return '%s.%s' % (type(self).__module__, type(self).__name__)
+
+    def fingerprint(self, request):
+        key = self.cache_key
+        cache = request._fingerprints
+        if cache is None:
+            cache = request._fingerprints = {}
+        if key not in cache:
+            cache[key] = self.compute(request)
+        return cache[key]
+
+    def compute(self, request):
+        return request_fingerprint(request)
+
+
 def request_authenticate(request, username, password):
     """Autenticate the given request (in place) using the HTTP basic access
     authentication mechanism (RFC 2617) and the given username and password
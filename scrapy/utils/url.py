@@ -7,6 +7,7 @@ to the w3lib.url module. Always import those from there instead.
 """
 import posixpath
 import re
+from collections import OrderedDict
 from six.moves.urllib.parse import (ParseResult, urldefrag, urlparse, urlunparse)
 
 # scrapy.utils.url was moved to w3lib.url and import * ensures this
@@ -134,3 +135,94 @@ def strip_url(url, strip_credentials=True, strip_default_port=True, origin_only=
         '' if origin_only else parsed_url.query,
         '' if strip_fragment else parsed_url.fragment
     ))
+
+
+_CANONICAL_PREFIX_RE = re.compile(r"https?://[a-z0-9.\-]+(?::[0-9]+)?/")
+_CANONICAL_PATH_RE = re.compile(r"[A-Za-z0-9\-._~!$&'()*+,/:=@\[\]|]*\Z")
+_CANONICAL_QUERY_ARG_RE = re.compile(r"[A-Za-z0-9_.\-]+=[A-Za-z0-9_.\-]*\Z")
+
+
+def _is_canonical(url, keep_fragments=False):
+    """Return True if ``canonicalize_url(url, keep_fragments=keep_fragments)``
+    is known to return ``url`` unchanged, without parsing it.
+
+    Only plain ASCII http(s) URLs with a lowercase host, no percent-escapes,
+    no params and a sorted ``key=value`` query string take this path; any
+    other URL returns False, even if it happens to be canonical.
+    """
+    match = _CANONICAL_PREFIX_RE.match(url)
+    if not match:
+        return False
+    rest = url[match.end():]
+    if '#' in rest:
+        if not keep_fragments:
+            return False
+        rest, fragment = rest.split('#', 1)
+        if not fragment or not _CANONICAL_PATH_RE.match(fragment):
+            return False
+    if '?' in rest:
+        rest, query = rest.split('?', 1)
+        args = query.split('&')
+        if not all(_CANONICAL_QUERY_ARG_RE.match(arg) for arg in args):
+            return False
+        args = [tuple(arg.split('=')) for arg in args]
+        if args != sorted(args):
+            return False
+    return bool(_CANONICAL_PATH_RE.match(rest))
+
+
+class URLCanonicalizer(object):
+    """Memoizing drop-in for :func:`w3lib.url.canonicalize_url` (with its
+    default arguments, except for ``keep_fragments``).
+
+    URLs that are already canonical are returned as-is without being parsed,
+    and the results for any other URL are kept in a bounded LRU cache keyed
+    by the raw URL. ``hits``, ``misses`` and ``fastpath`` count how each call
+    was resolved.
+    """
+
+    def __init__(self, keep_fragments=False, cache_size=10000):
+        self.keep_fragments = keep_fragments
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = self.misses = self.fastpath = 0
+
+    def __call__(self, url):
+        if type(url) is str and _is_canonical(url, self.keep_fragments):
+            self.fastpath += 1
+            return url
+        cache = self.cache
+        try:
+            canonical = cache.pop(url)
+        except KeyError:
+            self.misses += 1
+            canonical = canonicalize_url(url,
+                                         keep_fragments=self.keep_fragments)
+            if len(cache) >= self.cache_size:
+                cache.popitem(last=False)
+        else:
+            self.hits += 1
+        cache[url] = canonical
+        return canonical
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = self.misses = self.fastpath = 0
+
+
+_canonicalizers = {
+    False: URLCanonicalizer(),
+    True: URLCanonicalizer(keep_fragments=True),
+}
+
+
+def cached_canonicalize_url(url, keep_fragments=False):
+    """Same as ``canonicalize_url(url, keep_fragments=keep_fragments)``, but
+    served by a shared :class:`URLCanonicalizer`.
+
+    >>> cached_canonicalize_url('http://www.example.com/do?c=3&b=5&b=2&a=50')
+    'http://www.example.com/do?a=50&b=2&b=5&c=3'
+    >>> cached_canonicalize_url('http://www.example.com/do?a=50&b=2')
+    'http://www.example.com/do?a=50&b=2'
+    """
+    return _canonicalizers[keep_fragments](url)
@@ -215,11 +215,18 @@ class MockServer():
         return host + path
 
 
-def ssl_context_factory(keyfile='keys/localhost.key', certfile='keys/localhost.crt'):
-    return ssl.DefaultOpenSSLContextFactory(
-         os.path.join(os.path.dirname(__file__), keyfile),
-         os.path.join(os.path.dirname(__file__), certfile),
-         )
+def ssl_context_factory(keyfile='keys/localhost.key', certfile='keys/localhost.crt',
+                        acceptable_protocols=None):
+    keyfile = os.path.join(os.path.dirname(__file__), keyfile)
+    certfile = os.path.join(os.path.dirname(__file__), certfile)
+    if acceptable_protocols:
+        # negotiating protocols through ALPN needs CertificateOptions
+        with open(keyfile, 'rb') as key, open(certfile, 'rb') as cert:
+            pem = ssl.PrivateCertificate.loadPEM(key.read() + cert.read())
+        return ssl.CertificateOptions(
+            privateKey=pem.privateKey.original, certificate=pem.original,
+            acceptableProtocols=acceptable_protocols)
+    return ssl.DefaultOpenSSLContextFactory(keyfile, certfile)
 
 
 if __name__ == "__main__":
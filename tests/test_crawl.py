@@ -5,6 +5,7 @@ from testfixtures import LogCapture
 from twisted.internet import defer
 from twisted.trial.unittest import TestCase
 
+from scrapy import signals
 from scrapy.http import Request
 from scrapy.crawler import CrawlerRunner
 from scrapy.utils.python import to_unicode
@@ -163,6 +164,41 @@ with multiples lines
             yield crawler.crawl(self.mockserver.url("/raw?{0}".format(query)), mockserver=self.mockserver)
         self.assertEqual(str(l).count("Got response 200"), 1)
 
+    @defer.inlineCallbacks
+    def test_body_consumer(self):
+        from six.moves.urllib.parse import urlencode
+        query = urlencode({'raw': '''\
+HTTP/1.1 200 OK
+Content-Type: text/csv
+Content-Length: 11
+
+id
+1
+2
+3
+4
+'''})
+        chunks = []
+
+        def consume(response, chunk):
+            chunks.append(chunk)
+            return [{'id': int(line)} for line in chunk.split()
+                    if line.isdigit()]
+
+        items = []
+        crawler = self.runner.create_crawler(SingleRequestSpider)
+        crawler.signals.connect(lambda item: items.append(item),
+                                signals.item_scraped, weak=False)
+        seed = Request(self.mockserver.url("/raw?{0}".format(query)),
+                       meta={'body_consumer': consume})
+        yield crawler.crawl(seed=seed, mockserver=self.mockserver)
+        self.assertEqual(chunks[-1], b'')
+        self.assertEqual(b''.join(chunks), b'id\n1\n2\n3\n4\n')
+        self.assertEqual(sorted(item['id'] for item in items), [1, 2, 3, 4])
+        response = crawler.spider.meta['responses'][0]
+        self.assertIn('streamed', response.flags)
+        self.assertEqual(response.body, b'')
+
     @defer.inlineCallbacks
     def test_retry_conn_lost(self):
         # connection lost after receiving data
@@ -226,6 +262,25 @@ with multiples lines
         self.assertEqual(s['engine.spider.name'], crawler.spider.name)
         self.assertEqual(s['len(engine.scraper.slot.active)'], 1)
 
+    @defer.inlineCallbacks
+    def test_engine_status_pools(self):
+        from scrapy.utils.engine import get_pool_status, format_engine_status
+        est = []
+
+        def cb(response):
+            est.append((get_pool_status(crawler.engine),
+                        format_engine_status(crawler.engine)))
+
+        crawler = self.runner.create_crawler(SingleRequestSpider)
+        yield crawler.crawl(seed=self.mockserver.url('/'), callback_func=cb, mockserver=self.mockserver)
+        self.assertEqual(len(est), 1, est)
+        pools, formatted = est[0]
+        self.assertEqual([(scheme, host) for scheme, host, _ in pools],
+                         [('http', self.mockserver.url('/').split('/')[2])])
+        self.assertEqual(pools[0][2]['new'], 1)
+        self.assertIn('Connection pools', formatted)
+        self.assertEqual(crawler.stats.get_value('downloader/pool/new'), 1)
+
     @defer.inlineCallbacks
     def test_graceful_crawl_error_handling(self):
         """
@@ -0,0 +1,159 @@
+from time import time
+
+from twisted.internet import defer, reactor
+from twisted.internet.error import TimeoutError
+from twisted.internet.task import deferLater
+from twisted.trial.unittest import TestCase
+
+from scrapy import signals
+from scrapy.core.downloader import Downloader
+from scrapy.http import Request, Response
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+
+
+class DownloaderSlotsTest(TestCase):
+
+    settings_dict = {'DOWNLOAD_DELAY': 0.05,
+                     'RANDOMIZE_DOWNLOAD_DELAY': False}
+
+    def setUp(self):
+        self.crawler = get_crawler(Spider, self.settings_dict)
+        self.spider = self.crawler._create_spider('foo')
+        self.downloader = Downloader(self.crawler)
+        self.downloader.handlers.download_request = self._download_request
+        self.sent = {}
+
+    def tearDown(self):
+        self.downloader.close()
+
+    def _download_request(self, request, spider):
+        self.sent.setdefault(request.meta['download_slot'], []).append(time())
+        return defer.succeed(Response(request.url))
+
+    def _enqueue(self, slot, count=1):
+        dfds = []
+        for i in range(count):
+            request = Request('http://example.com/%d' % i,
+                              meta={'download_slot': slot})
+            dfds.append(self.downloader._enqueue_request(request, self.spider))
+        return defer.DeferredList(dfds)
+
+    @defer.inlineCallbacks
+    def test_delayed_slots_share_one_timer(self):
+        before = len(reactor.getDelayedCalls())
+        dfds = [self._enqueue('slot%d' % i, 3) for i in range(20)]
+        slots = self.downloader.slots.values()
+        self.assertEqual(len([s for s in slots if s.wakeup]), 20)
+        self.assertEqual(len(reactor.getDelayedCalls()), before + 1)
+        yield defer.DeferredList(dfds)
+        self.assertEqual(len(self.sent), 20)
+        for times in self.sent.values():
+            self.assertEqual(len(times), 3)
+            for prev, next_ in zip(times, times[1:]):
+                self.assertGreaterEqual(next_ - prev, 0.045)
+
+    @defer.inlineCallbacks
+    def test_idle_slot_eviction(self):
+        self.downloader.SLOT_IDLE_AGE = 0.1
+        yield self._enqueue('a')
+        self.assertIn('a', self.downloader.slots)
+        self.assertIsNotNone(self.downloader.slots['a'].evict_at)
+        yield deferLater(reactor, 0.1, lambda: None)
+        # reusing the slot postpones its eviction
+        yield self._enqueue('a')
+        yield deferLater(reactor, 0.1, lambda: None)
+        self.assertIn('a', self.downloader.slots)
+        yield deferLater(reactor, 0.2, lambda: None)
+        self.assertNotIn('a', self.downloader.slots)
+        self.assertEqual(len(self.downloader._timers), 0)
+
+
+class DownloaderSlotQueueTest(TestCase):
+
+    settings_dict = {'CONCURRENT_REQUESTS_PER_DOMAIN': 1}
+
+    def setUp(self):
+        self.crawler = get_crawler(Spider, self.settings_dict)
+        self.spider = self.crawler._create_spider('foo')
+        self.crawler.stats.open_spider(self.spider)
+        self.downloader = Downloader(self.crawler)
+        self.downloader.handlers.download_request = self._download_request
+        self.pending = []
+        self.sent = []
+
+    def tearDown(self):
+        self.downloader.close()
+
+    def _download_request(self, request, spider):
+        self.sent.append(request.url)
+        dfd = defer.Deferred()
+        self.pending.append((dfd, request))
+        return dfd
+
+    def _enqueue(self, url, priority=0):
+        request = Request(url, priority=priority,
+                          meta={'download_slot': 'a'})
+        return self.downloader._enqueue_request(request, self.spider)
+
+    def _finish_one(self):
+        dfd, request = self.pending.pop(0)
+        dfd.callback(Response(request.url))
+
+    def test_priority_order(self):
+        self._enqueue('http://example.com/first')
+        self._enqueue('http://example.com/low', priority=-1)
+        self._enqueue('http://example.com/normal')
+        self._enqueue('http://example.com/high', priority=10)
+        while self.pending:
+            self._finish_one()
+        self.assertEqual(self.sent, ['http://example.com/first',
+                                     'http://example.com/high',
+                                     'http://example.com/normal',
+                                     'http://example.com/low'])
+        stats = self.crawler.stats
+        self.assertEqual(
+            stats.get_value('downloader/slot_wait/normal/count'), 2)
+        self.assertEqual(stats.get_value('downloader/slot_wait/low/count'), 1)
+        self.assertEqual(stats.get_value('downloader/slot_wait/high/count'), 1)
+        self.assertGreaterEqual(
+            stats.get_value('downloader/slot_wait/low/max'),
+            stats.get_value('downloader/slot_wait/high/max'))
+
+    def test_reserved_lane(self):
+        self._enqueue('http://example.com/first')
+        self._enqueue('http://example.com/second')
+        self._enqueue('http://example.com/robots.txt', priority=1000)
+        self.assertEqual(self.sent, ['http://example.com/first',
+                                     'http://example.com/robots.txt'])
+        self.assertEqual(
+            self.crawler.stats.get_value('downloader/slot_wait/reserved/count'),
+            1)
+        while self.pending:
+            self._finish_one()
+        self.assertEqual(len(self.sent), 3)
+
+    def test_reserved_lane_disabled(self):
+        self.downloader.reserved_concurrency = 0
+        self._enqueue('http://example.com/first')
+        self._enqueue('http://example.com/second')
+        self._enqueue('http://example.com/robots.txt', priority=1000)
+        self.assertEqual(self.sent, ['http://example.com/first'])
+        self._finish_one()
+        self.assertEqual(self.sent[1], 'http://example.com/robots.txt')
+        while self.pending:
+            self._finish_one()
+
+    def test_download_error_signal(self):
+        errors = []
+
+        def download_error(failure, request, spider):
+            errors.append((failure.type, request.url))
+
+        self.crawler.signals.connect(download_error, signals.download_error)
+        dfd = self._enqueue('http://example.com/timeout')
+        self._enqueue('http://example.com/ok')
+        self.pending.pop(0)[0].errback(TimeoutError())
+        self._finish_one()
+        self.assertEqual(errors, [(TimeoutError, 'http://example.com/timeout')])
+        return self.assertFailure(dfd, TimeoutError)
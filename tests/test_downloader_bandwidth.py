@@ -0,0 +1,84 @@
+from twisted.internet import task
+from twisted.trial import unittest
+
+from scrapy.core.downloader.bandwidth import TokenBucket, BandwidthLimiter
+from scrapy.http import Request
+from scrapy.utils.test import get_crawler
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+
+    def test_burst(self):
+        bucket = TokenBucket(100, clock=self.clock)
+        self.assertEqual(bucket.consume(60), 0)
+        self.assertEqual(bucket.consume(40), 0)
+        self.assertAlmostEqual(bucket.consume(50), 0.5)
+
+    def test_refill(self):
+        bucket = TokenBucket(100, burst=50, clock=self.clock)
+        self.assertAlmostEqual(bucket.consume(100), 0.5)
+        self.clock.advance(0.5)
+        self.assertEqual(bucket.consume(0), 0)
+        # idle buckets don't refill above their burst
+        self.clock.advance(10)
+        self.assertAlmostEqual(bucket.consume(100), 0.5)
+
+
+class BandwidthLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+
+    def test_no_limits(self):
+        limiter = BandwidthLimiter(clock=self.clock)
+        self.assertEqual(limiter.buckets(Request('http://a.com')), [])
+
+    def test_buckets(self):
+        limiter = BandwidthLimiter(1000, 100, clock=self.clock)
+        req1 = Request('http://a.com', meta={'download_slot': 'a.com'})
+        req2 = Request('http://a.com/2', meta={'download_slot': 'a.com'})
+        req3 = Request('http://b.com', meta={'download_slot': 'b.com',
+                                             'download_bandwidth_limit': 10})
+        buckets1 = limiter.buckets(req1)
+        buckets2 = limiter.buckets(req2)
+        buckets3 = limiter.buckets(req3)
+        self.assertEqual([b.rate for b in buckets1], [1000, 100])
+        self.assertEqual([b.rate for b in buckets3], [1000, 100, 10])
+        # requests share the global bucket and the bucket of their slot
+        self.assertIs(buckets1[0], buckets3[0])
+        self.assertIs(buckets1[1], buckets2[1])
+        self.assertIsNot(buckets1[1], buckets3[1])
+
+    def test_consume(self):
+        limiter = BandwidthLimiter(1000, 100, clock=self.clock)
+        buckets = limiter.buckets(
+            Request('http://a.com', meta={'download_slot': 'a.com'}))
+        self.assertEqual(limiter.consume(buckets, 100), 0)
+        # the slowest bucket sets the delay
+        self.assertAlmostEqual(limiter.consume(buckets, 50), 0.5)
+
+    def test_burst_setting(self):
+        limiter = BandwidthLimiter(100, burst=0.5, clock=self.clock)
+        buckets = limiter.buckets(Request('http://a.com'))
+        self.assertAlmostEqual(limiter.consume(buckets, 100), 0.5)
+
+    def test_stats(self):
+        crawler = get_crawler(settings_dict={'DOWNLOAD_BANDWIDTH_LIMIT': 100})
+        limiter = BandwidthLimiter.from_crawler(crawler)
+        limiter._clock = self.clock
+        self.assertIs(BandwidthLimiter.from_crawler(crawler), limiter)
+        buckets = limiter.buckets(Request('http://a.com'))
+        limiter.consume(buckets, 100)
+        self.clock.advance(2)
+        limiter.throttled(0.5)
+        limiter.throttled(0.25)
+        stats = crawler.stats
+        self.assertEqual(stats.get_value('downloader/bandwidth/bytes'), 100)
+        self.assertEqual(stats.get_value('downloader/bandwidth/throughput'), 50)
+        self.assertEqual(
+            stats.get_value('downloader/bandwidth/throttled_count'), 2)
+        self.assertEqual(
+            stats.get_value('downloader/bandwidth/throttled_time'), 0.75)
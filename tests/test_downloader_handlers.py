@@ -1,5 +1,6 @@
 import os
 import six
+import zlib
 import shutil
 import tempfile
 import contextlib
@@ -10,6 +11,7 @@ except ImportError:
 
 from twisted.trial import unittest
 from twisted.protocols.policies import WrappingFactory
+from twisted.test import proto_helpers
 from twisted.python.filepath import FilePath
 from twisted.internet import reactor, defer, error
 from twisted.web import server, static, util, resource
@@ -27,7 +29,10 @@ from scrapy.core.downloader.handlers.file import FileDownloadHandler
 from scrapy.core.downloader.handlers.http import HTTPDownloadHandler, HttpDownloadHandler
 from scrapy.core.downloader.handlers.http10 import HTTP10DownloadHandler
 from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler
+from scrapy.core.downloader.handlers.http2 import H2DownloadHandler, \
+    H2ClientProtocol, _H2Stream
 from scrapy.core.downloader.handlers.s3 import S3DownloadHandler
+from scrapy.core.downloader.tls import TLSSessionCache
 
 from scrapy.spiders import Spider
 from scrapy.http import Headers, Request
@@ -47,6 +52,17 @@ class DummyDH(object):
         pass
 
 
+class MaxPerHostDH(object):
+
+    max_per_host = None
+
+    def __init__(self, crawler):
+        pass
+
+    def set_max_per_host(self, count):
+        self.max_per_host = count
+
+
 class OffDH(object):
 
     def __init__(self, crawler):
@@ -85,6 +101,19 @@ class LoadTestCase(unittest.TestCase):
         self.assertNotIn('scheme', dh._handlers)
         self.assertIn('scheme', dh._notconfigured)
 
+    def test_set_max_per_host(self):
+        handlers = {'scheme': 'tests.test_downloader_handlers.MaxPerHostDH',
+                    'other': 'tests.test_downloader_handlers.MaxPerHostDH',
+                    'dummy': 'tests.test_downloader_handlers.DummyDH'}
+        crawler = get_crawler(settings_dict={'DOWNLOAD_HANDLERS': handlers})
+        dh = DownloadHandlers(crawler)
+        dh._get_handler('scheme')
+        dh._get_handler('dummy')
+        dh.set_max_per_host(16)
+        self.assertEqual(dh._handlers['scheme'].max_per_host, 16)
+        # handlers loaded later get it too
+        self.assertEqual(dh._get_handler('other').max_per_host, 16)
+
 
 class FileTestCase(unittest.TestCase):
 
@@ -178,6 +207,25 @@ class EmptyContentTypeHeaderResource(resource.Resource):
         return request.content.read()
 
 
+class GzipResource(resource.Resource):
+    """A testing resource which renders a gzip-encoded body of 100000 bytes"""
+
+    def render(self, request):
+        request.setHeader(b"Content-Type", b"text/plain")
+        request.setHeader(b"Content-Encoding", b"gzip")
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(b"0123456789" * 10000) + compressor.flush()
+
+
+class BrokenGzipResource(resource.Resource):
+    """A testing resource which renders a body which is not gzip-encoded,
+    with a gzip Content-Encoding"""
+
+    def render(self, request):
+        request.setHeader(b"Content-Encoding", b"gzip")
+        return b"0123456789"
+
+
 class LargeChunkedFileResource(resource.Resource):
     def render(self, request):
         def response():
@@ -196,6 +244,7 @@ class HttpTestCase(unittest.TestCase):
     # only used for HTTPS tests
     keyfile = 'keys/localhost.key'
     certfile = 'keys/localhost.crt'
+    acceptable_protocols = None
 
     def setUp(self):
         self.tmpname = self.mktemp()
@@ -214,13 +263,16 @@ class HttpTestCase(unittest.TestCase):
         r.putChild(b"contentlength", ContentLengthHeaderResource())
         r.putChild(b"nocontenttype", EmptyContentTypeHeaderResource())
         r.putChild(b"largechunkedfile", LargeChunkedFileResource())
+        r.putChild(b"gzip", GzipResource())
+        r.putChild(b"brokengzip", BrokenGzipResource())
         r.putChild(b"echo", Echo())
         self.site = server.Site(r, timeout=None)
         self.wrapper = WrappingFactory(self.site)
         self.host = 'localhost'
         if self.scheme == 'https':
             self.port = reactor.listenSSL(
-                0, self.wrapper, ssl_context_factory(self.keyfile, self.certfile),
+                0, self.wrapper, ssl_context_factory(
+                    self.keyfile, self.certfile, self.acceptable_protocols),
                 interface=self.host)
         else:
             self.port = reactor.listenTCP(0, self.wrapper, interface=self.host)
@@ -361,6 +413,106 @@ class Http11TestCase(HttpTestCase):
     """HTTP 1.1 test case"""
     download_handler_cls = HTTP11DownloadHandler
 
+    @defer.inlineCallbacks
+    def test_connection_pool_counters(self):
+        crawler = get_crawler()
+        handler = self.download_handler_cls.from_crawler(crawler)
+        request = Request(self.getURL('file'))
+        try:
+            for _ in range(3):
+                response = yield handler.download_request(request, Spider('foo'))
+                self.assertEqual(response.body, b"0123456789")
+        finally:
+            yield handler.close()
+        host = '%s:%d' % (self.host, self.portno)
+        counters = dict(handler._pool.status())[host]
+        self.assertEqual(counters['new'], 1)
+        self.assertEqual(counters['reused'], 2)
+        self.assertEqual(counters['tls_handshake'], 1 if self.scheme == 'https' else 0)
+        self.assertEqual(crawler.stats.get_value('downloader/pool/new'), 1)
+        self.assertEqual(crawler.stats.get_value('downloader/pool/reused'), 2)
+
+    @defer.inlineCallbacks
+    def _test_connection_pool_eviction(self, eviction):
+        handler = self.download_handler_cls(Settings({
+            'DOWNLOAD_POOL_MAXSIZE': 1, 'DOWNLOAD_POOL_EVICTION': eviction}))
+        urls = [self.getURL('file'),
+                self.getURL('file').replace(self.host, self._other_host)]
+        try:
+            for url in urls:
+                yield handler.download_request(Request(url), Spider('foo'))
+        finally:
+            status = dict(handler._pool.status())
+            yield handler.close()
+        defer.returnValue(status)
+
+    @property
+    def _other_host(self):
+        return '127.0.0.1' if self.host == 'localhost' else 'localhost'
+
+    @defer.inlineCallbacks
+    def test_connection_pool_eviction_lru(self):
+        status = yield self._test_connection_pool_eviction('lru')
+        self.assertEqual(status['%s:%d' % (self.host, self.portno)]['evicted'], 1)
+        self.assertEqual(status['%s:%d' % (self._other_host, self.portno)]['cached'], 1)
+
+    @defer.inlineCallbacks
+    def test_connection_pool_eviction_mru(self):
+        status = yield self._test_connection_pool_eviction('mru')
+        self.assertEqual(status['%s:%d' % (self.host, self.portno)]['cached'], 1)
+        self.assertEqual(status['%s:%d' % (self._other_host, self.portno)]['evicted'], 1)
+
+    def test_set_max_per_host(self):
+        handler = self.download_handler_cls(Settings({
+            'CONCURRENT_REQUESTS_PER_DOMAIN': 4}))
+        self.assertEqual(handler._pool.maxPersistentPerHost, 4)
+        handler.set_max_per_host(16)
+        self.assertEqual(handler._pool.maxPersistentPerHost, 16)
+        return handler.close()
+
+    def test_connection_pool_eviction_unknown(self):
+        self.assertRaises(ValueError, self.download_handler_cls,
+                          Settings({'DOWNLOAD_POOL_EVICTION': 'random'}))
+
+    @defer.inlineCallbacks
+    def test_download_timings(self):
+        handler = self.download_handler_cls(Settings())
+        requests = [Request(self.getURL('file')), Request(self.getURL('file'))]
+        try:
+            for request in requests:
+                yield handler.download_request(request, Spider('foo'))
+        finally:
+            yield handler.close()
+        new, reused = [r.meta['download_timings'] for r in requests]
+        phases = ['setup', 'connect', 'ttfb', 'transfer']
+        if self.host == 'localhost':
+            phases.append('dns')
+        if self.scheme == 'https':
+            phases.append('tls')
+        self.assertEqual(sorted(new), sorted(phases))
+        self.assertEqual(sorted(reused), ['transfer', 'ttfb'])
+        self.assertFalse(requests[0].meta['download_connection_reused'])
+        self.assertTrue(requests[1].meta['download_connection_reused'])
+        for request in requests:
+            timings = request.meta['download_timings']
+            self.assertTrue(all(t >= 0 for t in timings.values()))
+            # the phases before the response add up to the latency, give or
+            # take timer jitter
+            before = sum(t for p, t in timings.items() if p != 'transfer')
+            self.assertTrue(
+                abs(before - request.meta['download_latency']) < 0.05)
+
+    @defer.inlineCallbacks
+    def test_download_timings_without_dns_cache(self):
+        handler = self.download_handler_cls(Settings({'DNSCACHE_ENABLED': False}))
+        request = Request(self.getURL('file'))
+        try:
+            yield handler.download_request(request, Spider('foo'))
+        finally:
+            yield handler.close()
+        self.assertNotIn('dns', request.meta['download_timings'])
+        self.assertIn('connect', request.meta['download_timings'])
+
     def test_download_without_maxsize_limit(self):
         request = Request(self.getURL('file'))
         d = self.download_request(request, Spider('foo'))
@@ -398,7 +550,8 @@ class Http11TestCase(HttpTestCase):
 
     @defer.inlineCallbacks
     def test_download_with_maxsize_very_large_file(self):
-        with mock.patch('scrapy.core.downloader.handlers.http11.logger') as logger:
+        logger_path = '%s.logger' % self.download_handler_cls.__module__
+        with mock.patch(logger_path) as logger:
             request = Request(self.getURL('largechunkedfile'))
 
             def check(logger):
@@ -435,6 +588,133 @@ class Http11TestCase(HttpTestCase):
         d.addCallback(self.assertEqual, b"0123456789")
         return d
 
+    @defer.inlineCallbacks
+    def test_download_with_spoolsize(self):
+        request = Request(self.getURL('file'))
+        response = yield self.download_request(
+            request, Spider('foo', download_spoolsize=10))
+        self.assertIsNone(response.bodyfile)
+
+        response = yield self.download_request(
+            request, Spider('foo', download_spoolsize=5))
+        self.assertIsNotNone(response.bodyfile)
+        self.assertEqual(response.open_body().read(), b"0123456789")
+        self.assertEqual(response.body, b"0123456789")
+
+    @defer.inlineCallbacks
+    def test_download_with_spoolsize_per_req(self):
+        request = Request(self.getURL('largechunkedfile'),
+                          meta={'download_spoolsize': 1})
+        response = yield self.download_request(request, Spider('foo'))
+        self.assertIsNotNone(response.bodyfile)
+        with response.open_body() as body:
+            self.assertEqual(len(body.read()), 1024 * 1024)
+
+    @defer.inlineCallbacks
+    def test_download_decode_content(self):
+        crawler = get_crawler()
+        handler = self.download_handler_cls.from_crawler(crawler)
+        request = Request(self.getURL('gzip'), meta={'download_decode_content': True})
+        try:
+            response = yield handler.download_request(request, Spider('foo'))
+        finally:
+            yield handler.close()
+        self.assertEqual(response.body, b"0123456789" * 10000)
+        self.assertNotIn(b'Content-Encoding', response.headers)
+        self.assertIsInstance(response, TextResponse)
+        stats = crawler.stats
+        self.assertEqual(stats.get_value('downloader/decoding/gzip'), 1)
+        self.assertEqual(stats.get_value('downloader/decoding/decoded_bytes'), 100000)
+        self.assertLess(stats.get_value('downloader/decoding/bytes'), 1000)
+        self.assertIsNotNone(stats.get_value('downloader/decoding/time'))
+
+    @defer.inlineCallbacks
+    def test_download_without_decode_content(self):
+        request = Request(self.getURL('gzip'))
+        response = yield self.download_request(request, Spider('foo'))
+        self.assertEqual(response.headers[b'Content-Encoding'], b'gzip')
+        self.assertEqual(zlib.decompress(response.body, 16 + zlib.MAX_WBITS),
+                         b"0123456789" * 10000)
+
+    @defer.inlineCallbacks
+    def test_download_decode_content_with_maxsize(self):
+        # the limit applies to the decoded body
+        request = Request(self.getURL('gzip'), meta={
+            'download_decode_content': True, 'download_maxsize': 50000})
+        d = self.download_request(request, Spider('foo'))
+        yield self.assertFailure(d, defer.CancelledError, error.ConnectionAborted)
+
+    @defer.inlineCallbacks
+    def test_download_decode_content_error(self):
+        request = Request(self.getURL('brokengzip'), meta={'download_decode_content': True})
+        d = self.download_request(request, Spider('foo'))
+        yield self.assertFailure(d, zlib.error)
+
+    @defer.inlineCallbacks
+    def test_download_with_bandwidth_limit(self):
+        crawler = get_crawler(settings_dict={'DOWNLOAD_BANDWIDTH_LIMIT': 512 * 1024})
+        handler = self.download_handler_cls.from_crawler(crawler)
+        request = Request(self.getURL('largechunkedfile'))
+        try:
+            response = yield handler.download_request(request, Spider('foo'))
+        finally:
+            yield handler.close()
+        self.assertEqual(len(response.body), 1024 * 1024)
+        stats = crawler.stats
+        self.assertEqual(stats.get_value('downloader/bandwidth/bytes'), 1024 * 1024)
+        self.assertGreater(stats.get_value('downloader/bandwidth/throttled_count'), 0)
+        self.assertGreater(stats.get_value('downloader/bandwidth/throttled_time'), 0.5)
+
+    @defer.inlineCallbacks
+    def test_download_with_body_consumer(self):
+        chunks = []
+
+        def consumer(response, chunk):
+            self.assertEqual(response.status, 200)
+            chunks.append(chunk)
+
+        request = Request(self.getURL('largechunkedfile'),
+                          meta={'body_consumer': consumer})
+        response = yield self.download_request(request, Spider('foo'))
+        self.assertIn('streamed', response.flags)
+        self.assertEqual(response.body, b'')
+        self.assertEqual(chunks[-1], b'')
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(len(b''.join(chunks)), 1024 * 1024)
+
+    @defer.inlineCallbacks
+    def test_download_with_body_consumer_decoded(self):
+        chunks = []
+        request = Request(self.getURL('gzip'), meta={
+            'body_consumer': lambda r, c: chunks.append(c),
+            'download_decode_content': True})
+        response = yield self.download_request(request, Spider('foo'))
+        self.assertIn('streamed', response.flags)
+        self.assertNotIn(b'Content-Encoding', response.headers)
+        self.assertEqual(b''.join(chunks), b"0123456789" * 10000)
+
+    @defer.inlineCallbacks
+    def test_download_with_body_consumer_broken(self):
+        # retrying would feed the consumer a second body
+        chunks = []
+        request = Request(self.getURL('broken'),
+                          meta={'body_consumer': lambda r, c: chunks.append(c)})
+        d = self.download_request(request, Spider('foo'))
+        yield self.assertFailure(d, ResponseFailed)
+        self.assertEqual(chunks, [b'partial'])
+        self.assertTrue(request.meta['dont_retry'])
+
+    @defer.inlineCallbacks
+    def test_download_with_body_consumer_not_found(self):
+        chunks = []
+        request = Request(self.getURL('notfound'),
+                          meta={'body_consumer': lambda r, c: chunks.append(c)})
+        response = yield self.download_request(request, Spider('foo'))
+        self.assertEqual(response.status, 404)
+        self.assertNotIn('streamed', response.flags)
+        self.assertTrue(response.body)
+        self.assertEqual(chunks, [])
+
     def test_download_chunked_content(self):
         request = Request(self.getURL('chunked'))
         d = self.download_request(request, Spider('foo'))
@@ -486,6 +766,224 @@ class Http11TestCase(HttpTestCase):
 class Https11TestCase(Http11TestCase):
     scheme = 'https'
 
+    @defer.inlineCallbacks
+    def test_tls_session_resumption(self):
+        crawler = get_crawler()
+        handler = self.download_handler_cls.from_crawler(crawler)
+        # the server closes the connection, so every request needs a handshake
+        request = Request(self.getURL('file'), headers={'Connection': 'close'})
+        try:
+            for _ in range(3):
+                response = yield handler.download_request(request, Spider('foo'))
+                self.assertEqual(response.body, b"0123456789")
+        finally:
+            yield handler.close()
+        cache = handler._contextFactory.tls_session_cache
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.counters['full_handshake'], 1)
+        self.assertEqual(cache.counters['resumed'], 2)
+        self.assertEqual(cache.counters['hit'], 2)
+        self.assertEqual(
+            crawler.stats.get_value('downloader/tls_session/resumed'), 2)
+
+    @defer.inlineCallbacks
+    def test_tls_session_cache_disabled(self):
+        handler = self.download_handler_cls(Settings({
+            'DOWNLOADER_CLIENT_TLS_SESSION_CACHE_SIZE': 0}))
+        request = Request(self.getURL('file'), headers={'Connection': 'close'})
+        try:
+            for _ in range(2):
+                yield handler.download_request(request, Spider('foo'))
+        finally:
+            yield handler.close()
+        self.assertIsNone(handler._contextFactory.tls_session_cache)
+
+
+class Https2TestCase(Https11TestCase):
+    """HTTP/2 test case, with a server which also accepts HTTP/1.1"""
+    download_handler_cls = H2DownloadHandler
+    acceptable_protocols = [b'h2', b'http/1.1']
+
+    def setUp(self):
+        from twisted.web.http import H2_ENABLED
+        if not H2_ENABLED:
+            raise unittest.SkipTest("HTTP/2 requires the h2 and priority libraries")
+        super(Https2TestCase, self).setUp()
+
+    @defer.inlineCallbacks
+    def test_connection_pool_counters(self):
+        crawler = get_crawler()
+        handler = self.download_handler_cls.from_crawler(crawler)
+        try:
+            responses = yield defer.gatherResults([
+                handler.download_request(Request(self.getURL('file')), Spider('foo'))
+                for _ in range(3)])
+        finally:
+            status = dict(handler._pool.status())
+            yield handler.close()
+        self.assertEqual([r.body for r in responses], [b"0123456789"] * 3)
+        counters = status['%s:%d' % (self.host, self.portno)]
+        self.assertEqual(counters['new'], 1)
+        self.assertEqual(counters['streams'], 0)
+        self.assertEqual(crawler.stats.get_value('downloader/h2/new'), 1)
+        self.assertIsNone(crawler.stats.get_value('downloader/pool/new'))
+
+    def test_set_max_per_host(self):
+        # HTTP/2 hosts get a single connection, the limit applies to the
+        # HTTP/1.1 fallback
+        handler = self.download_handler_cls(Settings({
+            'CONCURRENT_REQUESTS_PER_DOMAIN': 4}))
+        handler.set_max_per_host(16)
+        self.assertEqual(handler._http11._pool.maxPersistentPerHost, 16)
+        return handler.close()
+
+    @defer.inlineCallbacks
+    def test_concurrent_streams_limit(self):
+        # the server allows 100 concurrent streams, the rest wait in a queue
+        handler = self.download_handler_cls(Settings())
+        try:
+            responses = yield defer.gatherResults([
+                handler.download_request(Request(self.getURL('file')), Spider('foo'))
+                for _ in range(120)])
+        finally:
+            yield handler.close()
+        self.assertEqual(set(r.body for r in responses), set([b"0123456789"]))
+        self.assertEqual(len(self.wrapper.protocols), 0)
+        self.assertEqual(
+            dict(handler._pool.status())['%s:%d' % (self.host, self.portno)]['new'], 1)
+
+    @defer.inlineCallbacks
+    def test_http11_fallback(self):
+        # a server which doesn't negotiate HTTP/2
+        port = reactor.listenSSL(
+            0, self.wrapper, ssl_context_factory(self.keyfile, self.certfile),
+            interface=self.host)
+        self.addCleanup(port.stopListening)
+        url = self.getURL('file').replace(str(self.portno), str(port.getHost().port))
+        crawler = get_crawler()
+        handler = self.download_handler_cls.from_crawler(crawler)
+        try:
+            for _ in range(2):
+                response = yield handler.download_request(Request(url), Spider('foo'))
+                self.assertEqual(response.body, b"0123456789")
+        finally:
+            yield handler.close()
+        self.assertEqual(len(handler._pool.http11_hosts), 1)
+        self.assertEqual(crawler.stats.get_value('downloader/h2/http11_fallback'), 1)
+        self.assertEqual(crawler.stats.get_value('downloader/pool/new'), 1)
+
+    @defer.inlineCallbacks
+    def test_tls_session_resumption(self):
+        crawler = get_crawler()
+        handler = self.download_handler_cls.from_crawler(crawler)
+        request = Request(self.getURL('file'))
+        try:
+            for _ in range(3):
+                response = yield handler.download_request(request, Spider('foo'))
+                self.assertEqual(response.body, b"0123456789")
+                # HTTP/2 ignores "Connection: close", so close it here
+                yield handler._pool.close()
+        finally:
+            yield handler.close()
+        cache = handler._contextFactory.tls_session_cache
+        self.assertEqual(cache.counters['full_handshake'], 1)
+        self.assertEqual(cache.counters['resumed'], 2)
+        self.assertEqual(crawler.stats.get_value('downloader/h2/new'), 3)
+
+    def test_connection_pool_eviction_lru(self):
+        raise unittest.SkipTest("HTTP/2 keeps a single connection per host")
+
+    @defer.inlineCallbacks
+    def test_download_timings(self):
+        # streams share connections, so only their own phases are timed
+        handler = self.download_handler_cls(Settings())
+        request = Request(self.getURL('file'))
+        try:
+            yield handler.download_request(request, Spider('foo'))
+        finally:
+            yield handler.close()
+        self.assertEqual(sorted(request.meta['download_timings']),
+                         ['transfer', 'ttfb'])
+
+    def test_download_timings_without_dns_cache(self):
+        raise unittest.SkipTest("HTTP/2 downloads don't time DNS lookups")
+
+    def test_download_with_bandwidth_limit(self):
+        raise unittest.SkipTest("HTTP/2 downloads don't limit bandwidth")
+
+
+    test_connection_pool_eviction_mru = test_connection_pool_eviction_lru
+
+    def test_download_broken_chunked_content_cause_data_loss(self):
+        raise unittest.SkipTest("HTTP/2 has no chunked transfer encoding")
+
+    test_download_broken_chunked_content_allow_data_loss = \
+        test_download_broken_chunked_content_cause_data_loss
+    test_download_broken_chunked_content_allow_data_loss_via_setting = \
+        test_download_broken_chunked_content_cause_data_loss
+
+
+class H2ClientProtocolTest(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            from h2.config import H2Configuration
+            from h2.connection import H2Connection
+        except ImportError:
+            raise unittest.SkipTest("HTTP/2 requires the h2 library")
+        self.transport = proto_helpers.StringTransport()
+        self.transport.negotiatedProtocol = b'h2'
+        self.client = H2ClientProtocol(defer.Deferred())
+        self.client.pool = mock.Mock()
+        self.client.makeConnection(self.transport)
+        self.client.handshakeCompleted()
+        self.server = H2Connection(H2Configuration(client_side=False))
+        self.server.initiate_connection()
+
+    def _request(self):
+        stream = _H2Stream(Request('https://example.com/'), maxsize=0,
+                           warnsize=0, fail_on_dataloss=True)
+        self.client.request(stream)
+        return stream
+
+    def test_goaway_requeue(self):
+        # streams that the server didn't process are sent on a new connection
+        streams = [self._request() for _ in range(2)]
+        self.server.receive_data(self.transport.value())
+        self.server.close_connection(last_stream_id=1)
+        self.client.dataReceived(self.server.data_to_send())
+        self.client.pool.requeue.assert_called_once_with(None, [streams[1]])
+        self.assertEqual(self.client.streams, {1: streams[0]})
+        self.assertFalse(self.client.available)
+        self.assertFalse(self.transport.disconnecting)
+
+    def test_refused_stream_requeue(self):
+        from h2.errors import ErrorCodes
+        stream = self._request()
+        self.server.receive_data(self.transport.value())
+        self.server.reset_stream(1, ErrorCodes.REFUSED_STREAM)
+        self.client.dataReceived(self.server.data_to_send())
+        self.client.pool.requeue.assert_called_once_with(None, [stream])
+        self.assertIsNone(stream.stream_id)
+        self.assertTrue(self.client.available)
+
+
+class TLSSessionCacheTest(unittest.TestCase):
+
+    def test_eviction(self):
+        crawler = get_crawler()
+        cache = TLSSessionCache(maxsize=2, stats=crawler.stats)
+        cache.set(('a', 443), 'session-a')
+        cache.set(('b', 443), 'session-b')
+        self.assertEqual(cache.get(('a', 443)), 'session-a')
+        cache.set(('c', 443), 'session-c')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(('b', 443)))
+        self.assertEqual(cache.get(('c', 443)), 'session-c')
+        self.assertEqual(cache.counters['hit'], 2)
+        self.assertEqual(cache.counters['miss'], 1)
+        self.assertEqual(crawler.stats.get_value('downloader/tls_session/evicted'), 1)
+
 
 class Https11WrongHostnameTestCase(Http11TestCase):
     scheme = 'https'
@@ -563,6 +1061,14 @@ class Http11MockServerTestCase(unittest.TestCase):
             request.headers.setdefault(b'Accept-Encoding', b'gzip,deflate')
             request = request.replace(url=self.mockserver.url('/xpayload'))
             yield crawler.crawl(seed=request)
+            # the response is decoded as it is downloaded, and
+            # download_maxsize applies to the 100 decoded bytes
+            failure = crawler.spider.meta['failure']
+            self.assertIsInstance(failure.value, defer.CancelledError)
+
+            crawler = get_crawler(SingleRequestSpider)
+            request.meta['download_decode_content'] = False
+            yield crawler.crawl(seed=request)
             # download_maxsize = 50 is enough for the gzipped response
             failure = crawler.spider.meta.get('failure')
             self.assertTrue(failure == None)
@@ -662,6 +1168,14 @@ class Http11ProxyTestCase(HttpProxyTestCase):
         timeout = yield self.assertFailure(d, error.TimeoutError)
         self.assertIn(domain, timeout.osError)
 
+    @defer.inlineCallbacks
+    def test_download_timings_with_proxy(self):
+        request = Request('http://example.com', meta={'proxy': self.getURL('')})
+        yield self.download_request(request, Spider('foo'))
+        self.assertEqual(sorted(request.meta['download_timings']),
+                         ['transfer', 'ttfb'])
+        self.assertNotIn('download_connection_reused', request.meta)
+
 
 class HttpDownloadHandlerMock(object):
     def __init__(self, settings):
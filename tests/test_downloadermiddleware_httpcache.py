@@ -4,6 +4,7 @@ import tempfile
 import shutil
 import unittest
 import email.utils
+import hashlib
 from contextlib import contextmanager
 import pytest
 
@@ -11,10 +12,18 @@ from scrapy.http import Response, HtmlResponse, Request
 from scrapy.spiders import Spider
 from scrapy.settings import Settings
 from scrapy.exceptions import IgnoreRequest
+from scrapy.utils.python import to_bytes
+from scrapy.utils.request import RequestFingerprinter
 from scrapy.utils.test import get_crawler
 from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
 
 
+class URLFingerprinter(RequestFingerprinter):
+
+    def compute(self, request):
+        return hashlib.sha1(to_bytes(request.url)).hexdigest()
+
+
 class _BaseTest(unittest.TestCase):
 
     storage_class = 'scrapy.extensions.httpcache.DbmCacheStorage'
@@ -117,6 +126,22 @@ class DefaultStorageTest(_BaseTest):
             time.sleep(2)  # wait for cache to expire
             assert storage.retrieve_response(self.spider, request2) is None
 
+    def test_storage_fingerprinter(self):
+        settings = dict(self._get_settings(), REQUEST_FINGERPRINTER_CLASS=
+                        __name__ + '.URLFingerprinter')
+        crawler = get_crawler(Spider, settings)
+        mw = HttpCacheMiddleware.from_crawler(crawler)
+        self.assertIs(mw.storage.fingerprinter, crawler.request_fingerprinter)
+        mw.spider_opened(self.spider)
+        try:
+            mw.storage.store_response(self.spider, self.request, self.response)
+            # the fingerprinter only looks at URLs
+            request2 = self.request.replace(method='POST', body=b'body')
+            response2 = mw.storage.retrieve_response(self.spider, request2)
+            self.assertEqualResponse(self.response, response2)
+        finally:
+            mw.spider_closed(self.spider)
+
     def test_storage_never_expire(self):
         with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
             assert storage.retrieve_response(self.spider, self.request) is None
@@ -148,6 +173,28 @@ class FilesystemStorageTest(DefaultStorageTest):
 
     storage_class = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
 
+    def test_storage_spooled_body(self):
+        bodyfile = tempfile.TemporaryFile()
+        bodyfile.write(b'spooled body')
+        response = self.response.replace(bodyfile=bodyfile)
+        with self._storage(DOWNLOAD_SPOOLSIZE=10) as storage:
+            storage.store_response(self.spider, self.request, response)
+            response2 = storage.retrieve_response(self.spider, self.request)
+            self.assertEqual(response2.body, b'spooled body')
+            response3 = storage.retrieve_response(self.spider, self.request)
+            if storage.use_gzip:
+                self.assertIsNone(response3.bodyfile)
+                return
+            self.assertIsNotNone(response3.bodyfile)
+            # overwriting the entry does not affect served bodies
+            storage.store_response(self.spider, self.request, self.response)
+            self.assertEqual(response3.open_body().read(), b'spooled body')
+            response3.bodyfile.close()
+            response4 = storage.retrieve_response(self.spider, self.request)
+            self.assertIsNone(response4.bodyfile)
+            self.assertEqual(response4.body, b'test body')
+            response2.bodyfile.close()
+
 class FilesystemStorageGzipTest(FilesystemStorageTest):
 
     def _get_settings(self, **new_settings):
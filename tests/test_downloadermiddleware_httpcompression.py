@@ -57,6 +57,13 @@ class HttpCompressionTest(TestCase):
         self.mw.process_request(request, self.spider)
         self.assertEqual(request.headers.get('Accept-Encoding'),
                          b','.join(ACCEPTED_ENCODINGS))
+        self.assertTrue(request.meta['download_decode_content'])
+
+    def test_process_request_decode_content_set(self):
+        request = Request('http://scrapytest.org',
+                          meta={'download_decode_content': False})
+        self.mw.process_request(request, self.spider)
+        self.assertFalse(request.meta['download_decode_content'])
 
     def test_process_response_gzip(self):
         response = self._getresponse('gzip')
@@ -81,6 +88,21 @@ class HttpCompressionTest(TestCase):
         assert newresponse.body.startswith(b"<!DOCTYPE")
         assert 'Content-Encoding' not in newresponse.headers
 
+    def test_process_response_zstd(self):
+        try:
+            import zstandard
+        except ImportError:
+            raise SkipTest("no zstandard")
+        response = self._getresponse('gzip')
+        body = zstandard.ZstdCompressor().compress(gunzip(response.body))
+        response = response.replace(body=body)
+        response.headers['Content-Encoding'] = 'zstd'
+        newresponse = self.mw.process_response(response.request, response,
+                                               self.spider)
+        assert newresponse is not response
+        assert newresponse.body.startswith(b"<!DOCTYPE")
+        assert 'Content-Encoding' not in newresponse.headers
+
     def test_process_response_rawdeflate(self):
         response = self._getresponse('rawdeflate')
         request = response.request
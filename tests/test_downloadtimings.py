@@ -0,0 +1,109 @@
+from twisted.trial import unittest
+
+from scrapy.exceptions import NotConfigured
+from scrapy.extensions.downloadtimings import DownloadTimings, Histogram
+from scrapy.http import Request, Response
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertIsNone(Histogram().percentile(50))
+
+    def test_percentiles(self):
+        histogram = Histogram()
+        for ms in range(1, 1001):
+            histogram.add(ms / 1000.0)
+        self.assertEqual(histogram.count, 1000)
+        for q, expected in [(50, 0.5), (95, 0.95), (99, 0.99)]:
+            value = histogram.percentile(q)
+            self.assertTrue(expected <= value <= expected * 1.05,
+                            (q, value))
+        self.assertEqual(histogram.percentile(100), 1.0)
+
+    def test_small_values(self):
+        histogram = Histogram(minvalue=0.001)
+        histogram.add(0)
+        histogram.add(0.0005)
+        self.assertEqual(histogram.percentile(50), 0.0005)
+
+
+class DownloadTimingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.crawler = get_crawler(settings_dict={
+            'DOWNLOAD_TIMINGS_ENABLED': True,
+            'DOWNLOAD_TIMINGS_INTERVAL': 0,
+            'DOWNLOAD_TIMINGS_PERCENTILES': [50, 99.9],
+        })
+        self.spider = Spider('foo')
+        self.ext = DownloadTimings.from_crawler(self.crawler)
+        self.ext.spider_opened(self.spider)
+
+    def _downloaded(self, slot, latency, **timings):
+        request = Request('http://%s/' % slot, meta={
+            'download_slot': slot, 'download_latency': latency,
+            'download_timings': timings})
+        self.ext.response_downloaded(Response(request.url), request,
+                                     self.spider)
+
+    def test_not_configured(self):
+        self.assertRaises(NotConfigured, DownloadTimings.from_crawler,
+                          get_crawler())
+
+    def test_percentiles(self):
+        for _ in range(9):
+            self._downloaded('a.com', 0.1, ttfb=0.1, transfer=0.01)
+        self._downloaded('b.com', 2.0, connect=1.0, ttfb=1.0, transfer=0.01)
+        self.assertAlmostEqual(self.ext.percentile('latency', 50), 0.1, 2)
+        self.assertAlmostEqual(self.ext.percentile('latency', 99.9), 2.0, 2)
+        self.assertAlmostEqual(self.ext.percentile('ttfb', 50, 'b.com'), 1.0, 2)
+        self.assertIsNone(self.ext.percentile('connect', 50, 'a.com'))
+        self.assertIsNone(self.ext.percentile('tls', 50))
+
+        self.ext.spider_closed(self.spider)
+        stats = self.crawler.stats.get_stats()
+        self.assertAlmostEqual(stats['download_timings/latency/p50'], 0.1, 2)
+        self.assertAlmostEqual(stats['download_timings/latency/p99.9'], 2.0, 2)
+        self.assertAlmostEqual(
+            stats['download_timings/slots/b.com/connect/p50'], 1.0, 2)
+        self.assertNotIn('download_timings/slots/a.com/connect/p50', stats)
+
+    def test_not_per_slot(self):
+        self.ext.per_slot = False
+        self._downloaded('a.com', 0.1, ttfb=0.1)
+        self.ext.spider_closed(self.spider)
+        stats = self.crawler.stats.get_stats()
+        self.assertIn('download_timings/ttfb/p50', stats)
+        self.assertFalse([k for k in stats if '/slots/' in k])
+
+    def test_max_slots(self):
+        self.ext.max_slots = 2
+        self._downloaded('a.com', 0.1)
+        self._downloaded('b.com', 0.2)
+        self.ext.update_stats(self.spider)
+        # a.com is the most recently downloaded slot, b.com is evicted
+        self._downloaded('a.com', 0.1)
+        self._downloaded('c.com', 0.3)
+        self.assertEqual(list(self.ext.slot_histograms), ['a.com', 'c.com'])
+        self.assertIsNone(self.ext.percentile('latency', 50, 'b.com'))
+        self.assertAlmostEqual(self.ext.percentile('latency', 99.9), 0.3, 2)
+
+        self.ext.spider_closed(self.spider)
+        stats = self.crawler.stats.get_stats()
+        self.assertEqual(
+            sorted(k for k in stats if '/slots/' in k),
+            ['download_timings/slots/a.com/latency/p50',
+             'download_timings/slots/a.com/latency/p99.9',
+             'download_timings/slots/c.com/latency/p50',
+             'download_timings/slots/c.com/latency/p99.9'])
+        self.assertIn('download_timings/latency/p50', stats)
+
+    def test_without_timings(self):
+        request = Request('http://a.com/', meta={'download_slot': 'a.com'})
+        self.ext.response_downloaded(Response(request.url), request, self.spider)
+        self.ext.spider_closed(self.spider)
+        self.assertFalse([k for k in self.crawler.stats.get_stats()
+                          if k.startswith('download_timings/')])
@@ -1,10 +1,16 @@
+import os
 import hashlib
 import tempfile
 import unittest
 import shutil
 
-from scrapy.dupefilters import RFPDupeFilter
+from twisted.internet import defer
+from twisted.trial import unittest as trial_unittest
+
+from scrapy.dupefilters import RFPDupeFilter, BloomDupeFilter, ScalableBloomFilter
+from scrapy.dupefilters import CompactRFPDupeFilter, TieredDupeFilter
 from scrapy.http import Request
+from scrapy.spiders import Spider
 from scrapy.core.scheduler import Scheduler
 from scrapy.utils.python import to_bytes
 from scrapy.utils.job import job_dir
@@ -96,6 +102,34 @@ class RFPDupeFilterTest(unittest.TestCase):
         finally:
             shutil.rmtree(path)
 
+    def test_dupefilter_checkpoint(self):
+        r1 = Request('http://scrapytest.org/1')
+        r2 = Request('http://scrapytest.org/2')
+
+        path = tempfile.mkdtemp()
+        try:
+            df = RFPDupeFilter(path)
+            df.open()
+            assert not df.request_seen(r1)
+            df.checkpoint()
+            assert not df.request_seen(r2)
+            df.file.flush()  # "crash" without closing
+
+            # r2 was seen after the last checkpoint
+            df2 = RFPDupeFilter(path)
+            df2.open()
+            assert df2.request_seen(r1)
+            assert not df2.request_seen(r2)
+            df2.close('finished')
+            df.file.close()
+
+            df3 = RFPDupeFilter(path)
+            df3.open()
+            assert df3.request_seen(r2)
+            df3.close('finished')
+        finally:
+            shutil.rmtree(path)
+
     def test_request_fingerprint(self):
         """Test if customization of request_fingerprint method will change
         output of request_seen.
@@ -126,3 +160,282 @@ class RFPDupeFilterTest(unittest.TestCase):
         assert case_insensitive_dupefilter.request_seen(r2)
 
         case_insensitive_dupefilter.close('finished')
+
+
+class ScalableBloomFilterTest(unittest.TestCase):
+
+    def test_add(self):
+        bloom = ScalableBloomFilter(capacity=100, error_rate=0.01)
+        self.assertFalse(bloom.add('a'))
+        self.assertTrue(bloom.add('a'))
+        self.assertIn('a', bloom)
+        self.assertNotIn('b', bloom)
+        self.assertEqual(len(bloom), 1)
+        bloom.close()
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, ScalableBloomFilter, capacity=0)
+        self.assertRaises(ValueError, ScalableBloomFilter, error_rate=1)
+        self.assertRaises(ValueError, ScalableBloomFilter, growth=0)
+
+    def test_growth_and_error_rate(self):
+        bloom = ScalableBloomFilter(capacity=1000, error_rate=0.01, growth=2)
+        keys = ['key%d' % i for i in range(10000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertEqual(len(bloom.filters), 4)
+        self.assertEqual([f.capacity for f in bloom.filters],
+                         [1000, 2000, 4000, 8000])
+        self.assertTrue(all(key in bloom for key in keys))
+        self.assertLess(bloom.error_rate, 0.01)
+        false_positives = sum('other%d' % i in bloom for i in range(10000))
+        self.assertLess(false_positives, 200)
+        bloom.close()
+
+    def test_persistence(self):
+        path = tempfile.mkdtemp()
+        try:
+            bloom = ScalableBloomFilter(path, capacity=10, error_rate=0.01)
+            for i in range(15):
+                bloom.add('key%d' % i)
+            bloom.close()
+            self.assertEqual(sorted(os.listdir(path)), ['filter0', 'filter1'])
+
+            # the parameters of an existing filter are kept
+            bloom = ScalableBloomFilter(path, capacity=1000, error_rate=0.1)
+            self.assertEqual(len(bloom), 15)
+            self.assertEqual(bloom.filters[0].capacity, 10)
+            self.assertTrue(all('key%d' % i in bloom for i in range(15)))
+            bloom.close()
+        finally:
+            shutil.rmtree(path)
+
+
+class BloomDupeFilterTest(unittest.TestCase):
+
+    def test_filter(self):
+        dupefilter = BloomDupeFilter()
+        dupefilter.open()
+        r1 = Request('http://scrapytest.org/1')
+        r2 = Request('http://scrapytest.org/2')
+        assert not dupefilter.request_seen(r1)
+        assert dupefilter.request_seen(r1)
+        assert not dupefilter.request_seen(r2)
+        dupefilter.close('finished')
+
+    def test_dupefilter_path(self):
+        r1 = Request('http://scrapytest.org/1')
+        r2 = Request('http://scrapytest.org/2')
+        path = tempfile.mkdtemp()
+        try:
+            df = BloomDupeFilter(path)
+            df.open()
+            assert not df.request_seen(r1)
+            df.close('finished')
+            assert os.path.isdir(os.path.join(path, 'requests.bloom'))
+
+            df2 = BloomDupeFilter(path)
+            df2.open()
+            assert df2.request_seen(r1)
+            assert not df2.request_seen(r2)
+            df2.close('finished')
+        finally:
+            shutil.rmtree(path)
+
+    def test_stats(self):
+        settings = {'DUPEFILTER_CLASS': 'scrapy.dupefilters.BloomDupeFilter',
+                    'DUPEFILTER_BLOOM_CAPACITY': 2}
+        crawler = get_crawler(settings_dict=settings)
+        scheduler = Scheduler.from_crawler(crawler)
+        df = scheduler.df
+        self.assertIsInstance(df, BloomDupeFilter)
+        df.open()
+        stats = crawler.stats
+        self.assertEqual(stats.get_value('dupefilter/bloom/filters'), 1)
+        for i in range(3):
+            df.request_seen(Request('http://scrapytest.org/%d' % i))
+        self.assertEqual(stats.get_value('dupefilter/bloom/filters'), 2)
+        df.close('finished')
+        self.assertEqual(stats.get_value('dupefilter/bloom/fingerprints'), 3)
+        self.assertGreater(stats.get_value('dupefilter/bloom/fill_ratio'), 0)
+        self.assertLess(stats.get_value('dupefilter/bloom/error_rate'), 0.001)
+
+
+class CompactRFPDupeFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_filter(self):
+        dupefilter = CompactRFPDupeFilter()
+        dupefilter.open()
+        r1 = Request('http://scrapytest.org/1')
+        r2 = Request('http://scrapytest.org/2')
+        assert not dupefilter.request_seen(r1)
+        assert dupefilter.request_seen(r1)
+        assert not dupefilter.request_seen(r2)
+        assert dupefilter.request_seen(Request('http://scrapytest.org/2'))
+        dupefilter.close('finished')
+
+    def test_invalid_digest_size(self):
+        self.assertRaises(ValueError, CompactRFPDupeFilter, digest_size=4)
+
+    def test_growth(self):
+        dupefilter = CompactRFPDupeFilter(self.path)
+        requests = [Request('http://scrapytest.org/%d' % i) for i in range(2000)]
+        for request in requests:
+            assert not dupefilter.request_seen(request)
+        self.assertGreater(dupefilter.digests.capacity, 1024)
+        self.assertTrue(all(dupefilter.request_seen(r) for r in requests))
+        dupefilter.close('finished')
+
+        dupefilter = CompactRFPDupeFilter(self.path)
+        self.assertEqual(len(dupefilter.digests), 2000)
+        self.assertTrue(all(dupefilter.request_seen(r) for r in requests))
+        dupefilter.close('finished')
+
+    def test_dupefilter_path(self):
+        r1 = Request('http://scrapytest.org/1')
+        r2 = Request('http://scrapytest.org/2')
+        df = CompactRFPDupeFilter(self.path, digest_size=8)
+        df.open()
+        assert not df.request_seen(r1)
+        df.close('finished')
+        logpath = os.path.join(self.path, 'requests.seen.bin')
+        self.assertEqual(os.path.getsize(logpath), 5 + 8)
+
+        # the digest size of an existing file is kept
+        df = CompactRFPDupeFilter(self.path, digest_size=20)
+        self.assertEqual(df.digest_size, 8)
+        assert df.request_seen(r1)
+        assert not df.request_seen(r2)
+        df.close('finished')
+
+    def test_rebuild_index(self):
+        r1 = Request('http://scrapytest.org/1')
+        r2 = Request('http://scrapytest.org/2')
+        df = CompactRFPDupeFilter(self.path)
+        assert not df.request_seen(r1)
+        df.checkpoint()
+        assert not df.request_seen(r2)
+        self.assertTrue(df.digests.dirty)
+        df.file.flush()  # "crash" without closing
+
+        df2 = CompactRFPDupeFilter(self.path)
+        assert df2.request_seen(r1)
+        assert not df2.request_seen(r2)
+        df2.close('finished')
+        df.file.close()
+
+    def test_migrate_text_file(self):
+        r1 = Request('http://scrapytest.org/1')
+        r2 = Request('http://scrapytest.org/2')
+        df = RFPDupeFilter(self.path)
+        assert not df.request_seen(r1)
+        df.close('finished')
+
+        df = CompactRFPDupeFilter(self.path)
+        assert df.request_seen(r1)
+        assert not df.request_seen(r2)
+        df.close('finished')
+
+
+class TieredDupeFilterTest(trial_unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _requests(self, start, stop):
+        return [Request('http://scrapytest.org/%d' % i)
+                for i in range(start, stop)]
+
+    @defer.inlineCallbacks
+    def _wait_idle(self, df):
+        while df.pending:
+            yield df._wait_pending()
+
+    @defer.inlineCallbacks
+    def test_filter(self):
+        df = TieredDupeFilter(max_memory=5, fanout=2)
+        yield df.open()
+        tmpdir = df.path
+        requests = self._requests(0, 40)
+        for request in requests:
+            assert not df.request_seen(request)
+            yield self._wait_idle(df)
+        self.assertTrue(all(df.request_seen(r) for r in requests))
+        # 8 runs of 5 fingerprints merged into a single one
+        self.assertEqual([(r.level, r.count) for r in df.runs], [(3, 40)])
+        self.assertEqual(len(df.hot), 0)
+        yield df.close('finished')
+        self.assertFalse(os.path.exists(tmpdir))
+
+    @defer.inlineCallbacks
+    def test_lookups_during_flush(self):
+        df = TieredDupeFilter(max_memory=3)
+        yield df.open()
+        requests = self._requests(0, 10)
+        for request in requests:
+            assert not df.request_seen(request)
+        self.assertTrue(all(df.request_seen(r) for r in requests))
+        yield df.close('finished')
+
+    @defer.inlineCallbacks
+    def test_resume(self):
+        df = TieredDupeFilter(self.path, max_memory=4, fanout=2)
+        yield df.open()
+        requests = self._requests(0, 10)
+        for request in requests:
+            df.request_seen(request)
+            yield self._wait_idle(df)
+        self.assertEqual(len(df.hot), 2)
+        yield df.close('finished')
+
+        df = TieredDupeFilter(self.path, max_memory=4, fanout=2)
+        yield df.open()
+        self.assertEqual(len(df.hot), 2)
+        self.assertTrue(all(df.request_seen(r) for r in requests))
+        assert not df.request_seen(Request('http://scrapytest.org/new'))
+        yield df.close('finished')
+
+    @defer.inlineCallbacks
+    def test_resume_from_checkpoint(self):
+        r1, r2 = self._requests(0, 2)
+        df = TieredDupeFilter(self.path)
+        yield df.open()
+        assert not df.request_seen(r1)
+        df.checkpoint()
+        assert not df.request_seen(r2)
+        df.hotlog.flush()  # "crash" without closing
+
+        df2 = TieredDupeFilter(self.path)
+        yield df2.open()
+        assert df2.request_seen(r1)
+        assert not df2.request_seen(r2)
+        yield df2.close('finished')
+        df.hotlog.close()
+
+    @defer.inlineCallbacks
+    def _scheduler_duplicate(self, settings):
+        settings['DUPEFILTER_CLASS'] = 'scrapy.dupefilters.TieredDupeFilter'
+        crawler = get_crawler(settings_dict=settings)
+        scheduler = Scheduler.from_crawler(crawler)
+        yield scheduler.open(Spider.from_crawler(crawler, 'foo'))
+        request = Request('http://scrapytest.org/1')
+        self.assertTrue(scheduler.enqueue_request(request))
+        self.assertFalse(scheduler.enqueue_request(request.copy()))
+        self.assertEqual(crawler.stats.get_value('dupefilter/filtered'), 1)
+        yield scheduler.close('finished')
+
+    def test_scheduler_duplicate(self):
+        return self._scheduler_duplicate({})
+
+    def test_scheduler_duplicate_jobdir(self):
+        return self._scheduler_duplicate({
+            'JOBDIR': self.path, 'SCHEDULER_CHECKPOINT_INTERVAL': 0})
@@ -274,6 +274,24 @@ class EngineTest(unittest.TestCase):
         self.assertEqual({'spider': self.run.spider, 'reason': 'finished'},
                          self.run.signals_catched[signals.spider_closed])
 
+    @defer.inlineCallbacks
+    def test_next_requests_backout(self):
+        e = ExecutionEngine(get_crawler(TestSpider), lambda _: None)
+        spider = TestSpider()
+        yield e.open_spider(spider, [], close_if_idle=False)
+        scheduler = e.slot.scheduler
+        for i in range(5):
+            scheduler.enqueue_request(Request('http://example.com/%d' % i))
+        downloaded = []
+        e._download_scheduled = lambda request, spider: downloaded.append(request)
+        e._needs_backout = lambda spider: len(downloaded) >= 2
+        self.assertEqual(e._next_requests_from_scheduler(spider), 2)
+        self.assertEqual(len(downloaded), 2)
+        self.assertEqual(len(scheduler), 3)
+        self.assertEqual(
+            e.crawler.stats.get_value('scheduler/dequeued', spider=spider), 2)
+        yield e.close()
+
     @defer.inlineCallbacks
     def test_close_downloader(self):
         e = ExecutionEngine(get_crawler(TestSpider), lambda _: None)
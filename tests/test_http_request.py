@@ -231,6 +231,16 @@ class RequestTest(unittest.TestCase):
         self.assertEqual(r4.meta, {})
         assert r4.dont_filter is False
 
+    def test_replace_fingerprints(self):
+        r1 = self.request_class("http://www.example.com")
+        r1._fingerprints = {None: 'fp'}
+        self.assertEqual(r1.copy()._fingerprints, {None: 'fp'})
+        self.assertEqual(r1.replace(priority=1)._fingerprints, {None: 'fp'})
+        self.assertIsNot(r1.copy()._fingerprints, r1._fingerprints)
+        self.assertIsNone(r1.replace(url="http://www.example.com/2")._fingerprints)
+        self.assertIsNone(r1.replace(body=b'body')._fingerprints)
+        self.assertIsNone(r1.replace(headers={'A': 'b'})._fingerprints)
+
     def test_method_always_str(self):
         r = self.request_class("http://www.example.com", method=u"POST")
         assert isinstance(r.method, str)
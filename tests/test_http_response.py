@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import tempfile
 import unittest
 
 import six
@@ -102,6 +103,28 @@ class BaseResponseTest(unittest.TestCase):
         self.assertEqual(r4.body, b'')
         self.assertEqual(r4.flags, [])
 
+    def test_bodyfile(self):
+        bodyfile = tempfile.TemporaryFile()
+        bodyfile.write(b"spooled body")
+        r1 = self.response_class("http://www.example.com", bodyfile=bodyfile)
+        self.assertIs(r1.bodyfile, bodyfile)
+        self.assertIsNone(r1._body)
+        with r1.open_body() as body:
+            self.assertEqual(body.read(), b"spooled body")
+            body.seek(0)
+            self.assertEqual(body.read(7), b"spooled")
+            self.assertEqual(body.read(), b" body")
+        self.assertTrue(body.closed)
+        self.assertIsNone(r1._body)
+
+        r2 = r1.replace(status=404)
+        self.assertIs(r2.bodyfile, bodyfile)
+        self.assertEqual(r2.body, b"spooled body")
+
+        r3 = r1.replace(body=b"new body")
+        self.assertIsNone(r3.bodyfile)
+        self.assertEqual(r3.open_body().read(), b"new body")
+
     def _assert_response_values(self, response, encoding, body):
         if isinstance(body, six.text_type):
             body_unicode = body
@@ -8,10 +8,11 @@ from twisted.internet.defer import Deferred, inlineCallbacks
 from scrapy.http import Request, Response
 from scrapy.settings import Settings
 from scrapy.spiders import Spider
-from scrapy.utils.request import request_fingerprint
+from scrapy.utils.request import RequestFingerprinter, request_fingerprint
 from scrapy.pipelines.media import MediaPipeline
 from scrapy.utils.log import failure_to_exc_info
 from scrapy.utils.signal import disconnect_all
+from scrapy.utils.test import get_crawler
 from scrapy import signals
 
 
@@ -259,6 +260,26 @@ class MediaPipelineTestCase(BaseMediaPipelineTestCase):
                 ['get_media_requests', 'media_to_download', 'item_completed'])
 
 
+    @inlineCallbacks
+    def test_crawler_fingerprinter(self):
+        crawler = get_crawler(settings_dict={
+            'REQUEST_FINGERPRINTER_CLASS': __name__ + '.URLFingerprinter'})
+        pipe = self.pipeline_class.from_crawler(crawler)
+        pipe.download_func = _mocked_download_func
+        pipe.open_spider(self.spider)
+        self.assertIs(pipe.fingerprinter, crawler.request_fingerprinter)
+        req = Request('http://url', method='POST')
+        item = dict(requests=req)
+        yield pipe.process_item(item, self.spider)
+        assert 'http://url' in pipe.spiderinfo.downloaded
+
+
+class URLFingerprinter(RequestFingerprinter):
+
+    def compute(self, request):
+        return request.url
+
+
 class MediaPipelineAllowRedirectSettingsTestCase(unittest.TestCase):
 
     def _assert_request_no3xx(self, pipeline_class, settings):
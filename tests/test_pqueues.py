@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from scrapy.pqueues import BucketPriorityQueue, LogBucketPriorityQueue
+from scrapy.settings import Settings
+from scrapy.squeues import FifoMemoryQueue, PickleFifoDiskQueue
+
+
+def _memory_queue(priority):
+    return FifoMemoryQueue()
+
+
+class BucketPriorityQueueTest(unittest.TestCase):
+
+    def test_bucket(self):
+        q = BucketPriorityQueue(_memory_queue, buckets=4, minprio=-100,
+                                maxprio=99)
+        self.assertEqual(q.bucket(-1000), 0)
+        self.assertEqual(q.bucket(-100), 0)
+        self.assertEqual(q.bucket(-51), 0)
+        self.assertEqual(q.bucket(-50), 1)
+        self.assertEqual(q.bucket(0), 2)
+        self.assertEqual(q.bucket(99), 3)
+        self.assertEqual(q.bucket(1000), 3)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, BucketPriorityQueue, _memory_queue,
+                          buckets=0)
+        self.assertRaises(ValueError, BucketPriorityQueue, _memory_queue,
+                          minprio=10, maxprio=10)
+
+    def test_push_pop(self):
+        q = BucketPriorityQueue(_memory_queue, buckets=2, minprio=-10,
+                                maxprio=9)
+        q.push('low1', 5)
+        q.push('high1', -5)
+        q.push('low2', 1)
+        q.push('high2', -1000)
+        self.assertEqual(len(q.queues), 2)
+        self.assertEqual([q.pop() for _ in range(len(q))],
+                         ['high1', 'high2', 'low1', 'low2'])
+        self.assertIsNone(q.pop())
+
+    def test_from_settings(self):
+        settings = Settings({'SCHEDULER_PRIORITY_BUCKETS': 3,
+                             'SCHEDULER_PRIORITY_BUCKET_RANGE': '0,10'})
+        q = BucketPriorityQueue.from_settings(settings, _memory_queue)
+        self.assertEqual((q.buckets, q.minprio, q.maxprio), (3, -10, 0))
+
+    def test_disk_queue_files(self):
+        qdir = tempfile.mkdtemp()
+        try:
+            def qfactory(priority):
+                return PickleFifoDiskQueue(os.path.join(qdir, 'p%s' % priority))
+            q = BucketPriorityQueue(qfactory, buckets=4)
+            for priority in range(-1000, 1000, 7):
+                q.push(priority, priority)
+            self.assertEqual(len(os.listdir(qdir)), 4)
+            startprios = q.close()
+
+            q = BucketPriorityQueue(qfactory, startprios=startprios, buckets=4)
+            self.assertEqual(q.pop(), -1000)
+            q.close()
+        finally:
+            shutil.rmtree(qdir)
+
+
+class LogBucketPriorityQueueTest(unittest.TestCase):
+
+    def test_bucket(self):
+        bucket = LogBucketPriorityQueue.bucket
+        self.assertEqual([bucket(p) for p in [0, 1, 2, 3, 4, 7, 8, 1000]],
+                         [0, 1, 2, 2, 3, 3, 4, 10])
+        self.assertEqual([bucket(p) for p in [-1, -2, -3, -4, -1000]],
+                         [-1, -2, -2, -3, -10])
+
+    def test_push_pop(self):
+        q = LogBucketPriorityQueue(_memory_queue)
+        for priority in [5, -3, 6, 0, -2, 100]:
+            q.push(priority, priority)
+        self.assertEqual([q.pop() for _ in range(len(q))],
+                         [-3, -2, 0, 5, 6, 100])
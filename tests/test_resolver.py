@@ -0,0 +1,156 @@
+from time import time
+
+from twisted.internet import defer, reactor
+from twisted.internet.error import DNSLookupError
+from twisted.names import dns, error, server
+from twisted.names.common import ResolverBase
+from twisted.trial import unittest
+
+from scrapy.extensions.dns import DNSPrefetch, DNSStats
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Request
+from scrapy.resolver import CachingAsyncResolver, dnscache
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+from tests import mock
+
+
+class StubResolver(ResolverBase):
+    """Answer A queries from a dict of records, counting the queries"""
+
+    def __init__(self, records):
+        ResolverBase.__init__(self)
+        self.records = records
+        self.queries = []
+
+    def _lookup(self, name, cls, type, timeout):
+        name = name.decode('ascii') if isinstance(name, bytes) else name
+        self.queries.append(name)
+        if name not in self.records:
+            return defer.fail(error.DomainError(name))
+        return defer.succeed((self.records[name], [], []))
+
+
+def a_record(name, address, ttl=300):
+    return dns.RRHeader(name, dns.A, ttl=ttl, payload=dns.Record_A(address, ttl))
+
+
+def cname_record(name, alias, ttl=300):
+    return dns.RRHeader(name, dns.CNAME, ttl=ttl,
+                        payload=dns.Record_CNAME(alias, ttl))
+
+
+class CachingAsyncResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, dnscache, 'limit', dnscache.limit)
+        self.stub = StubResolver({
+            'example.test': [a_record('example.test', '10.0.0.1')],
+            'www.example.test': [cname_record('www.example.test', 'example.test'),
+                                 a_record('example.test', '10.0.0.1', ttl=30)],
+            'nottl.example.test': [a_record('nottl.example.test', '10.0.0.2', ttl=0)],
+        })
+        factory = server.DNSServerFactory(clients=[self.stub])
+        self.port = reactor.listenUDP(0, dns.DNSDatagramProtocol(factory),
+                                      interface='127.0.0.1')
+        self.resolver = CachingAsyncResolver(
+            reactor, cache_size=100, timeout=5,
+            servers=[('127.0.0.1', self.port.getHost().port)],
+            negative_ttl=60)
+
+    def tearDown(self):
+        dnscache.clear()
+        return self.port.stopListening()
+
+    @defer.inlineCallbacks
+    def test_ttl(self):
+        address = yield self.resolver.getHostByName('example.test')
+        self.assertEqual(address, '10.0.0.1')
+        address = yield self.resolver.getHostByName('example.test')
+        self.assertEqual(address, '10.0.0.1')
+        self.assertEqual(self.stub.queries, ['example.test'])
+        self.assertEqual(self.resolver.stats['hit'], 1)
+        expires = self.resolver._cache['example.test'][0]
+        self.assertTrue(295 < expires - time() <= 300)
+        self.assertEqual(dnscache['example.test'], '10.0.0.1')
+
+        # records without TTL are not cached
+        for _ in range(2):
+            address = yield self.resolver.getHostByName('nottl.example.test')
+            self.assertEqual(address, '10.0.0.2')
+        self.assertEqual(self.stub.queries.count('nottl.example.test'), 2)
+
+    @defer.inlineCallbacks
+    def test_cname(self):
+        address = yield self.resolver.getHostByName('www.example.test')
+        self.assertEqual(address, '10.0.0.1')
+        expires = self.resolver._cache['www.example.test'][0]
+        self.assertTrue(25 < expires - time() <= 30)
+
+    @defer.inlineCallbacks
+    def test_negative_cache(self):
+        for _ in range(2):
+            yield self.assertFailure(
+                self.resolver.getHostByName('missing.example.test'),
+                DNSLookupError)
+        self.assertEqual(self.stub.queries, ['missing.example.test'])
+        self.assertEqual(self.resolver.stats['negative_hit'], 1)
+        self.assertNotIn('missing.example.test', dnscache)
+
+    @defer.inlineCallbacks
+    def test_collapse_concurrent_lookups(self):
+        results = yield defer.gatherResults([
+            self.resolver.getHostByName('example.test') for _ in range(3)])
+        self.assertEqual(results, ['10.0.0.1'] * 3)
+        self.assertEqual(self.stub.queries, ['example.test'])
+        self.assertEqual(self.resolver.stats['collapsed'], 2)
+
+    @defer.inlineCallbacks
+    def test_prefetch(self):
+        self.resolver.prefetch('example.test')
+        self.resolver.prefetch('example.test')
+        address = yield self.resolver.getHostByName('example.test')
+        self.assertEqual(address, '10.0.0.1')
+        self.assertEqual(self.stub.queries, ['example.test'])
+        self.assertEqual(self.resolver.stats['prefetch'], 1)
+
+    @defer.inlineCallbacks
+    def test_ip_address(self):
+        address = yield self.resolver.getHostByName('127.0.0.1')
+        self.assertEqual(address, '127.0.0.1')
+        self.assertEqual(self.stub.queries, [])
+
+    @defer.inlineCallbacks
+    def test_cache_disabled(self):
+        resolver = CachingAsyncResolver(
+            reactor, cache_size=0, timeout=5,
+            servers=[('127.0.0.1', self.port.getHost().port)])
+        for _ in range(2):
+            address = yield resolver.getHostByName('example.test')
+            self.assertEqual(address, '10.0.0.1')
+        self.assertEqual(self.stub.queries, ['example.test'] * 2)
+
+    @defer.inlineCallbacks
+    def test_extensions(self):
+        crawler = get_crawler(settings_dict={'DNS_PREFETCH': True})
+        spider = Spider('foo')
+        prefetch = DNSPrefetch.from_crawler(crawler)
+        stats = DNSStats.from_crawler(crawler)
+        self.resolver.stats['lookup'] = 10  # before the spider was opened
+        with mock.patch.object(reactor, 'resolver', self.resolver, create=True):
+            stats.spider_opened(spider)
+            prefetch.request_scheduled(Request('http://example.test/'), spider)
+            prefetch.request_scheduled(Request('http://other.test/',
+                                               meta={'proxy': 'http://proxy.test'}),
+                                       spider)
+            address = yield self.resolver.getHostByName('example.test')
+            self.assertEqual(address, '10.0.0.1')
+            stats.spider_closed(spider)
+        self.assertEqual(self.stub.queries, ['example.test'])
+        self.assertEqual(crawler.stats.get_value('dns/lookup'), 1)
+        self.assertEqual(crawler.stats.get_value('dns/prefetch'), 1)
+        self.assertEqual(crawler.stats.get_value('dns/collapsed'), 1)
+        self.assertTrue(crawler.stats.get_value('dns/latency/max') > 0)
+
+    def test_prefetch_disabled(self):
+        self.assertRaises(NotConfigured, DNSPrefetch.from_crawler, get_crawler())
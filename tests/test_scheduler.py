@@ -0,0 +1,321 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from scrapy.core.downloader import Slot
+from scrapy.core.scheduler import Scheduler
+from scrapy.http import Request
+from scrapy.pqueues import DownloaderAwarePriorityQueue
+from scrapy.spiders import Spider
+from scrapy.squeues import FifoMemoryQueue
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.test import get_crawler
+
+
+class MockDownloader(object):
+
+    def __init__(self):
+        self.slots = {}
+
+    def _get_slot_key(self, request, spider):
+        if 'download_slot' in request.meta:
+            return request.meta['download_slot']
+        return urlparse_cached(request).hostname or ''
+
+    def increment(self, slot_key):
+        slot = self.slots.setdefault(slot_key, Slot(8, 0, False))
+        slot.active.add(object())
+
+
+class MockEngine(object):
+
+    def __init__(self, downloader):
+        self.downloader = downloader
+
+
+def _memory_queue(priority, slot):
+    return FifoMemoryQueue()
+
+
+def _get_crawler(settings_dict):
+    crawler = get_crawler(Spider, settings_dict)
+    crawler.engine = MockEngine(MockDownloader())
+    return crawler
+
+
+class DownloaderAwarePriorityQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.downloader = MockDownloader()
+        self.queue = DownloaderAwarePriorityQueue(_memory_queue,
+                                                  downloader=self.downloader)
+
+    def _push(self, url, priority=0, **kw):
+        self.queue.push(Request(url, priority=priority, **kw), -priority)
+
+    def _pop_urls(self):
+        urls = []
+        while self.queue:
+            urls.append(self.queue.pop().url)
+        return urls
+
+    def test_requires_downloader(self):
+        self.assertRaises(ValueError, DownloaderAwarePriorityQueue,
+                          _memory_queue)
+
+    def test_prefers_least_active_slot(self):
+        self._push('http://a.example/1')
+        self._push('http://a.example/2')
+        self._push('http://b.example/1')
+        self._push('http://c.example/1')
+        self.downloader.increment('a.example')
+        self.downloader.increment('a.example')
+        self.downloader.increment('b.example')
+        self.assertEqual(len(self.queue), 4)
+        self.assertEqual(self._pop_urls(), [
+            'http://c.example/1',
+            'http://b.example/1',
+            'http://a.example/1',
+            'http://a.example/2',
+        ])
+        self.assertIsNone(self.queue.pop())
+
+    def test_priority_within_slot_and_ties(self):
+        self._push('http://a.example/low', priority=0)
+        self._push('http://a.example/high', priority=10)
+        self._push('http://b.example/mid', priority=5)
+        self.assertEqual(self._pop_urls(), [
+            'http://a.example/high',
+            'http://b.example/mid',
+            'http://a.example/low',
+        ])
+
+    def test_download_slot_meta(self):
+        self._push('http://a.example/1', meta={'download_slot': 'shared'})
+        self._push('http://b.example/1', meta={'download_slot': 'shared'})
+        self.assertEqual(list(self.queue.pqueues), ['shared'])
+
+    def test_incompatible_startprios(self):
+        self.assertRaises(ValueError, DownloaderAwarePriorityQueue,
+                          _memory_queue, startprios=[0, 1],
+                          downloader=self.downloader)
+
+
+class DownloaderAwareSchedulerTest(unittest.TestCase):
+
+    priority_queue_cls = 'scrapy.pqueues.DownloaderAwarePriorityQueue'
+
+    def setUp(self):
+        self.jobdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.jobdir)
+
+    def _scheduler(self, jobdir=None):
+        settings = {'SCHEDULER_PRIORITY_QUEUE': self.priority_queue_cls}
+        if jobdir:
+            settings['JOBDIR'] = jobdir
+        crawler = _get_crawler(settings)
+        scheduler = Scheduler.from_crawler(crawler)
+        scheduler.open(Spider(name='spider'))
+        return scheduler
+
+    def _enqueue_and_drain(self, scheduler, downloader):
+        for url in ['http://a.example/1', 'http://a.example/2',
+                    'http://b.example/1']:
+            scheduler.enqueue_request(Request(url))
+        self.assertEqual(len(scheduler), 3)
+        downloader.increment('a.example')
+        urls = []
+        while scheduler.has_pending_requests():
+            urls.append(scheduler.next_request().url)
+        self.assertEqual(urls[0], 'http://b.example/1')
+        self.assertEqual(sorted(urls), ['http://a.example/1',
+                                        'http://a.example/2',
+                                        'http://b.example/1'])
+
+    def test_memory(self):
+        scheduler = self._scheduler()
+        self._enqueue_and_drain(scheduler, scheduler.crawler.engine.downloader)
+        scheduler.close('finished')
+
+    def test_disk(self):
+        scheduler = self._scheduler(self.jobdir)
+        self._enqueue_and_drain(scheduler, scheduler.crawler.engine.downloader)
+        scheduler.close('finished')
+
+    def test_disk_resume(self):
+        scheduler = self._scheduler(self.jobdir)
+        scheduler.enqueue_request(Request('http://a.example/1', priority=1))
+        scheduler.enqueue_request(Request('http://a.example/2', priority=2))
+        scheduler.enqueue_request(Request('http://b.example/1'))
+        scheduler.close('shutdown')
+
+        scheduler = self._scheduler(self.jobdir)
+        self.assertEqual(len(scheduler), 3)
+        scheduler.crawler.engine.downloader.increment('b.example')
+        urls = []
+        while scheduler.has_pending_requests():
+            urls.append(scheduler.next_request().url)
+        self.assertEqual(urls, ['http://a.example/2', 'http://a.example/1',
+                                'http://b.example/1'])
+        scheduler.close('finished')
+
+
+class CheckpointSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.jobdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.jobdir)
+
+    def _scheduler(self, **settings):
+        settings.setdefault('JOBDIR', self.jobdir)
+        crawler = _get_crawler(settings)
+        scheduler = Scheduler.from_crawler(crawler)
+        scheduler.open(Spider(name='spider'))
+        return scheduler
+
+    def test_loop(self):
+        scheduler = self._scheduler()
+        self.assertTrue(scheduler._checkpoint_loop.running)
+        scheduler.close('finished')
+        self.assertFalse(scheduler._checkpoint_loop.running)
+
+        scheduler = self._scheduler(SCHEDULER_CHECKPOINT_INTERVAL=0)
+        self.assertIsNone(scheduler._checkpoint_loop)
+        scheduler.close('finished')
+
+    def test_unsupported_queue(self):
+        scheduler = self._scheduler(
+            SCHEDULER_PRIORITY_QUEUE='queuelib.PriorityQueue')
+        self.assertIsNone(scheduler._checkpoint_loop)
+        scheduler.close('finished')
+
+    def test_resume_from_checkpoint(self):
+        for disk_queue in ['scrapy.squeues.PickleFifoDiskQueue',
+                           'scrapy.squeues.PickleLifoDiskQueue']:
+            self.tearDown()
+            self.setUp()
+            scheduler = self._scheduler(SCHEDULER_DISK_QUEUE=disk_queue)
+            scheduler.enqueue_request(Request('http://example.com/1'))
+            scheduler.enqueue_request(Request('http://example.com/2',
+                                              priority=1))
+            scheduler.checkpoint()
+            scheduler._checkpoint_loop.stop()
+            # "crash" without closing the scheduler
+
+            resumed = self._scheduler(SCHEDULER_DISK_QUEUE=disk_queue)
+            self.assertEqual(len(resumed), 2)
+            self.assertEqual(resumed.next_request().url, 'http://example.com/2')
+            self.assertEqual(resumed.next_request().url, 'http://example.com/1')
+            self.assertTrue(resumed.df.request_seen(
+                Request('http://example.com/1')))
+            resumed.close('finished')
+            scheduler.df.file.close()
+
+
+class SpillingSchedulerTest(unittest.TestCase):
+
+    def _scheduler(self, **settings):
+        crawler = _get_crawler(settings)
+        scheduler = Scheduler.from_crawler(crawler)
+        scheduler.open(Spider(name='spider'))
+        return scheduler
+
+    def _drain(self, scheduler):
+        urls = []
+        while scheduler.has_pending_requests():
+            urls.append(scheduler.next_request().url)
+        return urls
+
+    def test_no_spill_by_default(self):
+        scheduler = self._scheduler()
+        self.assertIsNone(scheduler.dqs)
+        scheduler.close('finished')
+
+    def test_spill_and_refill(self):
+        scheduler = self._scheduler(SCHEDULER_MEMORY_QUEUE_MAXREQUESTS=2,
+                                    SCHEDULER_REFILL_BATCH=2)
+        spilldir = scheduler.spilldir
+        self.assertTrue(os.path.isdir(spilldir))
+        for i in range(5):
+            scheduler.enqueue_request(Request('http://example.com/%d' % i))
+        self.assertEqual(scheduler.mqlen, 2)
+        self.assertEqual(len(scheduler), 5)
+        self.assertEqual(sorted(self._drain(scheduler)),
+                         ['http://example.com/%d' % i for i in range(5)])
+        stats = scheduler.stats
+        self.assertEqual(stats.get_value('scheduler/spilled'), 3)
+        self.assertEqual(stats.get_value('scheduler/refilled'), 3)
+        self.assertEqual(stats.get_value('scheduler/dequeued'), 5)
+        scheduler.close('finished')
+        self.assertFalse(os.path.exists(spilldir))
+
+    def test_spill_respects_priorities(self):
+        scheduler = self._scheduler(SCHEDULER_MEMORY_QUEUE_MAXREQUESTS=2)
+        for priority in [1, 2, 5, 4, 3]:
+            scheduler.enqueue_request(Request('http://example.com/%d' % priority,
+                                              priority=priority))
+        self.assertEqual(self._drain(scheduler),
+                         ['http://example.com/%d' % i for i in [5, 4, 3, 2, 1]])
+        scheduler.close('finished')
+
+    def test_spill_by_bytes(self):
+        scheduler = self._scheduler(SCHEDULER_MEMORY_QUEUE_MAXBYTES=1)
+        scheduler.enqueue_request(Request('http://example.com/1'))
+        scheduler.enqueue_request(Request('http://example.com/2'))
+        self.assertEqual(scheduler.mqlen, 1)
+        self.assertEqual(scheduler.stats.get_value('scheduler/spilled'), 1)
+        self.assertEqual(len(self._drain(scheduler)), 2)
+        self.assertEqual(scheduler.mqbytes, 0)
+        scheduler.close('finished')
+
+
+class BatchDequeueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.jobdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.jobdir)
+
+    def _scheduler(self, **settings):
+        crawler = _get_crawler(settings)
+        scheduler = Scheduler.from_crawler(crawler)
+        scheduler.open(Spider(name='spider'))
+        for priority in range(5):
+            scheduler.enqueue_request(Request('http://example.com/%d' % priority,
+                                              priority=priority))
+        return scheduler
+
+    def _assert_batches(self, scheduler, tier):
+        urls = [r.url for r in scheduler.next_requests(3)]
+        self.assertEqual(urls, ['http://example.com/4', 'http://example.com/3',
+                                'http://example.com/2'])
+        self.assertEqual(scheduler.stats.get_value('scheduler/dequeued'), 3)
+        self.assertEqual(
+            scheduler.stats.get_value('scheduler/dequeued/%s' % tier), 3)
+        urls = [r.url for r in scheduler.next_requests(10)]
+        self.assertEqual(urls, ['http://example.com/1', 'http://example.com/0'])
+        self.assertEqual(list(scheduler.next_requests(10)), [])
+        self.assertEqual(scheduler.stats.get_value('scheduler/dequeued'), 5)
+        scheduler.close('finished')
+
+    def test_memory(self):
+        self._assert_batches(self._scheduler(), 'memory')
+
+    def test_disk(self):
+        self._assert_batches(self._scheduler(JOBDIR=self.jobdir), 'disk')
+
+    def test_lazy(self):
+        scheduler = self._scheduler()
+        requests = scheduler.next_requests(3)
+        self.assertEqual(len(scheduler), 5)
+        next(requests)
+        self.assertEqual(len(scheduler), 4)
+        requests.close()
+        self.assertEqual(scheduler.stats.get_value('scheduler/dequeued'), 1)
+        scheduler.close('finished')
@@ -168,11 +168,74 @@ class XMLFeedSpiderTest(SpiderTest):
                  'custom': []},
             ], iterator)
 
+    def test_stream(self):
+        body = b"""<?xml version="1.0" encoding="UTF-8"?>
+        <urlset xmlns:y="http://www.example.com/schemas/extras/1.0">
+        <url><loc>http://www.example.com/</loc><y:updated>2009-08-16</y:updated></url>
+        <url><loc>http://www.example.com/about</loc><y:updated>2009-08-17</y:updated></url>
+        </urlset>"""
+
+        class _XMLSpider(self.spider_class):
+            itertag = 'url'
+            namespaces = (('b', 'http://www.example.com/schemas/extras/1.0'),)
+            start_urls = ['http://example.com/sitemap.xml']
+            stream = True
+
+            def parse_node(self, response, selector):
+                yield {
+                    'loc': selector.xpath('loc/text()').get(),
+                    'updated': selector.xpath('b:updated/text()').get(),
+                }
+
+        spider = _XMLSpider('example')
+        request = next(iter(spider.start_requests()))
+        consumer = request.meta['body_consumer']
+        response = XmlResponse(url=request.url, request=request)
+        output = []
+        for i in range(0, len(body), 20):
+            output.extend(consumer(response, body[i:i + 20]))
+        output.extend(consumer(response, b''))
+        self.assertEqual(output, [
+            {'loc': u'http://www.example.com/', 'updated': u'2009-08-16'},
+            {'loc': u'http://www.example.com/about', 'updated': u'2009-08-17'},
+        ])
+
+        streamed = XmlResponse(url=request.url, request=request, flags=['streamed'])
+        self.assertEqual(list(spider.parse(streamed)), [])
+
+        spider = self.spider_class('example', start_urls=['http://example.com'])
+        request = next(iter(spider.start_requests()))
+        self.assertNotIn('body_consumer', request.meta)
+
 
 class CSVFeedSpiderTest(SpiderTest):
 
     spider_class = CSVFeedSpider
 
+    def test_stream(self):
+        body = b'id,name\n1,"multi\nline"\n2,other\n'
+
+        class _CSVSpider(self.spider_class):
+            start_urls = ['http://example.com/feed.csv']
+            stream = True
+
+            def parse_row(self, response, row):
+                yield row
+
+        spider = _CSVSpider('example')
+        request = next(iter(spider.start_requests()))
+        consumer = request.meta['body_consumer']
+        response = TextResponse(url=request.url, request=request, encoding='utf-8')
+        output = []
+        for i in range(0, len(body), 5):
+            output.extend(consumer(response, body[i:i + 5]))
+        output.extend(consumer(response, b''))
+        self.assertEqual(output, [{u'id': u'1', u'name': u'multi\nline'},
+                                  {u'id': u'2', u'name': u'other'}])
+
+        streamed = TextResponse(url=request.url, request=request, flags=['streamed'])
+        self.assertEqual(list(spider.parse(streamed)), [])
+
 
 class CrawlSpiderTest(SpiderTest):
 
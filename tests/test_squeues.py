@@ -1,11 +1,18 @@
+import marshal
+import os
 import pickle
 
 from queuelib.tests import test_queue as t
 from scrapy.squeues import MarshalFifoDiskQueue, MarshalLifoDiskQueue, PickleFifoDiskQueue, PickleLifoDiskQueue
+from scrapy.squeues import CompactFifoDiskQueue, CompactLifoDiskQueue, CompactZlibFifoDiskQueue, CompactZlibLifoDiskQueue
+from scrapy.squeues import CompactFifoMemoryQueue, CompactLifoMemoryQueue
+from scrapy.http import FormRequest
 from scrapy.item import Item, Field
 from scrapy.http import Request
 from scrapy.loader import ItemLoader
 from scrapy.selector import Selector
+from scrapy.spiders import Spider
+from scrapy.utils.reqser import request_to_dict
 
 class TestItem(Item):
     name = Field()
@@ -161,3 +168,356 @@ class PickleLifoDiskQueueTest(MarshalLifoDiskQueueTest):
         assert isinstance(r2, Request)
         self.assertEqual(r.url, r2.url)
         assert r2.meta['request'] is r2
+
+
+class CompactQueueTestMixin(object):
+
+    def _request_dict(self, **kwargs):
+        spider = Spider('foo')
+        spider.parse_item = lambda response: None
+        request = Request('http://www.example.com/page', **kwargs)
+        return request_to_dict(request, spider)
+
+    def test_serialize_request(self):
+        q = self.queue()
+        d = self._request_dict(
+            method='POST', body=b'a=1', priority=5, dont_filter=True,
+            headers={'Referer': 'http://www.example.com/'},
+            cookies={'session': '1'}, meta={'depth': 2}, flags=['cached'])
+        q.push(d)
+        self.assertEqual(q.pop(), d)
+
+    def test_serialize_request_defaults(self):
+        q = self.queue()
+        d = self._request_dict()
+        q.push(d)
+        self.assertEqual(q.pop(), d)
+
+    def test_serialize_request_pickled_meta(self):
+        q = self.queue()
+        d = self._request_dict(meta={'item': TestItem(name='foo')})
+        q.push(d)
+        d2 = q.pop()
+        self.assertEqual(d2, d)
+        assert isinstance(d2['meta']['item'], TestItem)
+
+    def test_serialize_request_unknown_keys(self):
+        q = self.queue()
+        d = dict(self._request_dict(), extra='value')
+        q.push(d)
+        self.assertEqual(q.pop(), d)
+
+    def test_interned_symbols_persist(self):
+        d = self._request_dict(headers={'X-Custom': 'a'})
+        q = self.queue()
+        q.push(d)
+        q.push(d)
+        q.close()
+        q = self.queue()
+        d2 = self._request_dict(headers={'X-Other': 'b'})
+        q.push(d2)
+        self.assertEqual(q.pop(), d)
+        self.assertEqual(q.pop(), d)
+        self.assertEqual(q.pop(), d2)
+
+    def test_unsupported_version(self):
+        q = self.queue()
+        self.assertRaises(ValueError, q.codec.decode, b'\xff\x00data')
+
+    def test_decode_version_1(self):
+        # records written before request fingerprints were cached
+        q = self.queue()
+        post = q.codec.symbols.intern('POST')
+        # method, meta, priority and dont_filter bits
+        mask = 1 << 2 | 1 << 6 | 1 << 8 | 1 << 11
+        record = b'\x01\x00' + marshal.dumps(
+            (mask, 'http://www.example.com/page', post, {'depth': 2}, 5))
+        d = q.codec.decode(record)
+        self.assertEqual(d['url'], 'http://www.example.com/page')
+        self.assertEqual(d['method'], 'POST')
+        self.assertEqual(d['meta'], {'depth': 2})
+        self.assertEqual(d['priority'], 5)
+        self.assertTrue(d['dont_filter'])
+        self.assertIsNone(d['fingerprints'])
+
+
+class CompactFifoDiskQueueTest(CompactQueueTestMixin, PickleFifoDiskQueueTest):
+
+    def queue(self):
+        return CompactFifoDiskQueue(self.qpath, chunksize=self.chunksize)
+
+class ChunkSize1CompactFifoDiskQueueTest(CompactFifoDiskQueueTest):
+    chunksize = 1
+
+class ChunkSize3CompactFifoDiskQueueTest(CompactFifoDiskQueueTest):
+    chunksize = 3
+
+
+class CompactZlibFifoDiskQueueTest(CompactFifoDiskQueueTest):
+
+    def queue(self):
+        return CompactZlibFifoDiskQueue(self.qpath, chunksize=self.chunksize)
+
+    def test_compressed_body(self):
+        q = self.queue()
+        d = self._request_dict(method='POST', body=b'x' * 10000)
+        q.push(d)
+        self.assertEqual(q.pop(), d)
+
+
+class CompactLifoDiskQueueTest(CompactQueueTestMixin, PickleLifoDiskQueueTest):
+
+    def queue(self):
+        return CompactLifoDiskQueue(self.qpath)
+
+    def test_interned_symbols_persist(self):
+        d = self._request_dict(headers={'X-Custom': 'a'})
+        q = self.queue()
+        q.push(d)
+        q.close()
+        q = self.queue()
+        d2 = self._request_dict(headers={'X-Other': 'b'})
+        q.push(d2)
+        self.assertEqual(q.pop(), d2)
+        self.assertEqual(q.pop(), d)
+
+
+class CompactZlibLifoDiskQueueTest(CompactLifoDiskQueueTest):
+
+    def queue(self):
+        return CompactZlibLifoDiskQueue(self.qpath)
+
+
+class CallbackSpider(Spider):
+
+    def parse_item(self, response):
+        pass
+
+
+class CompactMemoryQueueTestMixin(object):
+
+    def _assert_same_request(self, r1, r2):
+        self.assertEqual(request_to_dict(r1, self.spider),
+                         request_to_dict(r2, self.spider))
+
+    def setUp(self):
+        super(CompactMemoryQueueTestMixin, self).setUp()
+        self.spider = CallbackSpider('foo')
+
+    def test_compact_request(self):
+        q = self.queue()
+        r = Request('http://www.example.com/page', method='POST', body=b'a=1',
+                    priority=5, dont_filter=True, callback=self.spider.parse_item,
+                    headers={'Referer': 'http://www.example.com/'},
+                    cookies={'session': '1'}, meta={'depth': 2},
+                    flags=['cached'], encoding='latin-1')
+        q.push(r)
+        assert isinstance(q.q[0], tuple)
+        r2 = q.pop()
+        self.assertIsNot(r2, r)
+        self._assert_same_request(r, r2)
+        self.assertEqual(r2.callback, self.spider.parse_item)
+
+    def test_compact_request_defaults(self):
+        q = self.queue()
+        r = Request('http://www.example.com/page')
+        q.push(r)
+        self.assertEqual(q.q[0], (0, 'http://www.example.com/page'))
+        r2 = q.pop()
+        self.assertIsNone(r2._meta)
+        self._assert_same_request(r, r2)
+
+    def test_compact_request_subclass(self):
+        q = self.queue()
+        r = FormRequest('http://www.example.com/page', formdata={'a': '1'})
+        q.push(r)
+        r2 = q.pop()
+        assert isinstance(r2, FormRequest)
+        self._assert_same_request(r, r2)
+
+    def test_keep_irreducible_request(self):
+        q = self.queue()
+        r = Request('http://www.example.com/page')
+        r.custom = 'value'
+        q.push(r)
+        self.assertIs(q.pop(), r)
+
+
+class CompactFifoMemoryQueueTest(CompactMemoryQueueTestMixin,
+                                 t.FifoMemoryQueueTest):
+
+    def queue(self):
+        return CompactFifoMemoryQueue()
+
+
+class CompactLifoMemoryQueueTest(CompactMemoryQueueTestMixin,
+                                 t.LifoMemoryQueueTest):
+
+    def queue(self):
+        return CompactLifoMemoryQueue()
+
+
+class FifoDiskQueueCheckpointTest(t.QueuelibTestCase):
+
+    chunksize = 2
+
+    def queue(self):
+        return PickleFifoDiskQueue(self.qpath, chunksize=self.chunksize)
+
+    def test_restore_checkpoint(self):
+        q = self.queue()
+        for i in range(5):
+            q.push(i)
+        self.assertEqual(q.pop(), 0)
+        q.checkpoint()
+        # pop and push past the checkpoint, then "crash" without closing
+        self.assertEqual([q.pop() for _ in range(3)], [1, 2, 3])
+        q.push(5)
+        q.push(6)
+        q.push(7)
+
+        q = self.queue()
+        self.assertEqual(len(q), 4)
+        self.assertEqual([q.pop() for _ in range(4)], [1, 2, 3, 4])
+        self.assertIsNone(q.pop())
+        q.push(8)
+        self.assertEqual(q.pop(), 8)
+        q.close()
+
+    def test_clean_close_after_checkpoint(self):
+        q = self.queue()
+        q.push(1)
+        q.checkpoint()
+        q.push(2)
+        q.close()
+        q = self.queue()
+        self.assertEqual([q.pop(), q.pop()], [1, 2])
+        q.close()
+        self.assertFalse(os.path.exists(self.qpath))
+
+class ChunkSize1FifoDiskQueueCheckpointTest(FifoDiskQueueCheckpointTest):
+    chunksize = 1
+
+class ChunkSize100FifoDiskQueueCheckpointTest(FifoDiskQueueCheckpointTest):
+    chunksize = 100
+
+
+class LifoDiskQueueCheckpointTest(t.QueuelibTestCase):
+
+    def queue(self):
+        return PickleLifoDiskQueue(self.qpath)
+
+    def test_restore_pushed_after_checkpoint(self):
+        q = self.queue()
+        q.push(1)
+        q.push(2)
+        q.checkpoint()
+        q.push(3)
+        q.f.flush()  # "crash" without closing
+        q = self.queue()
+        self.assertEqual(len(q), 2)
+        self.assertEqual([q.pop(), q.pop()], [2, 1])
+        self.assertIsNone(q.pop())
+        q.close()
+
+    def test_restore_popped_after_checkpoint(self):
+        q = self.queue()
+        q.push(1)
+        q.push(2)
+        q.push(3)
+        q.checkpoint()
+        self.assertEqual(q.pop(), 3)
+        self.assertEqual(q.pop(), 2)
+        q.f.flush()  # "crash" without closing
+        q = self.queue()
+        self.assertEqual(len(q), 3)
+        self.assertEqual([q.pop() for _ in range(3)], [3, 2, 1])
+        self.assertIsNone(q.pop())
+        q.close()
+
+    def test_restore_popped_and_pushed_after_checkpoint(self):
+        q = self.queue()
+        for i in range(5):
+            q.push(i)
+        q.checkpoint()
+        self.assertEqual([q.pop(), q.pop()], [4, 3])
+        for i in range(5, 8):
+            q.push(i)
+        q.f.flush()  # "crash" without closing
+        q = self.queue()
+        self.assertEqual(len(q), 5)
+        self.assertEqual([q.pop() for _ in range(5)], [4, 3, 2, 1, 0])
+        self.assertIsNone(q.pop())
+        q.close()
+
+    def test_checkpoint_after_pop_and_push(self):
+        q = self.queue()
+        for i in range(5):
+            q.push(i)
+        q.checkpoint()
+        self.assertEqual([q.pop(), q.pop()], [4, 3])
+        for i in range(5, 8):
+            q.push(i)
+        q.checkpoint()
+        self.assertEqual([q.pop() for _ in range(4)], [7, 6, 5, 2])
+        q.push(8)
+        q.f.flush()  # "crash" without closing
+        q = self.queue()
+        self.assertEqual(len(q), 6)
+        self.assertEqual([q.pop() for _ in range(4)], [7, 6, 5, 2])
+        q.push(9)
+        q.close()
+        q = self.queue()
+        self.assertEqual(len(q), 3)
+        self.assertEqual([q.pop() for _ in range(3)], [9, 1, 0])
+        self.assertIsNone(q.pop())
+        q.close()
+
+    def test_clean_close_after_checkpoint(self):
+        q = self.queue()
+        q.push(1)
+        q.checkpoint()
+        q.push(2)
+        q.close()
+        q = self.queue()
+        self.assertEqual([q.pop(), q.pop()], [2, 1])
+        q.close()
+
+
+class LifoDiskQueueReadAheadTest(t.QueuelibTestCase):
+
+    def queue(self):
+        return PickleLifoDiskQueue(self.qpath)
+
+    def test_reads(self):
+        q = self.queue()
+        for i in range(1000):
+            q.push(i)
+        q.close()
+        q = self.queue()
+        reads = []
+        read = q.f.read
+        q.f.read = lambda size: reads.append(size) or read(size)
+        self.assertEqual([q.pop() for _ in range(1000)], list(range(999, -1, -1)))
+        # 1000 records of about 10 bytes fit in a single read
+        self.assertEqual(len(reads), 1)
+        q.close()
+
+    def test_push_after_read_ahead(self):
+        q = self.queue()
+        for i in range(10):
+            q.push(i)
+        self.assertEqual([q.pop(), q.pop()], [9, 8])
+        q.push('a')
+        q.push('bb')
+        self.assertEqual([q.pop() for _ in range(4)], ['bb', 'a', 7, 6])
+        q.close()
+
+    def test_large_records(self):
+        q = self.queue()
+        records = [b'x' * (q.READ_SIZE * 2), b'y', b'z' * q.READ_SIZE]
+        for record in records:
+            q.push(record)
+        self.assertEqual([q.pop() for _ in range(3)], records[::-1])
+        self.assertIsNone(q.pop())
+        q.close()
@@ -0,0 +1,167 @@
+from email.utils import formatdate
+from time import time
+
+from twisted.internet.error import ConnectionRefusedError, TimeoutError
+from twisted.python.failure import Failure
+from twisted.trial import unittest
+
+from scrapy.core.downloader import Slot
+from scrapy.exceptions import NotConfigured
+from scrapy.extensions.throttle import AdaptiveConcurrency
+from scrapy.http import Request, Response
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+from tests import mock
+
+
+class AdaptiveConcurrencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.crawler = get_crawler(settings_dict={
+            'ADAPTIVE_CONCURRENCY_ENABLED': True,
+            'ADAPTIVE_CONCURRENCY_MAX': 4,
+            'CONCURRENT_REQUESTS_PER_DOMAIN': 2,
+        })
+        self.crawler.engine = mock.Mock()
+        self.slot = Slot(2, 0, False)
+        self.crawler.engine.downloader.slots = {'example.com': self.slot}
+        self.handlers = self.crawler.engine.downloader.handlers
+        self.spider = Spider('foo')
+        self.ext = AdaptiveConcurrency.from_crawler(self.crawler)
+        self.ext._spider_opened(self.spider)
+
+    def _request(self, latency=0.1):
+        return Request('http://example.com/', meta={
+            'download_slot': 'example.com', 'download_latency': latency})
+
+    def _response(self, status=200, latency=0.1, headers=None):
+        request = self._request(latency)
+        self.ext._response_downloaded(
+            Response(request.url, status=status, headers=headers),
+            request, self.spider)
+
+    def _saturate(self):
+        self.slot.transferring = set(range(self.slot.concurrency))
+
+    def _release_hold(self):
+        self.slot.controller.hold_until = 0
+
+    def test_not_configured(self):
+        self.assertRaises(NotConfigured, AdaptiveConcurrency.from_crawler,
+                          get_crawler())
+
+    def test_additive_increase(self):
+        for concurrency in (3, 4, 4):
+            self._saturate()
+            for _ in range(self.slot.concurrency):
+                self._response()
+            self.assertEqual(self.slot.concurrency, concurrency)
+        self.assertEqual(
+            self.crawler.stats.get_value('adaptive_concurrency/increase'), 2)
+        self.assertEqual(self.handlers.set_max_per_host.call_args_list,
+                         [mock.call(3), mock.call(4)])
+
+    def test_max_per_host_not_lowered(self):
+        for _ in range(2):
+            self._saturate()
+            for _ in range(self.slot.concurrency):
+                self._response()
+        self.assertEqual(self.slot.concurrency, 4)
+        self._response(status=503)
+        self.assertEqual(self.slot.concurrency, 2)
+        self._release_hold()
+        self._saturate()
+        for _ in range(self.slot.concurrency):
+            self._response()
+        self.assertEqual(self.slot.concurrency, 3)
+        self.assertEqual(self.handlers.set_max_per_host.call_args_list,
+                         [mock.call(3), mock.call(4)])
+
+    def test_no_increase_when_not_saturated(self):
+        for _ in range(10):
+            self._response()
+        self.assertEqual(self.slot.concurrency, 2)
+
+    def test_multiplicative_decrease(self):
+        self.slot.concurrency = 8
+        self._response(status=503)
+        self.assertEqual(self.slot.concurrency, 4)
+        self.assertFalse(self.handlers.set_max_per_host.called)
+        # responses of requests sent before the decrease are ignored
+        self._response(status=503)
+        self.assertEqual(self.slot.concurrency, 4)
+        self._release_hold()
+        self._response(status=429)
+        self.assertEqual(self.slot.concurrency, 2)
+        stats = self.crawler.stats
+        self.assertEqual(
+            stats.get_value('adaptive_concurrency/decrease/http_503'), 1)
+        self.assertEqual(
+            stats.get_value('adaptive_concurrency/decrease/http_429'), 1)
+
+    def test_delay_at_min_concurrency(self):
+        self.slot.concurrency = 1
+        self._response(latency=0.2)
+        self._response(status=503)
+        self.assertAlmostEqual(self.slot.delay, 0.4)
+        self._release_hold()
+        self._response(status=503)
+        self.assertAlmostEqual(self.slot.delay, 0.8)
+        # successful responses reduce the delay before the concurrency
+        self._release_hold()
+        self._saturate()
+        self._response(latency=0.2)
+        self.assertAlmostEqual(self.slot.delay, 0.4)
+        self.assertEqual(self.slot.concurrency, 1)
+
+    def test_recover_from_delay_at_min_concurrency(self):
+        self.slot.concurrency = 1
+        self._response(status=503)
+        self.assertEqual(self.slot.delay, 2)
+        self._release_hold()
+        responses = 0
+        while self.slot.concurrency == 1:
+            self._saturate()
+            self._response()
+            responses += 1
+            self.assertLess(responses, 20)
+        # the delay went back to DOWNLOAD_DELAY (0) before the concurrency grew
+        self.assertEqual(self.slot.delay, 0)
+        self.assertEqual(self.slot.concurrency, 2)
+
+    def test_retry_after(self):
+        self._response(status=429, headers={'Retry-After': '5'})
+        self.assertEqual(self.slot.delay, 5)
+        self.assertEqual(self.slot.concurrency, 1)
+        # Retry-After applies even to responses ignored by the controller
+        self._response(status=503, headers={'Retry-After': formatdate(time() + 30)})
+        self.assertTrue(28 < self.slot.delay <= 30)
+        self._response(status=503, headers={'Retry-After': '3600'})
+        self.assertEqual(self.slot.delay, 60)
+
+    def test_latency_gradient(self):
+        self.slot.concurrency = 4
+        for _ in range(5):
+            self._response(latency=0.1)
+        self.assertEqual(self.slot.concurrency, 4)
+        for _ in range(5):
+            self._response(latency=0.5)
+        self.assertEqual(self.slot.concurrency, 2)
+        self.assertEqual(self.crawler.stats.get_value(
+            'adaptive_concurrency/decrease/latency'), 1)
+
+    def test_timeouts(self):
+        self.slot.concurrency = 4
+        request = self._request()
+        self.ext._download_error(Failure(ConnectionRefusedError()), request,
+                                 self.spider)
+        self.assertEqual(self.slot.concurrency, 4)
+        self.ext._download_error(Failure(TimeoutError()), request, self.spider)
+        self.assertEqual(self.slot.concurrency, 2)
+
+    def test_debug(self):
+        self.ext.debug = True
+        with mock.patch('scrapy.extensions.throttle.logger') as logger:
+            self._response(status=503)
+        self.assertEqual(logger.info.call_count, 1)
+        self.assertEqual(logger.info.call_args[0][1]['reason'], 'http_503')
@@ -0,0 +1,127 @@
+import unittest
+import zlib
+from gzip import GzipFile
+from io import BytesIO
+from os.path import join
+
+from scrapy.utils.contentencoding import get_decoder, decode, \
+    ACCEPTED_ENCODINGS, DecodedSizeError
+from scrapy.utils.gz import gunzip
+from tests import tests_datadir
+
+SAMPLEDIR = join(tests_datadir, 'compressed')
+
+
+def _read(filename):
+    with open(join(SAMPLEDIR, filename), 'rb') as f:
+        return f.read()
+
+
+def _gzip(data):
+    buf = BytesIO()
+    with GzipFile(fileobj=buf, mode='wb') as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+def _decode_chunks(encoding, data, size, chunk_size=1024):
+    decoder = get_decoder(encoding, chunk_size)
+    chunks = []
+    for i in range(0, len(data), size):
+        chunks.extend(decoder.decompress(data[i:i + size]))
+    chunks.append(decoder.flush())
+    return chunks
+
+
+class ContentDecoderTest(unittest.TestCase):
+
+    def _assert_decodes(self, encoding, data, expected):
+        for size in (1, 100, len(data)):
+            chunks = _decode_chunks(encoding, data, size)
+            self.assertEqual(b''.join(chunks), expected)
+            self.assertTrue(all(len(chunk) <= 1024 for chunk in chunks))
+
+    def test_unsupported(self):
+        self.assertIsNone(get_decoder(b'identity'))
+        self.assertEqual(decode(b'data', b'identity'), b'data')
+
+    def test_gzip(self):
+        data = _read('html-gzip.bin')
+        self._assert_decodes(b'gzip', data, gunzip(data))
+        self._assert_decodes(b'X-Gzip', data, gunzip(data))
+
+    def test_gzip_members(self):
+        self._assert_decodes(b'gzip', _gzip(b'foo') + _gzip(b'bar'),
+                             b'foobar')
+
+    def test_gzip_truncated(self):
+        data = _read('truncated-crc-error.gz')
+        self.assertTrue(decode(data, b'gzip').endswith(b'</html'))
+        data = _read('truncated-crc-error-short.gz')
+        self.assertTrue(decode(data, b'gzip').endswith(b'</html>'))
+
+    def test_gzip_invalid(self):
+        self.assertRaises(zlib.error, decode, _read('feed-sample1.xml'),
+                          b'gzip')
+
+    def test_deflate(self):
+        for filename in ('html-zlibdeflate.bin', 'html-rawdeflate.bin'):
+            data = _read(filename)
+            try:
+                expected = zlib.decompress(data)
+            except zlib.error:
+                expected = zlib.decompress(data, -15)
+            self._assert_decodes(b'deflate', data, expected)
+
+    def test_br(self):
+        if b'br' not in ACCEPTED_ENCODINGS:
+            raise unittest.SkipTest("no brotli")
+        self.assertTrue(
+            decode(_read('html-br.bin'), b'br').startswith(b'<!DOCTYPE'))
+        self._assert_decodes(b'br', _read('html-br.bin'),
+                             decode(_read('html-br.bin'), b'br'))
+
+    def test_zstd(self):
+        if b'zstd' not in ACCEPTED_ENCODINGS:
+            raise unittest.SkipTest("no zstandard")
+        import zstandard
+        expected = gunzip(_read('html-gzip.bin'))
+        data = zstandard.ZstdCompressor().compress(expected)
+        self._assert_decodes(b'zstd', data, expected)
+
+    def test_br_bomb(self):
+        if b'br' not in ACCEPTED_ENCODINGS:
+            raise unittest.SkipTest("no brotli")
+        import brotli
+        data = brotli.compress(b'\0' * 10 ** 7)
+        decoder = get_decoder(b'br', chunk_size=1000, max_size=10 ** 6)
+        if not hasattr(brotli.Decompressor(), 'can_accept_more_data'):
+            # old brotli versions decode the whole data at once
+            self.assertRaises(DecodedSizeError, list, decoder.decompress(data))
+            return
+        # a decompression bomb is decoded in bounded chunks
+        chunks = decoder.decompress(data)
+        for _ in range(100):
+            self.assertLessEqual(len(next(chunks)), 1000)
+
+    def test_zstd_bomb(self):
+        if b'zstd' not in ACCEPTED_ENCODINGS:
+            raise unittest.SkipTest("no zstandard")
+        import zstandard
+        data = zstandard.ZstdCompressor().compress(b'\0' * 10 ** 7)
+        decoder = get_decoder(b'zstd', chunk_size=1000, max_size=10 ** 6)
+        try:
+            list(decoder.decompress(data))
+        except DecodedSizeError as e:
+            # decoding stops right above the limit
+            self.assertLessEqual(e.args[0], 10 ** 6 + 1000)
+        else:
+            self.fail("DecodedSizeError not raised")
+
+    def test_decoded_chunk_size(self):
+        # a decompression bomb is decoded in bounded chunks
+        data = zlib.compress(b'\0' * 10 ** 6)
+        decoder = get_decoder(b'deflate', chunk_size=1000)
+        chunks = decoder.decompress(data)
+        self.assertEqual(len(next(chunks)), 1000)
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 10 ** 6 - 1000)
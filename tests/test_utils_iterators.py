@@ -3,7 +3,8 @@ import os
 import six
 from twisted.trial import unittest
 
-from scrapy.utils.iterators import csviter, xmliter, _body_or_str, xmliter_lxml
+from scrapy.utils.iterators import csviter, xmliter, _body_or_str, xmliter_lxml, \
+    XmlNodeFeeder, CsvRowFeeder
 from scrapy.http import XmlResponse, TextResponse, Response
 from tests import get_testdata
 
@@ -368,6 +369,71 @@ class UtilsCsvTestCase(unittest.TestCase):
              {u'id': u'2', u'name': u'something', u'value': u'\u255a\u2569\u2569\u2569\u2550\u2550\u2557'}])
 
 
+def _feed_chunks(feeder, body, size):
+    results = []
+    for i in range(0, len(body), size):
+        results.extend(feeder.feed(body[i:i + size]))
+    results.extend(feeder.feed(b''))
+    return results
+
+
+class XmlNodeFeederTestCase(unittest.TestCase):
+
+    def test_feed_chunks(self):
+        body = get_testdata('feeds', 'feed-sample1.xml')
+        response = XmlResponse(url='http://example.com/', body=body)
+        expected = [n.extract() for n in xmliter_lxml(response, 'product')]
+        self.assertTrue(expected)
+        for size in (7, 100, len(body)):
+            nodes = _feed_chunks(XmlNodeFeeder('product'), body, size)
+            self.assertEqual([n.extract() for n in nodes], expected)
+
+    def test_feed_leading_whitespace(self):
+        body = b"""
+            <?xml version="1.0" encoding="UTF-8"?>
+            <products><product id="001">one</product><product id="002">two</product></products>
+        """
+        nodes = _feed_chunks(XmlNodeFeeder('product'), body, 5)
+        self.assertEqual([n.xpath('@id').get() for n in nodes], ['001', '002'])
+
+    def test_feed_namespace(self):
+        body = b"""<?xml version="1.0" encoding="UTF-8"?>
+        <root xmlns:h="http://www.w3.org/TR/html4/">
+            <h:table><h:tr><h:td>Apples</h:td></h:tr></h:table>
+            <table>not this one</table>
+        </root>
+        """
+        feeder = XmlNodeFeeder('table', 'http://www.w3.org/TR/html4/', 'h')
+        nodes = _feed_chunks(feeder, body, 10)
+        self.assertEqual(len(nodes), 1)
+        self.assertEqual(nodes[0].xpath('h:tr/h:td/text()').getall(), ['Apples'])
+
+
+class CsvRowFeederTestCase(unittest.TestCase):
+
+    def test_feed_chunks(self):
+        body = get_testdata('feeds', 'feed-sample3.csv')
+        response = TextResponse(url='http://example.com/', body=body)
+        expected = list(csviter(response))
+        for size in (1, 3, 16, len(body)):
+            rows = _feed_chunks(CsvRowFeeder(), body, size)
+            self.assertEqual(rows, expected)
+
+    def test_feed_options(self):
+        body = u'1|"al|pha"|foo\n2|unicode|\xfan\xedc\xf3d\xe9\n'.encode('latin1')
+        feeder = CsvRowFeeder(delimiter='|', headers=['id', 'name', 'value'],
+                              encoding='latin1')
+        self.assertEqual(_feed_chunks(feeder, body, 4),
+                         [{u'id': u'1', u'name': u'al|pha', u'value': u'foo'},
+                          {u'id': u'2', u'name': u'unicode', u'value': u'\xfan\xedc\xf3d\xe9'}])
+
+    def test_feed_no_trailing_newline(self):
+        body = b'id,name\n1,"multi\nline"\n2,last'
+        rows = _feed_chunks(CsvRowFeeder(), body, 2)
+        self.assertEqual(rows, [{u'id': u'1', u'name': u'multi\nline'},
+                                {u'id': u'2', u'name': u'last'}])
+
+
 class TestHelper(unittest.TestCase):
     bbody = b'utf8-body'
     ubody = bbody.decode('utf8')
@@ -0,0 +1,96 @@
+from twisted.internet import task
+from twisted.trial import unittest
+
+from scrapy.utils.reactor import TimerWheel
+from tests import mock
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.clock.advance(1000)
+        self.wheel = TimerWheel(resolution=0.1, clock=self.clock)
+        self.called = []
+
+    def _call_later(self, delay, name):
+        return self.wheel.callLater(delay, self.called.append, name)
+
+    def test_invalid_resolution(self):
+        self.assertRaises(ValueError, TimerWheel, 0)
+
+    def test_call_later(self):
+        self._call_later(0.25, 'b')
+        self._call_later(0.05, 'a')
+        self._call_later(10, 'c')
+        self.assertEqual(len(self.wheel), 3)
+        # a single reactor call drives all timers
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+        self.clock.advance(0.1)
+        self.assertEqual(self.called, ['a'])
+        # delays are rounded up to the resolution, never down
+        self.clock.advance(0.1)
+        self.assertEqual(self.called, ['a'])
+        self.clock.advance(0.1)
+        self.assertEqual(self.called, ['a', 'b'])
+        self.clock.pump([0.1] * 100)
+        self.assertEqual(self.called, ['a', 'b', 'c'])
+        self.assertEqual(len(self.wheel), 0)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_late_reactor(self):
+        self._call_later(0.1, 'a')
+        self._call_later(0.5, 'b')
+        self._call_later(2, 'c')
+        self.clock.advance(1)
+        self.assertEqual(self.called, ['a', 'b'])
+
+    def test_cancel(self):
+        a = self._call_later(0.1, 'a')
+        b = self._call_later(0.1, 'b')
+        self.assertTrue(a.active())
+        a.cancel()
+        a.cancel()
+        self.assertFalse(a.active())
+        self.assertEqual(len(self.wheel), 1)
+        self.clock.advance(0.1)
+        self.assertEqual(self.called, ['b'])
+        self.assertFalse(b.active())
+
+    def test_cancel_last_stops_ticking(self):
+        timer = self._call_later(60, 'a')
+        timer.cancel()
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.assertEqual(self.wheel._buckets, {})
+        self._call_later(0.1, 'b')
+        self.clock.advance(0.1)
+        self.assertEqual(self.called, ['b'])
+
+    def test_get_time(self):
+        timer = self._call_later(0.25, 'a')
+        self.assertAlmostEqual(timer.getTime(), 1000.3)
+
+    def test_rearm_from_timer(self):
+        def rearm():
+            self.called.append('rearm')
+            self._call_later(0, 'a')
+        self.wheel.callLater(0.1, rearm)
+        self.clock.advance(0.1)
+        self.assertEqual(self.called, ['rearm'])
+        self.clock.advance(0.1)
+        self.assertEqual(self.called, ['rearm', 'a'])
+
+    def test_clear(self):
+        timers = [self._call_later(i, str(i)) for i in range(3)]
+        self.wheel.clear()
+        self.assertEqual(len(self.wheel), 0)
+        self.assertFalse(any(t.active() for t in timers))
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_errors_are_logged(self):
+        self.wheel.callLater(0.1, lambda: 1 / 0)
+        self._call_later(0.1, 'a')
+        with mock.patch('scrapy.utils.reactor.logger') as logger:
+            self.clock.advance(0.1)
+        self.assertEqual(self.called, ['a'])
+        self.assertEqual(logger.error.call_count, 1)
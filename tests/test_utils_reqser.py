@@ -4,6 +4,7 @@ import unittest
 from scrapy.http import Request, FormRequest
 from scrapy.spiders import Spider
 from scrapy.utils.reqser import request_to_dict, request_from_dict
+from scrapy.utils.request import request_fingerprint
 
 
 class RequestSerializationTest(unittest.TestCase):
@@ -37,6 +38,13 @@ class RequestSerializationTest(unittest.TestCase):
         r = Request("http://www.example.com", body=b"\xc2\xa3")
         self._assert_serializes_ok(r)
 
+    def test_fingerprints(self):
+        r = Request("http://www.example.com")
+        fp = request_fingerprint(r)
+        r2 = request_from_dict(request_to_dict(r))
+        self.assertEqual(r2._fingerprints, {None: fp})
+        self.assertEqual(request_fingerprint(r2), fp)
+
     def _assert_serializes_ok(self, request, spider=None):
         d = request_to_dict(request, spider=spider)
         request2 = request_from_dict(d, spider=spider)
@@ -1,7 +1,8 @@
 from __future__ import print_function
 import unittest
 from scrapy.http import Request
-from scrapy.utils.request import request_fingerprint, _fingerprint_cache, \
+from scrapy.utils.test import get_crawler
+from scrapy.utils.request import request_fingerprint, RequestFingerprinter, \
     request_authenticate, request_httprepr
 
 class UtilsRequestTest(unittest.TestCase):
@@ -17,7 +18,7 @@ class UtilsRequestTest(unittest.TestCase):
         self.assertNotEqual(request_fingerprint(r1), request_fingerprint(r2))
 
         # make sure caching is working
-        self.assertEqual(request_fingerprint(r1), _fingerprint_cache[r1][None])
+        self.assertEqual(request_fingerprint(r1), r1._fingerprints[None])
 
         r1 = Request("http://www.example.com/members/offers.html")
         r2 = Request("http://www.example.com/members/offers.html")
@@ -56,6 +57,28 @@ class UtilsRequestTest(unittest.TestCase):
         fp2 = request_fingerprint(r2)
         self.assertNotEqual(fp1, fp2)
 
+    def test_request_fingerprinter(self):
+        r1 = Request("http://www.example.com/query?id=111&cat=222")
+        fingerprinter = RequestFingerprinter()
+        self.assertEqual(fingerprinter.fingerprint(r1), request_fingerprint(r1))
+
+        class URLFingerprinter(RequestFingerprinter):
+
+            def compute(self, request):
+                return request.url
+
+        fingerprinter = URLFingerprinter()
+        self.assertEqual(fingerprinter.fingerprint(r1), r1.url)
+        self.assertEqual(r1._fingerprints[fingerprinter.cache_key], r1.url)
+        self.assertNotEqual(request_fingerprint(r1), r1.url)
+
+    def test_crawler_request_fingerprinter(self):
+        settings = {'REQUEST_FINGERPRINTER_CLASS':
+                    'scrapy.utils.request.RequestFingerprinter'}
+        crawler = get_crawler(settings_dict=settings)
+        self.assertIsInstance(crawler.request_fingerprinter,
+                              RequestFingerprinter)
+
     def test_request_authenticate(self):
         r = Request("http://www.example.com")
         request_authenticate(r, 'someuser', 'somepass')
@@ -7,7 +7,8 @@ from six.moves.urllib.parse import urlparse
 from scrapy.spiders import Spider
 from scrapy.utils.url import (url_is_from_any_domain, url_is_from_spider,
                               add_http_if_no_scheme, guess_scheme,
-                              parse_url, strip_url)
+                              parse_url, strip_url, canonicalize_url,
+                              URLCanonicalizer, _is_canonical)
 
 __doctests__ = ['scrapy.utils.url']
 
@@ -408,5 +409,77 @@ class StripUrl(unittest.TestCase):
             self.assertEqual(strip_url(i, origin_only=True), o)
 
 
+class URLCanonicalizerTest(unittest.TestCase):
+
+    urls = [
+        'http://www.example.com',
+        'http://www.example.com/',
+        'http://www.Example.com/a/b.html',
+        'https://www.example.com:8080/a/b.html?x=1',
+        'http://www.example.com/do?c=3&b=5&b=2&a=50',
+        'http://www.example.com/do?a=50&b=2&b=5&c=3',
+        'http://www.example.com/do?a=1&a=0',
+        'http://www.example.com/do?a&b=1',
+        'http://www.example.com/do?a=&b=1',
+        'http://www.example.com/do?a=1;b=2',
+        'http://www.example.com/do?a=x+y&b=~',
+        'http://www.example.com/do?',
+        'http://www.example.com/a%20b?q=%41',
+        'http://www.example.com/a b/c',
+        'http://www.example.com/a;p?q=1',
+        'http://www.example.com/~user/!$()*+,:=@[]|',
+        'http://www.example.com/page#frag',
+        'http://www.example.com/page#',
+        'http://www.example.com/page?a=1#f?x=y',
+        u'http://www.example.com/r\u00e9sum\u00e9',
+        u'http://www.exampl\u00e9.com/',
+        b'http://www.example.com/bytes?b=1&a=2',
+        'ftp://ftp.example.com/file.txt',
+    ]
+
+    def test_same_as_w3lib(self):
+        for keep_fragments in (False, True):
+            canonicalizer = URLCanonicalizer(keep_fragments=keep_fragments)
+            for _ in range(2):
+                for url in self.urls:
+                    self.assertEqual(
+                        canonicalizer(url),
+                        canonicalize_url(url, keep_fragments=keep_fragments),
+                        url)
+
+    def test_fastpath(self):
+        for url in self.urls:
+            if not isinstance(url, str):
+                continue
+            for keep_fragments in (False, True):
+                if _is_canonical(url, keep_fragments):
+                    self.assertEqual(
+                        canonicalize_url(url, keep_fragments=keep_fragments),
+                        url)
+        self.assertTrue(_is_canonical('http://www.example.com/a?a=1&b=2'))
+        self.assertFalse(_is_canonical('http://www.example.com/a?b=2&a=1'))
+        self.assertFalse(_is_canonical('http://www.example.com/page#frag'))
+        self.assertTrue(_is_canonical('http://www.example.com/page#frag',
+                                      keep_fragments=True))
+
+    def test_counters(self):
+        canonicalizer = URLCanonicalizer(cache_size=2)
+        canonicalizer('http://www.example.com/a')
+        self.assertEqual(canonicalizer.fastpath, 1)
+        self.assertEqual(len(canonicalizer.cache), 0)
+        canonicalizer('http://www.example.com/?b=1&a=1')
+        canonicalizer('http://www.example.com/?b=2&a=2')
+        canonicalizer('http://www.example.com/?b=1&a=1')
+        self.assertEqual((canonicalizer.hits, canonicalizer.misses), (1, 2))
+        # least recently used entry is evicted first
+        canonicalizer('http://www.example.com/?b=3&a=3')
+        self.assertEqual(list(canonicalizer.cache),
+                         ['http://www.example.com/?b=1&a=1',
+                          'http://www.example.com/?b=3&a=3'])
+        canonicalizer.clear()
+        self.assertEqual(len(canonicalizer.cache), 0)
+        self.assertEqual(canonicalizer.hits, 0)
+
+
 if __name__ == "__main__":
     unittest.main()